@@ -16,6 +16,16 @@ from app.models.chat_message import ChatMessage
 from app.models.friendship import Friendship, FriendshipStatus
 from app.models.achievement import Achievement
 from app.models.notification import Notification
+from app.services.streak_state import apply_log_change, rebuild_streak_states
+from app.services.daily_stats import refresh_daily_stats, update_daily_stats
+from app.services.sync import record_deletions, record_habit_deletion
+from app.services.recompute_queue import recompute_queue
+from app.services.insight_store import insight_store
+from app.services.user_cache import user_cache
+from app.services.compute_executor import compute_executor
+from app.ml.model_registry import model_registry
+from app.services.achievement_checker import forget_unlocked
+from app.models.sync_tombstone import SyncEntity
 from app.schemas.admin import (
     AdminUserResponse,
     AdminHabitResponse,
@@ -155,6 +165,7 @@ async def delete_user(
         raise HTTPException(status_code=404, detail="User not found")
     await db.delete(user)
     await db.commit()
+    forget_unlocked(user_id)
     return {"message": f"User '{user.username}' deleted"}
 
 
@@ -254,8 +265,13 @@ async def admin_edit_habit(
     habit = result.scalar_one_or_none()
     if not habit:
         raise HTTPException(status_code=404, detail="Habit not found")
-    for field, value in data.model_dump(exclude_unset=True).items():
+    update_data = data.model_dump(exclude_unset=True)
+    for field, value in update_data.items():
         setattr(habit, field, value)
+    if "cooldown_days" in update_data:
+        await rebuild_streak_states(db, [habit])
+    if "category" in update_data or "is_active" in update_data:
+        await refresh_daily_stats(db, habit.user_id)
     await db.commit()
     return {"message": f"Habit '{habit.name}' updated"}
 
@@ -271,7 +287,9 @@ async def admin_delete_habit(
     habit = result.scalar_one_or_none()
     if not habit:
         raise HTTPException(status_code=404, detail="Habit not found")
+    await record_habit_deletion(db, habit.user_id, habit.id)
     await db.delete(habit)
+    await refresh_daily_stats(db, habit.user_id)
     await db.commit()
     return {"message": f"Habit '{habit.name}' deleted"}
 
@@ -286,6 +304,11 @@ async def admin_edit_log(
 ):
     """Admin: create or update a habit log for any date (for testing)."""
     log_date = date.fromisoformat(data.date)
+    result = await db.execute(select(Habit).where(Habit.id == data.habit_id))
+    habit = result.scalar_one_or_none()
+    if not habit:
+        raise HTTPException(status_code=404, detail="Habit not found")
+
     result = await db.execute(
         select(HabitLog).where(
             HabitLog.habit_id == data.habit_id,
@@ -294,21 +317,35 @@ async def admin_edit_log(
     )
     existing = result.scalar_one_or_none()
     if existing:
+        was_completed = existing.completed
         existing.completed = data.completed
         existing.note = data.note
         if data.completed:
             existing.completed_at = datetime.now(timezone.utc)
+            if not was_completed:
+                existing.completions = 1
+                existing.completion_times = [existing.completed_at]
+        else:
+            existing.completions = 0
+            existing.completion_times = None
+        await apply_log_change(db, habit, log_date, was_completed, data.completed)
+        await update_daily_stats(db, habit.user_id, [log_date], [habit.category])
         await db.commit()
         return {"message": f"Log updated for {data.date}", "action": "updated"}
     else:
+        completed_at = datetime.now(timezone.utc) if data.completed else None
         log = HabitLog(
             habit_id=data.habit_id,
             date=log_date,
             completed=data.completed,
-            completed_at=datetime.now(timezone.utc) if data.completed else None,
+            completions=1 if data.completed else 0,
+            completed_at=completed_at,
+            completion_times=[completed_at] if data.completed else None,
             note=data.note,
         )
         db.add(log)
+        await apply_log_change(db, habit, log_date, was_completed=False, is_completed=data.completed)
+        await update_daily_stats(db, habit.user_id, [log_date], [habit.category])
         await db.commit()
         return {"message": f"Log created for {data.date}", "action": "created"}
 
@@ -340,16 +377,23 @@ async def admin_generate_logs(
         if existing.scalar_one_or_none():
             continue
         completed = random.randint(1, 100) <= data.completion_percent
+        completed_at = datetime.now(timezone.utc) if completed else None
         log = HabitLog(
             habit_id=data.habit_id,
             date=log_date,
             completed=completed,
-            completed_at=datetime.now(timezone.utc) if completed else None,
+            completions=1 if completed else 0,
+            completed_at=completed_at,
+            completion_times=[completed_at] if completed else None,
             note="Auto-generated for testing",
         )
         db.add(log)
         created += 1
 
+    await rebuild_streak_states(db, [habit])
+    await update_daily_stats(
+        db, habit.user_id, [today - timedelta(days=i) for i in range(data.days)], [habit.category]
+    )
     await db.commit()
     return {"message": f"Generated {created} logs for habit '{habit.name}' over {data.days} days"}
 
@@ -365,7 +409,12 @@ async def admin_delete_log(
     log = result.scalar_one_or_none()
     if not log:
         raise HTTPException(status_code=404, detail="Log not found")
+    habit = await db.get(Habit, log.habit_id)
+    was_completed = log.completed
     await db.delete(log)
+    record_deletions(db, habit.user_id, SyncEntity.HABIT_LOG, [log.id])
+    await apply_log_change(db, habit, log.date, was_completed, is_completed=False)
+    await refresh_daily_stats(db, habit.user_id, [log.date])
     await db.commit()
     return {"message": "Log deleted"}
 
@@ -390,6 +439,7 @@ async def admin_get_habit_logs(
             "id": l.id,
             "date": l.date.isoformat(),
             "completed": l.completed,
+            "completions": l.completions,
             "note": l.note,
             "completed_at": l.completed_at.isoformat() if l.completed_at else None,
         }
@@ -399,6 +449,56 @@ async def admin_get_habit_logs(
 
 # ─── Analytics ───
 
+@router.get("/recompute-queue")
+async def get_recompute_queue_stats(
+    db: AsyncSession = Depends(get_db),
+    admin: User = Depends(get_current_admin),
+):
+    """Admin: depth and counters of the background challenge/achievement recompute queue."""
+    return {**recompute_queue.stats(), **await recompute_queue.backlog(db)}
+
+
+@router.get("/insight-store")
+async def get_insight_store_stats(
+    admin: User = Depends(get_current_admin),
+):
+    """Admin: hit/stale counters and in-flight generations of the AI insight store."""
+    return insight_store.stats()
+
+
+@router.get("/compute-executor")
+async def get_compute_executor_stats(
+    admin: User = Depends(get_current_admin),
+):
+    """Admin: queue depth, timeouts/fallbacks and latency percentiles of the ML compute pool."""
+    return compute_executor.stats()
+
+
+@router.get("/models")
+async def get_model_registry_stats(
+    admin: User = Depends(get_current_admin),
+):
+    """Admin: loaded model versions and registry load/check counters."""
+    return model_registry.stats()
+
+
+@router.get("/user-cache")
+async def get_user_cache_stats(
+    admin: User = Depends(get_current_admin),
+):
+    """Admin: hit/miss counters per namespace and size of the per-user derived-data cache."""
+    return user_cache.stats()
+
+
+@router.delete("/user-cache")
+async def clear_user_cache(
+    admin: User = Depends(get_current_admin),
+):
+    """Admin: drop every cached entry (e.g. after changing how derived data is computed)."""
+    await user_cache.clear()
+    return {"message": "User cache cleared"}
+
+
 @router.get("/analytics", response_model=PlatformAnalyticsResponse)
 async def get_platform_analytics(
     db: AsyncSession = Depends(get_db),
@@ -1,9 +1,8 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
-from datetime import date, timedelta, datetime
-from collections import Counter
+from datetime import date, timedelta
 from app.db.database import get_db
 from app.models.user import User
 from app.models.habit import Habit
@@ -13,7 +12,14 @@ from app.schemas.analytics import (
     CategoryStat, HourStat,
 )
 from app.api.auth_utils import get_current_user
-from app.api.routes.habits import _compute_streak, _completion_rate
+from app.services.habit_stats import get_habit_stats, get_completion_hours
+from app.services.daily_stats import DayTotals, get_daily_totals, get_category_totals
+from app.services.insight_store import insight_store
+from app.services.user_cache import cached_for_user
+from app.services.log_export import EXPORT_FORMATS, csv_chunks, columnar_chunks, pyarrow_available
+from app.services.detailed_analytics import (
+    totals_arrays, build_heatmap, weekly_trend, build_daily_breakdown,
+)
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
@@ -23,6 +29,28 @@ async def get_analytics(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
+    analytics = await _analytics_summary(db, current_user)
+
+    # Served from the insight store; the LLM runs in the background when stale
+    analytics.ai_insight = await insight_store.get(
+        db,
+        {
+            "active_habits": analytics.active_habits,
+            "today_completed": analytics.today_completed,
+            "today_total": analytics.today_total,
+            "overall_completion_rate": analytics.overall_completion_rate,
+            "longest_streak": analytics.longest_streak,
+            "most_struggled_habit": analytics.most_struggled_habit,
+            "most_consistent_habit": analytics.most_consistent_habit,
+            "optimal_time": analytics.optimal_time,
+        },
+    )
+    return analytics
+
+
+@cached_for_user("analytics")
+async def _analytics_summary(db: AsyncSession, current_user: User) -> AnalyticsResponse:
+    """Dashboard analytics without the AI insight."""
     # Get all user habits
     result = await db.execute(
         select(Habit).where(Habit.user_id == current_user.id)
@@ -30,23 +58,15 @@ async def get_analytics(
     all_habits = result.scalars().all()
     active_habits = [h for h in all_habits if h.is_active]
 
-    # Today's stats
+    # Daily rollup for the last 7 days (today's stats + weekly completion)
     today = date.today()
-    result = await db.execute(
-        select(HabitLog).where(
-            HabitLog.habit_id.in_([h.id for h in active_habits]),
-            HabitLog.date == today,
-        )
-    )
-    today_logs = result.scalars().all()
-    today_completed = sum(1 for l in today_logs if l.completed)
+    daily = await get_daily_totals(db, current_user.id, today - timedelta(days=6), today)
+    today_completed = daily.get(today, DayTotals()).active_completed
 
     # Streaks and completion rates
-    streaks = {}
-    rates = {}
-    for habit in active_habits:
-        streaks[habit.id] = await _compute_streak(db, habit.id)
-        rates[habit.id] = await _completion_rate(db, habit.id)
+    stats = await get_habit_stats(db, active_habits)
+    streaks = {habit_id: s.current_streak for habit_id, s in stats.items()}
+    rates = {habit_id: s.completion_rate for habit_id, s in stats.items()}
 
     # Best streak and rates
     longest_streak = max(streaks.values()) if streaks else 0
@@ -70,50 +90,19 @@ async def get_analytics(
     # Weekly completion (last 7 days)
     weekly = []
     for i in range(6, -1, -1):
-        day = today - timedelta(days=i)
-        result = await db.execute(
-            select(HabitLog).where(
-                HabitLog.habit_id.in_([h.id for h in active_habits]),
-                HabitLog.date == day,
-            )
-        )
-        day_logs = result.scalars().all()
-        if day_logs:
-            day_rate = sum(1 for l in day_logs if l.completed) / len(day_logs) * 100
+        totals = daily.get(today - timedelta(days=i), DayTotals())
+        if totals.active_logged:
+            day_rate = totals.active_completed / totals.active_logged * 100
         else:
             day_rate = 0.0
         weekly.append(round(day_rate, 1))
 
-    # Optimal time analysis
-    result = await db.execute(
-        select(HabitLog).where(
-            HabitLog.habit_id.in_([h.id for h in active_habits]),
-            HabitLog.completed == True,
-            HabitLog.completed_at.is_not(None),
-        )
-    )
-    completed_logs = result.scalars().all()
+    # Optimal time analysis (hour histogram aggregated in the database)
+    hours = await get_completion_hours(db, [h.id for h in active_habits])
     optimal_time = None
-    if completed_logs:
-        hours = [l.completed_at.hour for l in completed_logs if l.completed_at]
-        if hours:
-            most_common_hour = Counter(hours).most_common(1)[0][0]
-            optimal_time = f"{most_common_hour:02d}:00"
-
-    from app.ml.pattern_analyzer import PatternAnalyzer
-    ai_insight = await PatternAnalyzer.generate_ai_insight(
-        {
-            "active_habits": len(active_habits),
-            "today_completed": today_completed,
-            "today_total": len(active_habits),
-            "overall_completion_rate": overall_rate,
-            "longest_streak": longest_streak,
-            "most_struggled_habit": most_struggled,
-            "most_consistent_habit": most_consistent,
-            "optimal_time": optimal_time,
-        },
-        current_user.username
-    )
+    if hours:
+        most_common_hour = hours.most_common(1)[0][0]
+        optimal_time = f"{most_common_hour:02d}:00"
 
     return AnalyticsResponse(
         total_habits=len(all_habits),
@@ -127,17 +116,23 @@ async def get_analytics(
         most_struggled_habit=most_struggled,
         optimal_time=optimal_time,
         weekly_completion=weekly,
-        ai_insight=ai_insight,
     )
 
 
 @router.get("/detailed", response_model=DetailedAnalyticsResponse)
 async def get_detailed_analytics(
-    days: int = 30,
+    days: int = Query(30, ge=1, le=365),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Extended analytics: heatmap, categories, hourly distribution, 30-day trends."""
+    """Extended analytics: heatmap, categories, hourly distribution, weekly trend (up to a year)."""
+    return await _detailed_analytics(db, current_user, days)
+
+
+@cached_for_user("analytics_detailed")
+async def _detailed_analytics(
+    db: AsyncSession, current_user: User, days: int
+) -> DetailedAnalyticsResponse:
     today = date.today()
     since = today - timedelta(days=days)
 
@@ -146,81 +141,42 @@ async def get_detailed_analytics(
         select(Habit).where(Habit.user_id == current_user.id)
     )
     all_habits = result.scalars().all()
-    active_ids = [h.id for h in all_habits if h.is_active]
-
-    # All logs in period
-    result = await db.execute(
-        select(HabitLog).where(
-            HabitLog.habit_id.in_([h.id for h in all_habits]),
-            HabitLog.date >= since,
-        )
-    )
-    all_logs = result.scalars().all()
+    active_habits = [h for h in all_habits if h.is_active]
+    active_ids = [h.id for h in active_habits]
 
-    # --- Heatmap (last N days) ---
-    heatmap: dict[str, bool | None] = {}
-    log_by_date: dict[str, list[HabitLog]] = {}
-    for log in all_logs:
-        ds = log.date.isoformat()
-        log_by_date.setdefault(ds, []).append(log)
+    # Per-day and per-category totals come from the daily rollup
+    daily = await get_daily_totals(db, current_user.id, since)
+    category_totals = await get_category_totals(db, current_user.id, since)
 
-    daily_breakdown: dict[str, dict[str, list[str]]] = {}
-    active_habits = [h for h in all_habits if h.is_active]
-    habit_name_by_id = {h.id: h.name for h in active_habits}
-    habit_created_date = {
-        h.id: (
-            h.created_at.date()
-            if isinstance(h.created_at, datetime)
-            else h.created_at
+    # Days on which each active habit was completed (for the daily breakdown)
+    completed_pairs: list[tuple[date, int]] = []
+    if active_ids:
+        result = await db.execute(
+            select(HabitLog.date, HabitLog.habit_id).where(
+                HabitLog.habit_id.in_(active_ids),
+                HabitLog.date >= since,
+                HabitLog.completed == True,
+            )
         )
-        for h in active_habits
-    }
-
-    for i in range(days):
-        day = today - timedelta(days=i)
-        ds = day.isoformat()
-        day_logs = log_by_date.get(ds, [])
-        if not day_logs:
-            heatmap[ds] = None  # No data
-        else:
-            completed = all(l.completed for l in day_logs)
-            heatmap[ds] = completed
-
-        day_logs_by_habit: dict[int, list[HabitLog]] = {}
-        for log in day_logs:
-            if log.habit_id in habit_name_by_id:
-                day_logs_by_habit.setdefault(log.habit_id, []).append(log)
-
-        completed_names: list[str] = []
-        missed_names: list[str] = []
-        day_active_habits = [
-            h
-            for h in active_habits
-            if habit_created_date.get(h.id) is None
-            or habit_created_date[h.id] <= day
-        ]
-        for habit in day_active_habits:
-            logs_for_habit = day_logs_by_habit.get(habit.id, [])
-            if any(l.completed for l in logs_for_habit):
-                completed_names.append(habit.name)
-            else:
-                missed_names.append(habit.name)
-
-        daily_breakdown[ds] = {
-            "completed": sorted(completed_names),
-            "missed": sorted(missed_names),
-        }
+        completed_pairs = result.all()
+
+    # --- Heatmap and daily breakdown (last N days) ---
+    logged, completed = totals_arrays(daily, today, days)
+    heatmap = build_heatmap(logged, completed, today, days)
+    daily_breakdown = build_daily_breakdown(active_habits, completed_pairs, today, days)
 
     # --- Category stats ---
     category_map: dict[str, dict] = {}
     for h in all_habits:
         cat = h.category
         if cat not in category_map:
-            category_map[cat] = {"count": 0, "total_logs": 0, "completed_logs": 0}
+            totals = category_totals.get(cat, DayTotals())
+            category_map[cat] = {
+                "count": 0,
+                "total_logs": totals.logged,
+                "completed_logs": totals.completed,
+            }
         category_map[cat]["count"] += 1
-        habit_logs = [l for l in all_logs if l.habit_id == h.id]
-        category_map[cat]["total_logs"] += len(habit_logs)
-        category_map[cat]["completed_logs"] += sum(1 for l in habit_logs if l.completed)
 
     category_stats = [
         CategoryStat(
@@ -234,10 +190,7 @@ async def get_detailed_analytics(
     ]
 
     # --- Hourly distribution ---
-    hour_counts = Counter()
-    for log in all_logs:
-        if log.completed and log.completed_at:
-            hour_counts[log.completed_at.hour] += 1
+    hour_counts = await get_completion_hours(db, [h.id for h in all_habits], since)
 
     hourly_distribution = [
         HourStat(hour=h, count=c)
@@ -245,24 +198,12 @@ async def get_detailed_analytics(
     ]
 
     # --- 90-day trend (weekly completion %) ---
-    trend_90d = []
-    num_weeks = days // 7
-    for w in range(num_weeks):
-        week_start = today - timedelta(days=(w + 1) * 7)
-        week_end = today - timedelta(days=w * 7)
-        week_logs = [l for l in all_logs if week_start < l.date <= week_end]
-        if week_logs:
-            rate = sum(1 for l in week_logs if l.completed) / len(week_logs) * 100
-            trend_90d.append(round(rate, 1))
-        else:
-            trend_90d.append(0.0)
-    trend_90d.reverse()  # oldest first
+    trend_90d = weekly_trend(logged, completed, days // 7)
 
     # --- Aggregate stats ---
-    total_completed = sum(1 for l in all_logs if l.completed)
-    total_logged = len(all_logs)
-    unique_dates = {l.date for l in all_logs}
-    days_active = len(unique_dates)
+    total_completed = sum(t.completed for t in daily.values())
+    total_logged = sum(t.logged for t in daily.values())
+    days_active = sum(1 for t in daily.values() if t.logged)
 
     return DetailedAnalyticsResponse(
         heatmap=heatmap,
@@ -277,41 +218,24 @@ async def get_detailed_analytics(
 
 
 @router.get("/export")
-async def export_analytics_csv(
-    db: AsyncSession = Depends(get_db),
+async def export_analytics(
+    format: str = Query("csv", pattern="^(csv|parquet|arrow)$"),
     current_user: User = Depends(get_current_user),
 ):
-    """Export all habit logs as CSV."""
-    import io
-    import csv
+    """
+    Export all habit logs, streamed from a server-side cursor.
+    `format`: csv (default), parquet or arrow (Arrow IPC stream; both need pyarrow).
+    """
+    media_type, extension = EXPORT_FORMATS[format]
+    if format == "csv":
+        body = csv_chunks(current_user.id)
+    else:
+        if not pyarrow_available():
+            raise HTTPException(status_code=501, detail="Parquet/Arrow export not available on server")
+        body = columnar_chunks(current_user.id, format)
 
-    result = await db.execute(
-        select(HabitLog, Habit.name, Habit.category)
-        .join(Habit, HabitLog.habit_id == Habit.id)
-        .where(Habit.user_id == current_user.id)
-        .order_by(HabitLog.date.desc())
-    )
-    rows = result.all()
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["Дата", "Привычка", "Категория", "Выполнена", "Время", "Заметка"])
-
-    for log, habit_name, category in rows:
-        writer.writerow([
-            log.date.isoformat(),
-            habit_name,
-            category,
-            "Да" if log.completed else "Нет",
-            log.completed_at.strftime("%H:%M") if log.completed_at else "",
-            log.note or "",
-        ])
-
-    output.seek(0)
     return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename=habits_export_{date.today()}.csv"},
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=habits_export_{date.today()}.{extension}"},
     )
-
-
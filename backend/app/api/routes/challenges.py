@@ -3,11 +3,12 @@ Challenges routes — AI-generated challenges, streak recovery, weekly reports.
 """
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func, case
 from datetime import date, datetime, timedelta, timezone
 import json
 import logging
 
+from app.config import get_settings
 from app.db.database import get_db
 from app.models.user import User
 from app.models.habit import Habit
@@ -18,7 +19,12 @@ from app.schemas.challenges import (
     ChallengeResponse, WeeklyReportResponse, StreakRecoveryResponse,
 )
 from app.api.auth_utils import get_current_user
-from app.api.routes.habits import _compute_streak, _completion_rate
+from app.services.streak_state import get_current_streaks
+from app.services.streak_sql import compute_streaks
+from app.services.daily_stats import get_daily_totals
+from app.services.user_cache import cached_for_user
+from app.services.habit_stats import get_completion_rates
+from app.services.completion_scores import get_completion_scores
 
 logger = logging.getLogger(__name__)
 
@@ -77,20 +83,20 @@ async def generate_challenges(
     today = date.today()
     new_challenges = []
 
-    # 1. Daily challenge — pick the most struggling habit
-    rates = {}
-    for h in habits:
-        rates[h.id] = await _completion_rate(db, h.id, days=14)
+    habit_ids = [h.id for h in habits]
+    rates = await get_completion_rates(db, habit_ids, today - timedelta(days=14))
 
-    worst_id = min(rates, key=rates.get) if rates else None
+    # 1. Daily challenge — pick the habit most at risk of being skipped today
+    scores = await get_completion_scores(db, habit_ids, today)
+    worst_id = min(scores, key=scores.get) if scores else None
     worst_habit = next((h for h in habits if h.id == worst_id), None) if worst_id else None
 
-    if worst_habit and rates.get(worst_id, 100) < 70:
+    if worst_habit and scores[worst_id] < get_settings().COMPLETION_RISK_THRESHOLD:
         daily = Challenge(
             user_id=current_user.id,
             type=ChallengeType.DAILY,
             title=f"Фокус на '{worst_habit.name}'",
-            description=f"Выполни '{worst_habit.name}' сегодня! Твой текущий показатель: {rates[worst_id]:.0f}%.",
+            description=f"Выполни '{worst_habit.name}' сегодня! Твой текущий показатель: {rates.get(worst_id, 0.0):.0f}%.",
             target_habit_id=worst_habit.id,
             target_count=1,
             reward_text="🎯 +10 к силе воли!",
@@ -188,35 +194,21 @@ async def get_streak_recovery(
     today = date.today()
     recoveries = []
 
+    streak_rows = await compute_streaks(db, habit_ids=[h.id for h in habits])
+
     for habit in habits:
-        # Get recent logs
-        result = await db.execute(
-            select(HabitLog)
-            .where(HabitLog.habit_id == habit.id, HabitLog.completed == True)
-            .order_by(HabitLog.date.desc())
-            .limit(60)
-        )
-        completed_logs = result.scalars().all()
-        if not completed_logs:
+        row = streak_rows.get(habit.id)
+        if row is None:
             continue
 
-        last_completed = completed_logs[0].date
+        last_completed = row.last_completed_date
         days_missed = (today - last_completed).days
 
         if days_missed < 2:
             continue  # No broken streak
 
-        # Calculate what the streak was before break
-        streak_before = 0
-        for i, log in enumerate(completed_logs):
-            if i == 0:
-                streak_before = 1
-                continue
-            diff = (completed_logs[i - 1].date - log.date).days
-            if diff <= habit.cooldown_days:
-                streak_before += 1
-            else:
-                break
+        # What the streak was before the break (looking back at most 60 logs)
+        streak_before = min(row.recovery_run, 60)
 
         if streak_before < 3:
             continue  # Not a meaningful streak to recover
@@ -281,6 +273,11 @@ async def get_weekly_report(
     current_user: User = Depends(get_current_user),
 ):
     """Get the latest weekly report or generate one if current week is missing."""
+    return await _current_weekly_report(db, current_user)
+
+
+@cached_for_user("weekly_report")
+async def _current_weekly_report(db: AsyncSession, current_user: User) -> WeeklyReportResponse:
     today = date.today()
     week_start = today - timedelta(days=today.weekday())  # Monday
 
@@ -340,39 +337,43 @@ async def _generate_weekly_report(
     )
     habits = result.scalars().all()
 
-    # Get logs for the week
+    # Week totals from the daily rollup
+    daily = await get_daily_totals(db, user.id, week_start, week_end)
+
+    total_possible = len(habits) * 7
+    completed = sum(t.active_completed for t in daily.values())
+    rate = round(completed / total_possible * 100, 1) if total_possible > 0 else 0
+
+    # Best/worst habit
     result = await db.execute(
-        select(HabitLog).where(
+        select(
+            HabitLog.habit_id,
+            func.sum(case((HabitLog.completed == True, 1), else_=0)),
+        )
+        .where(
             HabitLog.habit_id.in_([h.id for h in habits]),
             HabitLog.date >= week_start,
             HabitLog.date <= week_end,
         )
+        .group_by(HabitLog.habit_id)
     )
-    logs = result.scalars().all()
-
-    total_possible = len(habits) * 7
-    completed = sum(1 for l in logs if l.completed)
-    rate = round(completed / total_possible * 100, 1) if total_possible > 0 else 0
+    completed_by_habit = {habit_id: int(c or 0) for habit_id, c in result.all()}
 
-    # Best/worst habit
     habit_stats: dict[int, dict] = {}
     for h in habits:
-        h_logs = [l for l in logs if l.habit_id == h.id]
-        h_completed = sum(1 for l in h_logs if l.completed)
+        h_completed = completed_by_habit.get(h.id, 0)
         habit_stats[h.id] = {
             "name": h.name,
             "completed": h_completed,
-            "rate": h_completed / 7 * 100 if h_logs else 0,
+            "rate": h_completed / 7 * 100 if h.id in completed_by_habit else 0,
         }
 
     best_h = max(habit_stats.values(), key=lambda x: x["rate"]) if habit_stats else None
     worst_h = min(habit_stats.values(), key=lambda x: x["rate"]) if habit_stats else None
 
     # Streak
-    max_streak = 0
-    for h in habits:
-        streak = await _compute_streak(db, h.id, h.cooldown_days)
-        max_streak = max(max_streak, streak)
+    streaks = await get_current_streaks(db, habits)
+    max_streak = max(streaks.values(), default=0)
 
     # Mood average
     result = await db.execute(
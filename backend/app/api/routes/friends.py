@@ -5,17 +5,16 @@ Friends routes — система друзей.
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, or_, and_
-from datetime import date
 from app.db.database import get_db
 from app.models.user import User
 from app.models.habit import Habit
-from app.models.habit_log import HabitLog
 from app.models.friendship import Friendship, FriendshipStatus
 from app.models.notification import Notification
 from app.notifications.push_service import send_push_to_user
 from app.schemas.friends import FriendProgressResponse
 from app.api.auth_utils import get_current_user
-from app.api.routes.habits import _compute_streak, _completion_rate
+from app.services.habit_stats import get_habit_stats
+from app.services.user_cache import cached_for_user
 
 router = APIRouter(prefix="/friends", tags=["friends"])
 
@@ -367,38 +366,30 @@ async def get_friend_progress(
     if not friend:
         raise HTTPException(status_code=404, detail="User not found")
 
+    return await _friend_progress(db, friend)
+
+
+@cached_for_user("friend_progress")
+async def _friend_progress(db: AsyncSession, friend: User) -> FriendProgressResponse:
+    """Aggregated progress of a user, cached by the friend's data version."""
+    friend_id = friend.id
+
     # Habits
     result = await db.execute(select(Habit).where(Habit.user_id == friend_id))
     all_habits = result.scalars().all()
     active_habits = [h for h in all_habits if h.is_active]
 
+    stats = await get_habit_stats(db, active_habits)
+
     # Best streak
-    best_streak = 0
-    for h in active_habits:
-        s = await _compute_streak(db, h.id, h.cooldown_days)
-        if s > best_streak:
-            best_streak = s
+    best_streak = max((s.current_streak for s in stats.values()), default=0)
 
     # Overall completion rate
-    rates = []
-    for h in active_habits:
-        r = await _completion_rate(db, h.id)
-        rates.append(r)
+    rates = [s.completion_rate for s in stats.values()]
     overall_rate = round(sum(rates) / len(rates), 1) if rates else 0.0
 
     # Today
-    today = date.today()
-    today_completed = 0
-    for h in active_habits:
-        res = await db.execute(
-            select(HabitLog).where(
-                HabitLog.habit_id == h.id,
-                HabitLog.date == today,
-                HabitLog.completed == True,
-            )
-        )
-        if res.scalar_one_or_none():
-            today_completed += 1
+    today_completed = sum(1 for s in stats.values() if s.today_completions > 0)
 
     return FriendProgressResponse(
         user_id=friend.id,
@@ -1,213 +1,38 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from datetime import datetime, date, timezone, timedelta
-import re
+from datetime import datetime, date, timedelta
 from app.db.database import get_db
 from app.models.user import User
 from app.models.habit import Habit, HABIT_NAME_SUGGESTIONS
 from app.models.habit_log import HabitLog
-from app.models.challenge import Challenge, ChallengeStatus, ChallengeType
+from app.models.habit_streak import HabitStreak
 from app.schemas.habit import (
     HabitCreate, HabitUpdate, HabitResponse,
     HabitLogCreate, HabitLogResponse,
+    HabitLogBatchCreate, HabitLogBatchItem, HabitLogBatchResponse,
 )
 from app.api.auth_utils import get_current_user
-from app.services.achievement_checker import check_and_unlock
+from app.services.achievement_checker import AchievementEvent, check_and_unlock
+from app.services.habit_stats import HabitStats, get_habit_stats
+from app.services.streak_state import apply_log_change, apply_log_changes, rebuild_streak_states
+from app.services.daily_stats import refresh_daily_stats, update_daily_stats
+from app.services.sync import record_habit_deletion
+from app.services.recompute_queue import recompute_queue
+from app.services.log_upsert import upsert_habit_log
+from app.services.collaborative import apply_user_habits
 
 router = APIRouter(prefix="/habits", tags=["habits"])
 
 
-async def _compute_streak(db: AsyncSession, habit_id: int, cooldown_days: int = 1) -> int:
-    """Compute current consecutive streak, respecting cooldown_days."""
-    result = await db.execute(
-        select(HabitLog)
-        .where(HabitLog.habit_id == habit_id, HabitLog.completed == True)
-        .order_by(HabitLog.date.desc())
-    )
-    logs = result.scalars().all()
-    if not logs:
-        return 0
-
-    streak = 0
-    expected_date = date.today()
-    for log in logs:
-        diff = (expected_date - log.date).days
-        if diff == 0:
-            streak += 1
-            expected_date -= timedelta(days=cooldown_days)
-        elif diff <= cooldown_days and streak == 0:
-            # Allow if today not logged yet but last log is within cooldown
-            expected_date = log.date
-            streak = 1
-            expected_date -= timedelta(days=cooldown_days)
-        else:
-            break
-    return streak
-
-
-async def _is_completed_today(db: AsyncSession, habit_id: int) -> bool:
-    """Check if habit was completed today."""
-    today = date.today()
-    result = await db.execute(
-        select(HabitLog).where(
-            HabitLog.habit_id == habit_id,
-            HabitLog.date == today,
-            HabitLog.completed == True,
-        )
-    )
-    return result.scalar_one_or_none() is not None
-
-
-async def _today_completions(db: AsyncSession, habit_id: int, local_date: date = None) -> int:
-    """Count how many completed logs exist for today."""
-    today = local_date if local_date else date.today()
-    result = await db.execute(
-        select(HabitLog).where(
-            HabitLog.habit_id == habit_id,
-            HabitLog.date == today,
-            HabitLog.completed == True,
-        )
-    )
-    logs = result.scalars().all()
-    return len(logs)
-
-
-async def _compute_best_streak(db: AsyncSession, habit_id: int, cooldown_days: int = 1) -> int:
-    """Compute the best (longest) streak ever for a habit."""
-    result = await db.execute(
-        select(HabitLog)
-        .where(HabitLog.habit_id == habit_id, HabitLog.completed == True)
-        .order_by(HabitLog.date.asc())
-    )
-    logs = result.scalars().all()
-    if not logs:
-        return 0
-
-    best = 1
-    current = 1
-    for i in range(1, len(logs)):
-        diff = (logs[i].date - logs[i - 1].date).days
-        if diff == cooldown_days:
-            current += 1
-            best = max(best, current)
-        elif diff > cooldown_days:
-            current = 1
-        # if diff < cooldown_days, skip (duplicate day, etc.)
-    return best
-
-
-async def _completion_rate(db: AsyncSession, habit_id: int, days: int = 30) -> float:
-    """Compute completion rate over the last N days."""
-    since = date.today() - timedelta(days=days)
-    result = await db.execute(
-        select(HabitLog).where(HabitLog.habit_id == habit_id, HabitLog.date >= since)
-    )
-    logs = result.scalars().all()
-    if not logs:
-        return 0.0
-    completed = sum(1 for l in logs if l.completed)
-    return round(completed / len(logs) * 100, 1)
-
-
-async def _recalculate_active_challenges(
-    db: AsyncSession,
-    user_id: int,
-    reference_date: date,
-) -> None:
-    result = await db.execute(
-        select(Challenge).where(
-            Challenge.user_id == user_id,
-            Challenge.status == ChallengeStatus.ACTIVE,
-            Challenge.start_date <= reference_date,
-            Challenge.end_date >= reference_date,
-        )
-    )
-    challenges = result.scalars().all()
-    if not challenges:
-        return
-
-    habits_result = await db.execute(
-        select(Habit).where(Habit.user_id == user_id, Habit.is_active == True)
-    )
-    active_habits = habits_result.scalars().all()
-    active_habit_ids = [h.id for h in active_habits]
-    habit_by_id = {h.id: h for h in active_habits}
-
-    for challenge in challenges:
-        new_count = challenge.current_count
-
-        if challenge.type == ChallengeType.DAILY:
-            if challenge.target_habit_id is None:
-                continue
-            logs_result = await db.execute(
-                select(HabitLog).where(
-                    HabitLog.habit_id == challenge.target_habit_id,
-                    HabitLog.completed == True,
-                    HabitLog.date >= challenge.start_date,
-                    HabitLog.date <= challenge.end_date,
-                )
-            )
-            new_count = 1 if logs_result.scalar_one_or_none() else 0
-
-        elif challenge.type == ChallengeType.STREAK_RECOVERY:
-            if challenge.target_habit_id is None:
-                continue
-            habit = habit_by_id.get(challenge.target_habit_id)
-            if habit is None:
-                continue
-            streak = await _compute_streak(db, habit.id, habit.cooldown_days)
-            new_count = min(streak, challenge.target_count)
-
-        elif challenge.type == ChallengeType.WEEKLY:
-            if not active_habit_ids:
-                new_count = 0
-            else:
-                logs_result = await db.execute(
-                    select(HabitLog).where(
-                        HabitLog.habit_id.in_(active_habit_ids),
-                        HabitLog.completed == True,
-                        HabitLog.date >= challenge.start_date,
-                        HabitLog.date <= challenge.end_date,
-                    )
-                )
-                logs = logs_result.scalars().all()
-                by_day: dict[date, set[int]] = {}
-                for log in logs:
-                    by_day.setdefault(log.date, set()).add(log.habit_id)
-                new_count = sum(
-                    1 for completed_habits in by_day.values()
-                    if len(completed_habits) >= len(active_habit_ids)
-                )
-
-        elif challenge.type in {ChallengeType.IMPROVEMENT, ChallengeType.CATEGORY_FOCUS}:
-            category_match = re.search(r"'([^']+)'", challenge.title or "")
-            category = category_match.group(1).strip().lower() if category_match else None
-            candidate_habits = active_habits
-            if category:
-                candidate_habits = [h for h in active_habits if (h.category or '').lower() == category]
-            category_habit_ids = [h.id for h in candidate_habits]
-            if not category_habit_ids:
-                new_count = 0
-            else:
-                logs_result = await db.execute(
-                    select(HabitLog).where(
-                        HabitLog.habit_id.in_(category_habit_ids),
-                        HabitLog.completed == True,
-                        HabitLog.date >= challenge.start_date,
-                        HabitLog.date <= challenge.end_date,
-                    )
-                )
-                logs = logs_result.scalars().all()
-                new_count = len(logs)
-
-        new_count = max(0, min(new_count, challenge.target_count))
-        challenge.current_count = new_count
-
-        if new_count >= challenge.target_count:
-            challenge.status = ChallengeStatus.COMPLETED
-            if challenge.completed_at is None:
-                challenge.completed_at = datetime.now(timezone.utc)
+def _to_habit_response(habit: Habit, stats: HabitStats) -> HabitResponse:
+    resp = HabitResponse.model_validate(habit)
+    resp.current_streak = stats.current_streak
+    resp.best_streak = stats.best_streak
+    resp.today_completions = stats.today_completions
+    resp.completed_today = stats.today_completions >= habit.daily_target
+    resp.completion_rate = stats.completion_rate
+    return resp
 
 
 # --- Suggestions endpoint ---
@@ -231,13 +56,15 @@ async def create_habit(
     current_user: User = Depends(get_current_user),
 ):
     habit = Habit(user_id=current_user.id, **habit_data.model_dump())
+    habit.streak = HabitStreak(cooldown_days=habit.cooldown_days)
     db.add(habit)
     await db.commit()
     await db.refresh(habit)
 
     # Check achievements (first_habit, five_habits)
-    await check_and_unlock(db, current_user.id)
+    await check_and_unlock(db, current_user.id, [AchievementEvent.HABIT_CREATED])
     await db.commit()
+    await apply_user_habits(db, current_user.id)
 
     response = HabitResponse.model_validate(habit)
     response.current_streak = 0
@@ -263,17 +90,8 @@ async def get_habits(
     )
     habits = result.scalars().all()
 
-    responses = []
-    for habit in habits:
-        resp = HabitResponse.model_validate(habit)
-        resp.current_streak = await _compute_streak(db, habit.id, habit.cooldown_days)
-        resp.best_streak = await _compute_best_streak(db, habit.id, habit.cooldown_days)
-        completions = await _today_completions(db, habit.id, user_date)
-        resp.today_completions = completions
-        resp.completed_today = completions >= habit.daily_target
-        resp.completion_rate = await _completion_rate(db, habit.id)
-        responses.append(resp)
-    return responses
+    stats = await get_habit_stats(db, habits, local_date=user_date)
+    return [_to_habit_response(habit, stats[habit.id]) for habit in habits]
 
 
 @router.get("/{habit_id}", response_model=HabitResponse)
@@ -289,14 +107,8 @@ async def get_habit(
     if not habit:
         raise HTTPException(status_code=404, detail="Habit not found")
 
-    resp = HabitResponse.model_validate(habit)
-    resp.current_streak = await _compute_streak(db, habit.id, habit.cooldown_days)
-    resp.best_streak = await _compute_best_streak(db, habit.id, habit.cooldown_days)
-    completions = await _today_completions(db, habit.id)
-    resp.today_completions = completions
-    resp.completed_today = completions >= habit.daily_target
-    resp.completion_rate = await _completion_rate(db, habit.id)
-    return resp
+    stats = await get_habit_stats(db, [habit])
+    return _to_habit_response(habit, stats[habit.id])
 
 
 @router.put("/{habit_id}", response_model=HabitResponse)
@@ -316,18 +128,20 @@ async def update_habit(
     update_data = habit_data.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(habit, field, value)
+    if "cooldown_days" in update_data:
+        await rebuild_streak_states(db, [habit])
+    if "category" in update_data or "is_active" in update_data:
+        await refresh_daily_stats(db, current_user.id)
+    if "cooldown_days" in update_data or "is_active" in update_data:
+        await check_and_unlock(db, current_user.id, [AchievementEvent.HABIT_UPDATED])
 
     await db.commit()
     await db.refresh(habit)
+    if {"name", "category", "is_active"} & update_data.keys():
+        await apply_user_habits(db, current_user.id)
 
-    resp = HabitResponse.model_validate(habit)
-    resp.current_streak = await _compute_streak(db, habit.id, habit.cooldown_days)
-    resp.best_streak = await _compute_best_streak(db, habit.id, habit.cooldown_days)
-    completions = await _today_completions(db, habit.id)
-    resp.today_completions = completions
-    resp.completed_today = completions >= habit.daily_target
-    resp.completion_rate = await _completion_rate(db, habit.id)
-    return resp
+    stats = await get_habit_stats(db, [habit])
+    return _to_habit_response(habit, stats[habit.id])
 
 
 @router.delete("/{habit_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -343,82 +157,124 @@ async def delete_habit(
     if not habit:
         raise HTTPException(status_code=404, detail="Habit not found")
 
+    await record_habit_deletion(db, current_user.id, habit.id)
     await db.delete(habit)
+    await refresh_daily_stats(db, current_user.id)
     await db.commit()
+    await apply_user_habits(db, current_user.id)
 
 
 # --- Habit Logs ---
 
+async def _apply_log(
+    db: AsyncSession, user_id: int, log_data: HabitLogCreate
+) -> tuple[HabitLog, bool, bool | None]:
+    """
+    Create or update a habit log with a single atomic upsert (without committing).
+    Returns (log, created, was_completed); raises HTTPException if the habit is not found
+    or its daily target is already reached.
+    """
+    log, created, was_completed = await upsert_habit_log(
+        db, user_id, log_data.habit_id, log_data.date,
+        completed=log_data.completed,
+        note=log_data.note,
+        skipped_reason=log_data.skipped_reason,
+    )
+    if log is None:
+        result = await db.execute(
+            select(Habit.id).where(Habit.id == log_data.habit_id, Habit.user_id == user_id)
+        )
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail="Habit not found")
+        raise HTTPException(status_code=400, detail="Daily target already reached")
+    return log, created, was_completed
+
+
 @router.post("/log", response_model=HabitLogResponse, status_code=status.HTTP_201_CREATED)
 async def log_habit(
     log_data: HabitLogCreate,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    # Verify habit belongs to user
-    result = await db.execute(
-        select(Habit).where(Habit.id == log_data.habit_id, Habit.user_id == current_user.id)
-    )
-    habit = result.scalar_one_or_none()
-    if not habit:
-        raise HTTPException(status_code=404, detail="Habit not found")
+    # Ownership check, daily target check and upsert in one statement. The user's sync
+    # version is taken by a separate UPDATE just before it (see data_version): that row
+    # lock orders the user's concurrent writes ahead of the upsert's snapshot, so the
+    # previous state it returns for the streak already includes a concurrent tap.
+    log, _, was_completed = await _apply_log(db, current_user.id, log_data)
+
+    habit = await db.get(Habit, log.habit_id)
+    await apply_log_change(db, habit, log.date, was_completed, log.completed)
+    # The streak and the daily rollup stay in the request: the response, the habit list
+    # and analytics read them right away. Challenges and achievements are recomputed
+    # in the background; the mark commits with the log, so the work survives a restart.
+    await update_daily_stats(db, current_user.id, [log.date], [habit.category])
+    recompute_queue.mark_dirty(db, current_user.id, log_data.date)
+    await db.commit()
+    return log
 
-    # For multi-completion habits (daily_target > 1), always create new log if not at target
-    if habit.daily_target > 1 and log_data.completed:
-        completions = await _today_completions(db, habit.id, log_data.date)
-        if completions >= habit.daily_target:
-            raise HTTPException(status_code=400, detail="Daily target already reached")
-        log = HabitLog(
-            **log_data.model_dump(),
-            completed_at=datetime.now(timezone.utc),
-        )
-        db.add(log)
-        await db.commit()
-        await db.refresh(log)
-        await _recalculate_active_challenges(db, current_user.id, log_data.date)
-        await check_and_unlock(db, current_user.id)
-        await db.commit()
-        return log
-
-    # Check for duplicate log (single-completion habits)
+
+@router.post("/logs/batch", response_model=HabitLogBatchResponse)
+async def log_habits_batch(
+    batch: HabitLogBatchCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Upsert many logs in one transaction (offline sync).
+    Each item gets its own result; streaks and the daily rollup are updated once
+    for the whole batch, challenges and achievements are recomputed in the background.
+    """
+    habit_ids = {item.habit_id for item in batch.items}
     result = await db.execute(
-        select(HabitLog).where(
-            HabitLog.habit_id == log_data.habit_id,
-            HabitLog.date == log_data.date,
-        )
+        select(Habit).where(Habit.id.in_(habit_ids), Habit.user_id == current_user.id)
     )
-    existing = result.scalar_one_or_none()
-    if existing:
-        # Update existing log
-        existing.completed = log_data.completed
-        existing.note = log_data.note
-        existing.skipped_reason = log_data.skipped_reason
-        if log_data.completed:
-            existing.completed_at = datetime.now(timezone.utc)
-        await db.commit()
-        await db.refresh(existing)
-
-        await _recalculate_active_challenges(db, current_user.id, log_data.date)
-        # Check achievements after log update
-        await check_and_unlock(db, current_user.id)
-        await db.commit()
-
-        return existing
-
-    log = HabitLog(
-        **log_data.model_dump(),
-        completed_at=datetime.now(timezone.utc) if log_data.completed else None,
+    habit_by_id = {h.id: h for h in result.scalars().all()}
+
+    results: list[HabitLogBatchItem] = []
+    applied: list[tuple[HabitLogBatchItem, HabitLog]] = []
+    streak_changes: list[tuple[Habit, date, bool | None, bool]] = []
+    for item in batch.items:
+        habit = habit_by_id.get(item.habit_id)
+        if not habit:
+            results.append(HabitLogBatchItem(
+                habit_id=item.habit_id, date=item.date, status="error", detail="Habit not found",
+            ))
+            continue
+        try:
+            log, created, was_completed = await _apply_log(db, current_user.id, item)
+        except HTTPException as exc:
+            results.append(HabitLogBatchItem(
+                habit_id=item.habit_id, date=item.date, status="error", detail=exc.detail,
+            ))
+            continue
+        streak_changes.append((habit, log.date, was_completed, log.completed))
+        entry = HabitLogBatchItem(
+            habit_id=item.habit_id, date=item.date, status="created" if created else "updated",
+        )
+        results.append(entry)
+        applied.append((entry, log))
+
+    if not applied:
+        return HabitLogBatchResponse(results=results, failed=len(results))
+
+    # Streaks are updated once for everything touched by the batch
+    await apply_log_changes(db, streak_changes)
+    dates = [log.date for _, log in applied]
+    await update_daily_stats(
+        db, current_user.id, dates, [habit.category for habit, *_ in streak_changes]
     )
-    db.add(log)
+    recompute_queue.mark_dirty(db, current_user.id, min(dates), max(dates))
     await db.commit()
-    await db.refresh(log)
 
-    await _recalculate_active_challenges(db, current_user.id, log_data.date)
-    # Check achievements after logging
-    await check_and_unlock(db, current_user.id)
-    await db.commit()
+    for entry, log in applied:
+        entry.log = HabitLogResponse.model_validate(log)
 
-    return log
+    return HabitLogBatchResponse(
+        results=results,
+        created=sum(1 for r in results if r.status == "created"),
+        updated=sum(1 for r in results if r.status == "updated"),
+        failed=sum(1 for r in results if r.status == "error"),
+    )
 
 
 @router.get("/{habit_id}/logs", response_model=list[HabitLogResponse])
@@ -14,6 +14,7 @@ from app.schemas.mood import (
     MoodLogCreate, MoodLogResponse, MoodAnalytics, MoodHabitCorrelation,
 )
 from app.api.auth_utils import get_current_user
+from app.services.compute_executor import compute_executor
 import numpy as np
 
 router = APIRouter(prefix="/mood", tags=["mood"])
@@ -207,9 +208,26 @@ async def _compute_mood_habit_correlations(
     for log in all_logs:
         habit_logs_map.setdefault(log.habit_id, {})[log.date] = log.completed
 
+    return await compute_executor.run(
+        "mood_correlations",
+        correlate_mood_with_habits,
+        [(h.id, h.name) for h in habits],
+        mood_by_date,
+        habit_logs_map,
+        fallback=list,
+    )
+
+
+def correlate_mood_with_habits(
+    habits: list[tuple[int, str]],
+    mood_by_date: dict[date, int],
+    habit_logs_map: dict[int, dict[date, bool]],
+) -> list[MoodHabitCorrelation]:
+    """Pearson correlation of mood scores with each habit's completion, strongest first."""
+    dates = sorted(mood_by_date.keys())
     correlations = []
-    for habit in habits:
-        h_logs = habit_logs_map.get(habit.id, {})
+    for habit_id, habit_name in habits:
+        h_logs = habit_logs_map.get(habit_id, {})
         if not h_logs:
             continue
 
@@ -233,23 +251,23 @@ async def _compute_mood_habit_correlations(
 
         if abs(corr) < 0.1:
             interpretation = "neutral"
-            desc = f"Нет явной связи между '{habit.name}' и настроением"
+            desc = f"Нет явной связи между '{habit_name}' и настроением"
         elif corr > 0.3:
             interpretation = "positive"
-            desc = f"Выполнение '{habit.name}' связано с улучшением настроения (+{corr:.0%})"
+            desc = f"Выполнение '{habit_name}' связано с улучшением настроения (+{corr:.0%})"
         elif corr > 0:
             interpretation = "positive"
-            desc = f"'{habit.name}' слегка улучшает настроение (+{corr:.0%})"
+            desc = f"'{habit_name}' слегка улучшает настроение (+{corr:.0%})"
         elif corr < -0.3:
             interpretation = "negative"
-            desc = f"'{habit.name}' может быть связана со снижением настроения ({corr:.0%})"
+            desc = f"'{habit_name}' может быть связана со снижением настроения ({corr:.0%})"
         else:
             interpretation = "negative"
-            desc = f"'{habit.name}' слегка снижает настроение ({corr:.0%})"
+            desc = f"'{habit_name}' слегка снижает настроение ({corr:.0%})"
 
         correlations.append(MoodHabitCorrelation(
-            habit_id=habit.id,
-            habit_name=habit.name,
+            habit_id=habit_id,
+            habit_name=habit_name,
             correlation=round(corr, 3),
             interpretation=interpretation,
             description=desc,
@@ -11,6 +11,9 @@ from app.models.device_token import DeviceToken
 from app.schemas.analytics import NotificationResponse
 from app.schemas.user import DeviceTokenRegisterRequest
 from app.api.auth_utils import get_current_user
+from app.models.sync_tombstone import SyncEntity
+from app.services.sync import record_deletions
+from app.services.data_version import next_change_seq
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
@@ -103,13 +106,14 @@ async def mark_all_as_read(
     current_user: User = Depends(get_current_user),
 ):
     """Mark all notifications as read."""
+    change_seq = await next_change_seq(db, current_user.id, data_changed=False)
     await db.execute(
         update(Notification)
         .where(
             Notification.user_id == current_user.id,
             Notification.is_read == False,
         )
-        .values(is_read=True)
+        .values(is_read=True, change_seq=change_seq)
     )
     await db.commit()
     return {"message": "All notifications marked as read"}
@@ -133,6 +137,7 @@ async def delete_notification(
         return {"message": "Notification not found"}
 
     await db.delete(notification)
+    record_deletions(db, current_user.id, SyncEntity.NOTIFICATION, [notification.id])
     await db.commit()
     return {"message": "Notification deleted"}
 
@@ -143,9 +148,12 @@ async def clear_all_notifications(
     current_user: User = Depends(get_current_user),
 ):
     """Delete all notifications for the current user."""
-    await db.execute(
-        delete(Notification).where(Notification.user_id == current_user.id)
+    result = await db.execute(
+        delete(Notification)
+        .where(Notification.user_id == current_user.id)
+        .returning(Notification.id)
     )
+    record_deletions(db, current_user.id, SyncEntity.NOTIFICATION, result.scalars().all())
     await db.commit()
     return {"message": "All notifications cleared"}
 
@@ -7,10 +7,14 @@ from app.models.habit import Habit
 from app.schemas.analytics import RecommendationResponse
 from app.api.auth_utils import get_current_user
 from app.ml.recommender import HabitRecommender
-from app.ml.pattern_analyzer import PatternAnalyzer
 from app.ml.classifier import HabitDifficultyClassifier
+from app.ml.model_registry import DIFFICULTY_MODEL, model_registry
 from app.nlp.prompts import build_motivation_message, build_recovery_message
-from app.api.routes.habits import _compute_streak
+from app.services.streak_state import get_current_streaks
+from app.services.user_cache import cached_for_user
+from app.services.pattern_profiles import get_pattern_profile
+from app.services.compute_executor import compute_executor
+from app.services.log_frames import get_logs_dataframe, has_logs
 
 router = APIRouter(prefix="/recommendations", tags=["recommendations"])
 
@@ -20,12 +24,15 @@ async def get_recommendations(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    analyzer = PatternAnalyzer()
-    classifier = HabitDifficultyClassifier()
-    classifier.load_model()
+    return await _build_recommendations(db, current_user)
 
-    # Get log data
-    df = await analyzer.get_logs_dataframe(db, current_user.id)
+
+# Collaborative and LLM recommendations also depend on other users' data,
+# so the cached result is refreshed hourly even without changes of this user
+@cached_for_user("recommendations", ttl=3600)
+async def _build_recommendations(db: AsyncSession, current_user: User) -> RecommendationResponse:
+    # Trained nightly and kept in memory; rule-based until a version is published
+    classifier = model_registry.current(DIFFICULTY_MODEL) or HabitDifficultyClassifier()
 
     rule_recs = await HabitRecommender.get_rule_based_recommendations(db, current_user.id)
     collab_recs = await HabitRecommender.get_collaborative_recommendations(db, current_user.id)
@@ -38,25 +45,27 @@ async def get_recommendations(
     
     all_recommendations = rule_recs + collab_recs + llm_recs
 
-    # Tips from pattern analysis
+    # Tips from the stored pattern profile (empty when it could not be computed)
     tips = []
-    if not df.empty:
-        dangers = analyzer.find_danger_periods(df)
-        for d in dangers:
+    if await has_logs(db, current_user.id):
+        profile = await get_pattern_profile(db, current_user.id)
+        for d in profile.dangers:
             tips.append(d["message"])
 
-        optimal = analyzer.find_optimal_time(df)
-        if optimal["optimal_hour"] is not None:
-            tips.append(f"Твоё самое продуктивное время — {optimal['optimal_hour']:02d}:00. Попробуй планировать привычки на это время!")
+        if profile.optimal_hour is not None:
+            tips.append(f"Твоё самое продуктивное время — {profile.optimal_hour:02d}:00. Попробуй планировать привычки на это время!")
 
-        # Difficulty classification
-        difficulties = classifier.predict(df)
+        # Difficulty classification; the log frame is only built when the profile has none
+        difficulties = profile.difficulties
+        if not difficulties:
+            df = await get_logs_dataframe(db, current_user.id)
+            if df is not None and not df.empty:
+                difficulties = await compute_executor.run(
+                    "difficulty_predict", classifier.predict, df, fallback=list
+                )
         hard_habits = [d for d in difficulties if d["difficulty"] == "hard"]
         for h in hard_habits:
             tips.append(f"Привычка '{h['habit_name']}' даётся сложнее всего ({h['completion_rate']}%). Попробуй упростить её или разбить на мелкие шаги.")
-
-        # Train model if enough data
-        classifier.train(df)
     else:
         tips.append("Добавь привычки и начни их отмечать — и я смогу давать персонализированные советы!")
 
@@ -68,10 +77,11 @@ async def get_recommendations(
 
     motivation = "Начни свой путь к лучшим привычкам! 🚀"
     if habits:
+        streaks = await get_current_streaks(db, habits)
         best_streak = 0
         best_habit_name = ""
         for h in habits:
-            s = await _compute_streak(db, h.id)
+            s = streaks[h.id]
             if s > best_streak:
                 best_streak = s
                 best_habit_name = h.name
@@ -0,0 +1,114 @@
+"""
+Sync routes — дельта-синхронизация для мобильного клиента.
+Без курсора отдаётся полный снимок, с курсором — только изменённые
+и удалённые с тех пор привычки, логи, записи настроения и уведомления.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from datetime import date, datetime, timedelta, timezone
+from app.db.database import get_db
+from app.models.user import User
+from app.models.habit import Habit
+from app.models.habit_log import HabitLog
+from app.models.mood_log import MoodLog
+from app.models.notification import Notification
+from app.schemas.sync import SyncResponse
+from app.api.auth_utils import get_current_user
+from app.api.routes.habits import _to_habit_response
+from app.services.habit_stats import get_habit_stats
+from app.services.sync import (
+    TOMBSTONE_RETENTION, parse_cursor, make_cursor, get_deletions,
+)
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+
+@router.get("/", response_model=SyncResponse)
+async def sync(
+    cursor: str | None = None,
+    days: int = Query(30, ge=1, le=365),
+    local_date: str = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Return everything that changed since `cursor` plus a new cursor.
+    Without a cursor (or with one older than the tombstone retention, or a timestamp
+    cursor of an older client) a full snapshot is returned; `days` limits how much
+    log/mood/notification history it includes.
+    """
+    started_at = datetime.now(timezone.utc)
+    try:
+        user_date = datetime.strptime(local_date, "%Y-%m-%d").date() if local_date else date.today()
+    except Exception:
+        user_date = date.today()
+
+    since = None
+    if cursor:
+        try:
+            since = parse_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid sync cursor")
+        if since is not None and since[1] < started_at - TOMBSTONE_RETENTION:
+            since = None
+
+    # Read before the rows: every change up to this version is already committed
+    result = await db.execute(select(User.sync_version).where(User.id == current_user.id))
+    sync_version = result.scalar_one()
+
+    result = await db.execute(select(Habit).where(Habit.user_id == current_user.id))
+    all_habits = result.scalars().all()
+    habit_ids = [h.id for h in all_habits]
+
+    if since is None:
+        history_since = date.today() - timedelta(days=days)
+        logs_query = select(HabitLog).where(
+            HabitLog.habit_id.in_(habit_ids), HabitLog.date >= history_since
+        )
+        moods_query = select(MoodLog).where(
+            MoodLog.user_id == current_user.id, MoodLog.date >= history_since
+        )
+        notifications_query = select(Notification).where(
+            Notification.user_id == current_user.id,
+            Notification.created_at >= started_at - timedelta(days=days),
+        )
+    else:
+        since_version, issued_at = since
+        logs_query = select(HabitLog).where(
+            HabitLog.habit_id.in_(habit_ids), HabitLog.change_seq > since_version
+        )
+        moods_query = select(MoodLog).where(
+            MoodLog.user_id == current_user.id, MoodLog.change_seq > since_version
+        )
+        notifications_query = select(Notification).where(
+            Notification.user_id == current_user.id, Notification.change_seq > since_version
+        )
+
+    logs = (await db.execute(logs_query.order_by(HabitLog.date, HabitLog.id))).scalars().all()
+    moods = (await db.execute(moods_query.order_by(MoodLog.date))).scalars().all()
+    notifications = (
+        await db.execute(notifications_query.order_by(Notification.created_at.desc()))
+    ).scalars().all()
+
+    # Habit stats (streaks, today's completions) depend on logs and on the current day,
+    # so a habit is resent when it or its logs changed, and all habits once per day.
+    if since is None or issued_at.date() < started_at.date():
+        habits = all_habits
+    else:
+        result = await db.execute(
+            select(Habit.id).where(Habit.user_id == current_user.id, Habit.change_seq > since_version)
+        )
+        touched = set(result.scalars().all()) | {log.habit_id for log in logs}
+        habits = [h for h in all_habits if h.id in touched]
+    stats = await get_habit_stats(db, habits, local_date=user_date)
+
+    return SyncResponse(
+        cursor=make_cursor(sync_version, started_at),
+        full=since is None,
+        habits=[_to_habit_response(h, stats[h.id]) for h in habits],
+        logs=logs,
+        moods=moods,
+        notifications=notifications,
+        deleted=await get_deletions(db, current_user.id, since_version) if since else {},
+    )
@@ -44,6 +44,49 @@ class Settings(BaseSettings):
     MIN_LOGS_FOR_ML: int = 30  # Minimum habit logs before ML kicks in
     MIN_USERS_FOR_COLLAB: int = 10  # Minimum users for collaborative filtering
 
+    # Background recompute of challenges and achievements after log writes
+    RECOMPUTE_DEBOUNCE_SECONDS: float = 2.0
+    RECOMPUTE_MAX_CONCURRENCY: int = 4
+    RECOMPUTE_POLL_SECONDS: float = 30.0  # picks up marks left by other or restarted workers
+
+    # AI insights on the analytics dashboard (stale-while-revalidate store)
+    AI_INSIGHT_TTL_SECONDS: int = 6 * 3600
+    AI_INSIGHT_RETENTION_DAYS: int = 7
+
+    # Per-user cache of derived data keyed by users.data_version
+    USER_CACHE_BACKEND: str = "memory"  # memory | sqlite (shared by workers on a host) | none
+    USER_CACHE_MAX_ENTRIES: int = 10_000
+    USER_CACHE_MAX_MB: int = 64
+    USER_CACHE_SQLITE_PATH: str = "data/user_cache.db"
+    USER_CACHE_TTL_SECONDS: int = 24 * 3600
+
+    # Nightly pattern profiles (computed in a process pool)
+    PATTERN_PROFILE_WORKERS: int = 2
+    PATTERN_PROFILE_CHUNK_SIZE: int = 200  # users per batch sent to a worker
+    PATTERN_PROFILE_MAX_AGE_DAYS: int = 2  # older profiles are recomputed on demand
+
+    # CPU-bound ML work (pandas/sklearn) runs off the event loop
+    COMPUTE_EXECUTOR: str = "thread"  # thread | process | inline (on the event loop)
+    COMPUTE_MAX_WORKERS: int = 2
+    COMPUTE_MAX_PENDING: int = 32  # calls beyond this fall back immediately
+    COMPUTE_TIMEOUT_SECONDS: float = 10.0
+
+    # Versioned ML models in MODEL_STORE_PATH, trained by background jobs
+    MODEL_REGISTRY_POLL_SECONDS: float = 60.0  # how often workers look for a new version
+    MODEL_REGISTRY_KEEP_VERSIONS: int = 3
+    DIFFICULTY_MODEL_WARM_START: bool = True  # nightly retrain adds trees for changed habits only
+    DIFFICULTY_MODEL_MAX_TREES: int = 150  # beyond this the model is retrained from scratch
+    COLLAB_INDEX_REFRESH_SECONDS: float = 30.0  # how often a worker applies habit changes to its index
+    # MinHash/LSH over habit names: more bands, fewer rows per band and more candidates
+    # raise the recall of similar users (bands and rows take effect on the next index build)
+    COLLAB_LSH_BANDS: int = 16
+    COLLAB_LSH_ROWS: int = 2
+    COLLAB_LSH_MAX_CANDIDATES: int = 256
+
+    # Daily completion-probability scores of all active habits
+    COMPLETION_RISK_THRESHOLD: float = 0.5  # habits scored below are "at risk"
+    COMPLETION_SCORE_RETENTION_DAYS: int = 30
+
     model_config = {"env_file": ".env", "extra": "ignore"}
 
 
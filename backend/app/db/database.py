@@ -19,6 +19,15 @@ class Base(DeclarativeBase):
     pass
 
 
+def insert_for_dialect(dialect_name: str):
+    """Dialect-specific insert() construct (supports on_conflict_do_update/do_nothing)."""
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert
+
+
 async def get_db() -> AsyncSession:
     async with AsyncSessionLocal() as session:
         try:
@@ -33,6 +42,8 @@ async def init_db():
         from app.models import user, habit, habit_log, chat_session, chat_message, user_activity  # noqa
         from app.models import friendship, achievement, notification  # noqa
         from app.models import mood_log, challenge, device_token  # noqa
+        from app.models import habit_streak, user_daily_stat, sync_tombstone, ai_insight, pattern_profile  # noqa
+        from app.models import habit_completion_score, recompute_mark  # noqa
         await conn.run_sync(Base.metadata.create_all)
         await conn.run_sync(_run_dev_chat_migrations)
 
@@ -89,6 +100,57 @@ def _run_dev_chat_migrations(sync_conn):
         sync_conn.execute(
             text("ALTER TABLE users ADD COLUMN email_verification_expires_at TIMESTAMP WITH TIME ZONE")
         )
+    if "data_version" not in user_columns:
+        sync_conn.execute(
+            text("ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0")
+        )
+    if "sync_version" not in user_columns:
+        sync_conn.execute(
+            text("ALTER TABLE users ADD COLUMN sync_version INTEGER NOT NULL DEFAULT 0")
+        )
+
+    # Change tracking for delta sync
+    for table in ("habits", "habit_logs", "mood_logs", "notifications"):
+        columns = {column["name"] for column in inspector.get_columns(table)}
+        if "updated_at" not in columns:
+            sync_conn.execute(
+                text(f"ALTER TABLE {table} ADD COLUMN updated_at TIMESTAMP WITH TIME ZONE")
+            )
+            sync_conn.execute(
+                text(f"UPDATE {table} SET updated_at = created_at WHERE updated_at IS NULL")
+            )
+            sync_conn.execute(
+                text(f"CREATE INDEX IF NOT EXISTS ix_{table}_updated_at ON {table} (updated_at)")
+            )
+
+    # Delta sync cursor (users.sync_version of the last write)
+    for table, owner in (
+        ("habits", "user_id"), ("habit_logs", "habit_id"), ("mood_logs", "user_id"),
+        ("notifications", "user_id"), ("sync_tombstones", "user_id"),
+    ):
+        columns = {column["name"] for column in inspector.get_columns(table)}
+        if "change_seq" not in columns:
+            sync_conn.execute(
+                text(f"ALTER TABLE {table} ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0")
+            )
+            sync_conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_{owner}_change_seq ON {table} ({owner}, change_seq)"
+            ))
+
+    # One row per habit per day with a completions counter
+    habit_log_columns = {column["name"] for column in inspector.get_columns("habit_logs")}
+    if "completions" not in habit_log_columns:
+        sync_conn.execute(
+            text("ALTER TABLE habit_logs ADD COLUMN completions INTEGER NOT NULL DEFAULT 0")
+        )
+        sync_conn.execute(text("ALTER TABLE habit_logs ADD COLUMN completion_times TEXT"))
+        _fold_habit_log_duplicates(sync_conn)
+    sync_conn.execute(
+        text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_habit_logs_habit_date "
+            "ON habit_logs (habit_id, date)"
+        )
+    )
 
     chat_message_columns = {
         column["name"] for column in inspector.get_columns("chat_messages")
@@ -164,3 +226,95 @@ def _run_dev_chat_migrations(sync_conn):
         )
         existing_sessions.add(chat_id)
 
+
+def _fold_habit_log_duplicates(sync_conn):
+    """
+    Fold same-day logs of a habit (one row per completion) into a single row
+    with a completions counter, fill completion_times and drop the extra rows.
+    """
+    from itertools import groupby
+    from sqlalchemy import bindparam, Boolean, Date, DateTime, Integer, String
+    from app.models.habit_log import TimestampList
+    from app.models.user_daily_stat import UserDailyStat
+    from app.services.daily_stats import _rollup_select
+
+    rows = sync_conn.execute(
+        text(
+            """
+            SELECT habit_logs.id, habit_logs.habit_id, habit_logs.date, habit_logs.completed,
+                   habit_logs.completed_at, habit_logs.note, habits.user_id
+            FROM habit_logs JOIN habits ON habits.id = habit_logs.habit_id
+            ORDER BY habit_logs.habit_id, habit_logs.date, habit_logs.id
+            """
+        ).columns(
+            id=Integer, habit_id=Integer, date=Date, completed=Boolean,
+            completed_at=DateTime(timezone=True), note=String, user_id=Integer,
+        )
+    ).all()
+
+    now = datetime.now(timezone.utc)
+    updates, removed, affected_users = [], [], set()
+    for _, group in groupby(rows, key=lambda row: (row.habit_id, row.date)):
+        keep, *duplicates = list(group)
+        completed = [row for row in (keep, *duplicates) if row.completed]
+        times = sorted(row.completed_at for row in completed if row.completed_at)
+        if not completed and not duplicates:
+            continue
+        updates.append({
+            "log_id": keep.id,
+            "completed": bool(completed),
+            "completions": len(completed),
+            "completed_at": times[-1] if times else keep.completed_at,
+            "completion_times": times,
+            "note": next((row.note for row in (keep, *duplicates) if row.note), None),
+            "updated_at": now if duplicates else None,
+        })
+        removed.extend((keep.user_id, row.id) for row in duplicates)
+        if duplicates:
+            affected_users.add(keep.user_id)
+
+    if updates:
+        sync_conn.execute(
+            text(
+                """
+                UPDATE habit_logs SET completed = :completed, completions = :completions,
+                    completed_at = :completed_at, completion_times = :completion_times,
+                    note = :note, updated_at = COALESCE(:updated_at, updated_at)
+                WHERE id = :log_id
+                """
+            ).bindparams(
+                bindparam("completed", type_=Boolean),
+                bindparam("completed_at", type_=DateTime(timezone=True)),
+                bindparam("completion_times", type_=TimestampList),
+                bindparam("updated_at", type_=DateTime(timezone=True)),
+            ),
+            updates,
+        )
+    if removed:
+        sync_conn.execute(
+            text("DELETE FROM habit_logs WHERE id = :log_id"),
+            [{"log_id": log_id} for _, log_id in removed],
+        )
+        # Clients drop the folded rows on their next delta sync
+        sync_conn.execute(
+            text(
+                "INSERT INTO sync_tombstones (user_id, entity, entity_id, deleted_at) "
+                "VALUES (:user_id, 'habit_log', :log_id, :deleted_at)"
+            ).bindparams(bindparam("deleted_at", type_=DateTime(timezone=True))),
+            [
+                {"user_id": user_id, "log_id": log_id, "deleted_at": now}
+                for user_id, log_id in removed
+            ],
+        )
+        # Daily rollup counts logs, so rebuild it for the affected users
+        user_ids = sorted(affected_users)
+        sync_conn.execute(
+            UserDailyStat.__table__.delete().where(UserDailyStat.user_id.in_(user_ids))
+        )
+        sync_conn.execute(
+            UserDailyStat.__table__.insert().from_select(
+                ["user_id", "date", "category", "logged", "completed",
+                 "active_logged", "active_completed"],
+                _rollup_select(user_ids, None),
+            )
+        )
@@ -1,15 +1,35 @@
 """
 Habit Difficulty Classifier — определяет, какие привычки даются легко, а какие сложно.
 Использует RandomForest при достаточном количестве данных, иначе — rule-based fallback.
+Модель обучается фоновой задачей и публикуется в model_registry; запросы только
+предсказывают загруженной версией.
 """
 import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder
-import joblib
-import os
-from pathlib import Path
 from app.config import get_settings
+from app.models.habit import HabitCategory
+
+FEATURES = ["completion_rate", "total_logs", "avg_day_of_week",
+            "std_day_of_week", "avg_hour", "category_encoded"]
+# Fixed codes, so warm-started versions keep the encoding of earlier trees
+CATEGORY_CODES = {category.value: code for code, category in enumerate(HabitCategory)}
+
+N_ESTIMATORS = 50
+WARM_START_TREES = 10  # trees added per incremental retrain
+MAX_SAMPLES = 100_000  # bootstrap rows per tree, bounds training time on large platforms
+
+
+def encode_categories(categories: pd.Series) -> np.ndarray:
+    """Category codes of CATEGORY_CODES (-1 for unknown); takes HabitCategory members or values."""
+    return pd.Series(categories, dtype=object).map(CATEGORY_CODES).fillna(-1).to_numpy(dtype=np.int8)
+
+
+def rule_labels(completion_rates: np.ndarray) -> np.ndarray:
+    """Rule-based difficulty of many habits at once (see HabitDifficultyClassifier._label_difficulty)."""
+    return np.select(
+        [completion_rates >= 0.75, completion_rates >= 0.45], ["easy", "medium"], "hard"
+    ).astype(object)
 
 
 class HabitDifficultyClassifier:
@@ -17,23 +37,21 @@ class HabitDifficultyClassifier:
 
     def __init__(self):
         self.model: RandomForestClassifier | None = None
-        self.category_encoder = LabelEncoder()
         self.is_trained = False
-        settings = get_settings()
-        self.model_dir = Path(settings.MODEL_STORE_PATH)
-        self.model_dir.mkdir(parents=True, exist_ok=True)
 
-    def _extract_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Extract features per habit from log data."""
-        features = df.groupby(["habit_id", "habit_name", "category"]).agg(
+    def _extract_features(self, df: pd.DataFrame, by: tuple[str, ...] = ()) -> pd.DataFrame:
+        """Extract features per habit from log data (grouped by the `by` columns first)."""
+        features = df.groupby([*by, "habit_id", "habit_name", "category"], observed=True).agg(
             completion_rate=("completed", "mean"),
             total_logs=("completed", "count"),
             avg_day_of_week=("day_of_week", "mean"),
             std_day_of_week=("day_of_week", "std"),
-            avg_hour=("hour", lambda x: x.dropna().mean() if x.dropna().any() else 12),
+            avg_hour=("hour", "mean"),
         ).reset_index()
 
         features["std_day_of_week"] = features["std_day_of_week"].fillna(0)
+        # Habits without completion times get noon, as the SQL features of model_training
+        features["avg_hour"] = features["avg_hour"].astype("float64").fillna(12)
         return features
 
     def _label_difficulty(self, completion_rate: float) -> str:
@@ -46,77 +64,89 @@ class HabitDifficultyClassifier:
             return "hard"
 
     def train(self, df: pd.DataFrame) -> bool:
-        """Train classifier on user's habit log data. Returns True if ML model trained."""
+        """Train classifier on a habit log frame. Returns True if ML model trained."""
         if df.empty:
             return False
-
-        features = self._extract_features(df)
+        return self.fit_features(self._extract_features(df))
+
+    def fit_features(self, features: pd.DataFrame, warm_start: bool = False) -> bool:
+        """
+        Train on per-habit features (see _extract_features), e.g. of all users at once.
+        With warm_start, WARM_START_TREES trees fitted on `features` (the changed habits)
+        are added to the trained model; returns False when that is not possible
+        (no trained model, or the new data lacks a difficulty label) and a full retrain is needed.
+        """
         if len(features) < 3:
             return False
 
-        # Create labels from completion rates
-        features["difficulty"] = features["completion_rate"].apply(self._label_difficulty)
-
-        # Encode category
-        features["category_encoded"] = self.category_encoder.fit_transform(
-            features["category"].astype(str)
-        )
-
-        X = features[["completion_rate", "total_logs", "avg_day_of_week",
-                       "std_day_of_week", "avg_hour", "category_encoded"]].values
-        y = features["difficulty"].values
+        y = rule_labels(features["completion_rate"].to_numpy(dtype=np.float64))
+        X = self._feature_matrix(features, encode_categories(features["category"]))
+        max_samples = min(MAX_SAMPLES, len(X))
+
+        if warm_start:
+            if not self.is_trained or set(np.unique(y)) != set(self.model.classes_):
+                return False
+            self.model.set_params(
+                warm_start=True,
+                n_estimators=self.model.n_estimators + WARM_START_TREES,
+                max_samples=max_samples,
+            )
+            self.model.fit(X, y)
+            return True
 
         settings = get_settings()
         if len(features) >= settings.MIN_LOGS_FOR_ML:
-            self.model = RandomForestClassifier(n_estimators=50, random_state=42, max_depth=5)
+            self.model = RandomForestClassifier(
+                n_estimators=N_ESTIMATORS, random_state=42, max_depth=5, max_samples=max_samples
+            )
             self.model.fit(X, y)
             self.is_trained = True
-
-            # Save model
-            joblib.dump(self.model, self.model_dir / "difficulty_classifier.pkl")
-            joblib.dump(self.category_encoder, self.model_dir / "category_encoder.pkl")
             return True
 
         return False
 
+    @staticmethod
+    def _feature_matrix(features: pd.DataFrame, category_codes: np.ndarray) -> np.ndarray:
+        # float32, as the trees use internally
+        return np.column_stack([features[FEATURES[:-1]].to_numpy(dtype=np.float32), category_codes])
+
+    def predict_many(self, features: pd.DataFrame) -> np.ndarray:
+        """
+        Difficulty labels for per-habit features (see _extract_features) of one user or many,
+        scored in one model call. Habits of unknown categories, and all habits while there
+        is no trained model, get the rule-based label.
+        """
+        labels = rule_labels(features["completion_rate"].to_numpy(dtype=np.float64))
+        if not (self.is_trained and self.model) or features.empty:
+            return labels
+        codes = encode_categories(features["category"])
+        known = codes >= 0
+        if known.any():
+            labels[known] = self.model.predict(self._feature_matrix(features[known], codes[known]))
+        return labels
+
     def predict(self, df: pd.DataFrame) -> list[dict]:
-        """Predict difficulty for each habit. Falls back to rule-based if no ML model."""
-        if df.empty:
-            return []
-
-        features = self._extract_features(df)
-        results = []
-
-        for _, row in features.iterrows():
-            if self.is_trained and self.model:
-                try:
-                    cat_encoded = self.category_encoder.transform([str(row["category"])])[0]
-                    X = np.array([[row["completion_rate"], row["total_logs"],
-                                   row["avg_day_of_week"], row["std_day_of_week"],
-                                   row["avg_hour"], cat_encoded]])
-                    difficulty = self.model.predict(X)[0]
-                except (ValueError, KeyError):
-                    difficulty = self._label_difficulty(row["completion_rate"])
-            else:
-                difficulty = self._label_difficulty(row["completion_rate"])
-
-            results.append({
-                "habit_id": int(row["habit_id"]),
-                "habit_name": row["habit_name"],
+        """Predict difficulty for each habit of a log frame. Falls back to rule-based if no ML model."""
+        return self.predict_frames([df])[0]
+
+    def predict_frames(self, frames: list[pd.DataFrame]) -> list[list[dict]]:
+        """predict() for the log frames of many users, with all habits scored in one model call."""
+        parts = [df.assign(frame=i) for i, df in enumerate(frames) if not df.empty]
+        if not parts:
+            return [[] for _ in frames]
+        features = self._extract_features(pd.concat(parts, ignore_index=True), by=("frame",))
+        sizes = np.bincount(features["frame"], minlength=len(frames))
+        results = [
+            {
+                "habit_id": int(habit_id),
+                "habit_name": habit_name,
                 "difficulty": difficulty,
-                "completion_rate": round(row["completion_rate"] * 100, 1),
-            })
-
-        return results
-
-    def load_model(self) -> bool:
-        """Try to load a previously trained model."""
-        model_path = self.model_dir / "difficulty_classifier.pkl"
-        encoder_path = self.model_dir / "category_encoder.pkl"
-        if model_path.exists() and encoder_path.exists():
-            self.model = joblib.load(model_path)
-            self.category_encoder = joblib.load(encoder_path)
-            self.is_trained = True
-            return True
-        return False
-
+                "completion_rate": round(float(rate) * 100, 1),
+            }
+            for habit_id, habit_name, difficulty, rate in zip(
+                features["habit_id"], features["habit_name"],
+                self.predict_many(features), features["completion_rate"],
+            )
+        ]
+        bounds = np.cumsum([0, *sizes])
+        return [results[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
@@ -0,0 +1,382 @@
+"""
+Collaborative Index — разреженные матрицы для коллаборативной фильтрации.
+- users × categories хранится разложенным: у каждой строки есть номер набора
+  категорий, а наборы (их не больше 2^10) — строки разреженной матрицы,
+  нормированные по L2. Косинусная близость ко всем пользователям — одно
+  произведение этой матрицы на вектор, и время запроса не растёт с числом
+  пользователей: похожие берутся из списков участников лучших наборов;
+- users × habits: какие привычки (нормализованное название + категория) есть
+  у пользователя, для подсказок от похожих пользователей;
+- users × names и MinHash/LSH: подписи множеств нормализованных названий
+  привычек, разбитые на полосы; пользователи с совпадающей полосой попадают
+  в одну корзину. Кандидаты из корзин пользователя сравниваются по точному
+  коэффициенту Жаккара, так что «пользователи как я» находятся без перебора
+  всех. Полнота настраивается числом полос, строк в полосе и кандидатов.
+
+Индекс строится целиком ночной задачей (model_registry), а процессы
+дополняют его изменениями: строки изменившихся пользователей помечаются
+неактуальными, новые строки дописываются в конец, и матрицы уплотняются,
+когда неактуальных строк становится много.
+"""
+import hashlib
+from datetime import datetime
+import numpy as np
+import scipy.sparse as sp
+from app.models.habit import HabitCategory
+
+CATEGORIES = list(HabitCategory)
+_CATEGORY_CODES = {category.value: code for code, category in enumerate(CATEGORIES)}
+# Share of stale rows after which the matrices are rebuilt from the live rows
+COMPACT_STALE_RATIO = 0.2
+
+# MinHash: h(x) = (a·x + b) mod p over name hashes reduced mod p, so a·x fits in int64
+MERSENNE_PRIME = (1 << 31) - 1
+LSH_SEED = 42  # the same hash functions in every build
+SIGNATURE_CHUNK_ROWS = 8192
+# New LSH entries are kept in a small sorted tail, merged into the main tables past this share
+LSH_MERGE_RATIO = 0.25
+
+
+def normalize_habit_name(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+def _name_hash(name: str) -> int:
+    # Stable across processes, unlike hash()
+    digest = hashlib.blake2b(name.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % MERSENNE_PRIME
+
+
+def _sorted_tables(keys: np.ndarray, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Per band; stable, so within a bucket earlier rows stay first
+    order = np.argsort(keys, axis=1, kind="stable")
+    return np.take_along_axis(keys, order, axis=1), np.take_along_axis(rows, order, axis=1)
+
+
+class _RowMatrix:
+    """
+    Binary CSR matrix that grows by appending rows: the arrays are over-allocated,
+    so appending copies only the new rows, not the whole matrix.
+    """
+
+    def __init__(self):
+        self.n_rows = self.n_columns = self.nnz = 0
+        self._data = np.ones(0, dtype=np.float32)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._indptr = np.zeros(1, dtype=np.int32)
+
+    def append(self, rows: sp.csr_matrix, n_columns: int) -> None:
+        nnz, n_rows = self.nnz + rows.nnz, self.n_rows + rows.shape[0]
+        if nnz > len(self._indices):
+            capacity = max(nnz, 2 * len(self._indices))
+            self._data = np.ones(capacity, dtype=np.float32)
+            self._indices = np.resize(self._indices, capacity)
+        if n_rows + 1 > len(self._indptr):
+            self._indptr = np.resize(self._indptr, max(n_rows + 1, 2 * len(self._indptr)))
+        self._indices[self.nnz:nnz] = rows.indices
+        self._indptr[self.n_rows + 1:n_rows + 1] = rows.indptr[1:] + self.nnz
+        self.n_rows, self.n_columns, self.nnz = n_rows, n_columns, nnz
+
+    def matrix(self) -> sp.csr_matrix:
+        """The rows as a CSR matrix (a view, valid until the next change)."""
+        return sp.csr_matrix(
+            (self._data[:self.nnz], self._indices[:self.nnz], self._indptr[:self.n_rows + 1]),
+            shape=(self.n_rows, self.n_columns),
+        )
+
+    def take(self, rows: np.ndarray) -> None:
+        """Keep only the given rows."""
+        kept = self.matrix()[rows]
+        self.__init__()
+        self.append(kept, kept.shape[1])
+
+    def __getstate__(self) -> dict:
+        # Pickle without the spare capacity
+        return {
+            **self.__dict__,
+            "_data": self._data[:self.nnz].copy(),
+            "_indices": self._indices[:self.nnz].copy(),
+            "_indptr": self._indptr[:self.n_rows + 1].copy(),
+        }
+
+
+class CollaborativeIndex:
+    def __init__(self, watermark: datetime, lsh_bands: int = 16, lsh_rows: int = 2):
+        # Habits changed or deleted after this moment are not in the index yet
+        self.watermark = watermark
+        self.row_users = np.zeros(0, dtype=np.int64)
+        self.live = np.zeros(0, dtype=bool)
+        # user_id -> row (-1: not indexed); user ids are dense, so an array beats a dict
+        self.user_rows = np.full(0, -1, dtype=np.int32)
+        self.row_sets = np.zeros(0, dtype=np.int16)
+        # category set -> L2-normalized row, and the rows of the users that have it
+        self.category_sets = sp.csr_matrix((0, len(CATEGORIES)), dtype=np.float32)
+        self.set_of: dict[frozenset[int], int] = {}
+        self.set_rows: list[np.ndarray] = []
+        self._habits = _RowMatrix()
+        # habit column -> (display name, category); append-only
+        self.columns: list[tuple[str, HabitCategory]] = []
+        self.column_of: dict[tuple[str, str], int] = {}
+        # users × normalized habit names, and the MinHash input of every name
+        self._names = _RowMatrix()
+        self.name_of: dict[str, int] = {}
+        self.name_hashes = np.zeros(0, dtype=np.int64)
+        # LSH: lsh_bands bands of lsh_rows MinHash values; per band, bucket keys sorted
+        # with their rows (main tables plus a small tail of recent rows)
+        self.lsh_bands, self.lsh_rows = lsh_bands, lsh_rows
+        rng = np.random.default_rng(LSH_SEED)
+        self._hash_a = rng.integers(1, MERSENNE_PRIME, lsh_bands * lsh_rows, dtype=np.int64)
+        self._hash_b = rng.integers(0, MERSENNE_PRIME, lsh_bands * lsh_rows, dtype=np.int64)
+        self._band_mix = rng.integers(1, 1 << 63, lsh_rows, dtype=np.uint64) | np.uint64(1)
+        self.lsh_keys = np.zeros((lsh_bands, 0), dtype=np.uint32)
+        self.lsh_row_ids = np.zeros((lsh_bands, 0), dtype=np.int32)
+        self.tail_keys = np.zeros((lsh_bands, 0), dtype=np.uint32)
+        self.tail_row_ids = np.zeros((lsh_bands, 0), dtype=np.int32)
+        self.active_users = 0
+
+    @property
+    def habits(self) -> sp.csr_matrix:
+        """users × habit columns"""
+        return self._habits.matrix()
+
+    @property
+    def names(self) -> sp.csr_matrix:
+        """users × normalized habit names"""
+        return self._names.matrix()
+
+    # ─── Updates ─────────────────────────────────────────────
+    def apply(self, changed: dict[int, list[tuple[HabitCategory, str]]]) -> None:
+        """
+        Replace the rows of the changed users with their current active habits
+        (an empty list removes the user).
+        """
+        if not changed:
+            return
+        self._grow_user_rows(max(changed, default=0))
+        old_rows = self.user_rows[list(changed)]
+        self.live[old_rows[old_rows >= 0]] = False
+        self.user_rows[list(changed)] = -1
+        users = [user_id for user_id, habits in changed.items() if habits]
+
+        offset = len(self.row_users)
+        row_sets, habit_rows, habit_cols, name_cols, new_hashes = [], [], [], [], []
+        for row, user_id in enumerate(users):
+            codes = set()
+            for category, name in changed[user_id]:
+                category = HabitCategory(category)
+                normalized = normalize_habit_name(name)
+                key = (normalized, category.value)
+                column = self.column_of.get(key)
+                if column is None:
+                    column = self.column_of[key] = len(self.columns)
+                    self.columns.append((name, category))
+                name_id = self.name_of.get(normalized)
+                if name_id is None:
+                    name_id = self.name_of[normalized] = len(self.name_hashes) + len(new_hashes)
+                    new_hashes.append(_name_hash(normalized))
+                codes.add(_CATEGORY_CODES[category.value])
+                habit_rows.append(row)
+                habit_cols.append(column)
+                name_cols.append(name_id)
+            row_sets.append(self._category_set(frozenset(codes)))
+        self.name_hashes = np.concatenate([self.name_hashes, np.array(new_hashes, dtype=np.int64)])
+
+        n = len(users)
+        habits = self._binary_rows(habit_rows, habit_cols, (n, len(self.columns)))
+        names = self._binary_rows(habit_rows, name_cols, (n, len(self.name_hashes)))
+
+        self._habits.append(habits, len(self.columns))
+        self._names.append(names, len(self.name_hashes))
+        self._add_lsh_rows(self._band_keys(self._signatures(names)), offset)
+        row_sets = np.array(row_sets, dtype=np.int16)
+        self._add_set_rows(row_sets, offset)
+        self.row_sets = np.concatenate([self.row_sets, row_sets])
+        self.row_users = np.concatenate([self.row_users, np.array(users, dtype=np.int64)])
+        self.live = np.concatenate([self.live, np.ones(n, dtype=bool)])
+        self.user_rows[users] = np.arange(offset, offset + n, dtype=np.int32)
+        self.active_users = int(self.live.sum())
+
+        if (~self.live).sum() > COMPACT_STALE_RATIO * len(self.live):
+            self._compact()
+
+    def _grow_user_rows(self, max_user_id: int) -> None:
+        if max_user_id >= len(self.user_rows):
+            grown = np.full(max(max_user_id + 1, 2 * len(self.user_rows)), -1, dtype=np.int32)
+            grown[:len(self.user_rows)] = self.user_rows
+            self.user_rows = grown
+
+    def _category_set(self, codes: frozenset[int]) -> int:
+        number = self.set_of.get(codes)
+        if number is None:
+            number = self.set_of[codes] = len(self.set_rows)
+            self.set_rows.append(np.zeros(0, dtype=np.int64))
+            row = sp.csr_matrix(
+                (np.full(len(codes), 1 / np.sqrt(len(codes)), dtype=np.float32),
+                 (np.zeros(len(codes), dtype=np.int32), sorted(codes))),
+                shape=(1, len(CATEGORIES)),
+            )
+            self.category_sets = sp.vstack([self.category_sets, row], format="csr")
+        return number
+
+    def _add_set_rows(self, row_sets: np.ndarray, offset: int) -> None:
+        order = np.argsort(row_sets, kind="stable")
+        numbers, starts = np.unique(row_sets[order], return_index=True)
+        for number, rows in zip(numbers, np.split(order + offset, starts[1:])):
+            self.set_rows[number] = np.concatenate([self.set_rows[number], rows])
+
+    @staticmethod
+    def _binary_rows(rows: list[int], cols: list[int], shape: tuple[int, int]) -> sp.csr_matrix:
+        matrix = sp.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=shape)
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        return matrix
+
+    def _signatures(self, names: sp.csr_matrix) -> np.ndarray:
+        """MinHash signatures (rows × bands·rows) of the name sets of non-empty rows."""
+        signatures = np.empty((names.shape[0], len(self._hash_a)), dtype=np.int64)
+        for start in range(0, names.shape[0], SIGNATURE_CHUNK_ROWS):
+            chunk = names[start:start + SIGNATURE_CHUNK_ROWS]
+            hashed = (np.outer(self.name_hashes[chunk.indices], self._hash_a) + self._hash_b) % MERSENNE_PRIME
+            signatures[start:start + chunk.shape[0]] = np.minimum.reduceat(hashed, chunk.indptr[:-1], axis=0)
+        return signatures
+
+    def _band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """Bucket key of every band (bands × rows): the band's MinHash values mixed into 32 bits."""
+        bands = signatures.reshape(len(signatures), self.lsh_bands, self.lsh_rows).astype(np.uint64)
+        return ((bands * self._band_mix).sum(axis=2) >> np.uint64(32)).astype(np.uint32).T
+
+    def _add_lsh_rows(self, keys: np.ndarray, offset: int) -> None:
+        rows = np.broadcast_to(np.arange(offset, offset + keys.shape[1], dtype=np.int32), keys.shape)
+        self.tail_keys, self.tail_row_ids = _sorted_tables(
+            np.concatenate([self.tail_keys, keys], axis=1),
+            np.concatenate([self.tail_row_ids, rows], axis=1),
+        )
+        if self.tail_keys.shape[1] > LSH_MERGE_RATIO * self.lsh_keys.shape[1]:
+            # Main rows precede tail rows, so buckets stay ordered by row
+            self.lsh_keys, self.lsh_row_ids = _sorted_tables(
+                np.concatenate([self.lsh_keys, self.tail_keys], axis=1),
+                np.concatenate([self.lsh_row_ids, self.tail_row_ids], axis=1),
+            )
+            self.tail_keys = self.tail_keys[:, :0]
+            self.tail_row_ids = self.tail_row_ids[:, :0]
+
+    def _compact_lsh(self, keys: np.ndarray, row_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # Every row is in every band once, so each band keeps the same number of entries
+        keep = self.live[row_ids]
+        renumbered = np.cumsum(self.live, dtype=np.int32) - 1
+        return (
+            keys[keep].reshape(self.lsh_bands, -1),
+            renumbered[row_ids[keep]].reshape(self.lsh_bands, -1),
+        )
+
+    def _compact(self) -> None:
+        rows = np.flatnonzero(self.live)
+        self.lsh_keys, self.lsh_row_ids = self._compact_lsh(self.lsh_keys, self.lsh_row_ids)
+        self.tail_keys, self.tail_row_ids = self._compact_lsh(self.tail_keys, self.tail_row_ids)
+        self._habits.take(rows)
+        self._names.take(rows)
+        self.row_sets = self.row_sets[rows]
+        self.row_users = self.row_users[rows]
+        self.live = np.ones(len(rows), dtype=bool)
+        self.user_rows[self.row_users] = np.arange(len(rows), dtype=np.int32)
+        self.set_rows = [np.zeros(0, dtype=np.int64) for _ in self.set_rows]
+        self._add_set_rows(self.row_sets, 0)
+
+    # ─── Queries ─────────────────────────────────────────────
+    def _row(self, user_id: int) -> int | None:
+        if 0 <= user_id < len(self.user_rows) and self.user_rows[user_id] >= 0:
+            return int(self.user_rows[user_id])
+        return None
+
+    def __contains__(self, user_id: int) -> bool:
+        return self._row(user_id) is not None
+
+    def similar_users(self, user_id: int, top_n: int = 3) -> list[tuple[int, float]]:
+        """
+        Users with the most similar habit categories (cosine similarity), most similar
+        first; among equally similar users the earlier indexed ones go first.
+        One sparse matrix-vector product over the category sets.
+        """
+        row = self._row(user_id)
+        if row is None:
+            return []
+        own = self.category_sets[int(self.row_sets[row])]
+        similarities = (self.category_sets @ own.T).toarray().ravel()
+        similar = []
+        for number in np.argsort(-similarities, kind="stable"):
+            rows = self.set_rows[number]
+            # Members in growing slices: stale rows are skipped without scanning the whole set
+            start, step = 0, 4 * top_n
+            while start < len(rows):
+                chunk = rows[start:start + step]
+                for other in chunk[self.live[chunk]]:
+                    if other != row:
+                        similar.append((int(self.row_users[other]), float(similarities[number])))
+                        if len(similar) == top_n:
+                            return similar
+                start += step
+                step *= 2
+        return similar
+
+    def habit_neighbours(
+        self, user_id: int, top_n: int = 3, max_candidates: int = 256
+    ) -> list[tuple[int, float]]:
+        """
+        Users with the most similar sets of habit names (Jaccard similarity), most similar
+        first, found through the LSH buckets of the user: only users sharing a bucket are
+        compared, at most max_candidates of them. Approximate: more bands, fewer rows per
+        band and more candidates raise recall.
+        """
+        row = self._row(user_id)
+        if row is None:
+            return []
+        names = self.names
+        own = names[row]
+        keys = self._band_keys(self._signatures(own))[:, 0]
+        per_bucket = max(1, max_candidates // self.lsh_bands)
+        found = []
+        for band, key in enumerate(keys):
+            for band_keys, band_rows in (
+                (self.lsh_keys[band], self.lsh_row_ids[band]),
+                (self.tail_keys[band], self.tail_row_ids[band]),
+            ):
+                start = band_keys.searchsorted(key, "left")
+                end = band_keys.searchsorted(key, "right")
+                found.append(band_rows[start:min(end, start + per_bucket)])
+        candidates = np.unique(np.concatenate(found))
+        candidates = candidates[self.live[candidates] & (candidates != row)]
+        if not len(candidates):
+            return []
+
+        shared = (names[candidates] @ own.T).toarray().ravel()
+        sizes = names.indptr[candidates + 1] - names.indptr[candidates]
+        similarities = shared / (sizes + own.nnz - shared)
+        order = np.argsort(-similarities, kind="stable")[:top_n]
+        return [
+            (int(self.row_users[candidates[i]]), float(similarities[i]))
+            for i in order if similarities[i] > 0
+        ]
+
+    def user_categories(self, user_id: int) -> set[HabitCategory]:
+        row = self._row(user_id)
+        if row is None:
+            return set()
+        return {CATEGORIES[code] for code in self.category_sets[int(self.row_sets[row])].indices}
+
+    def user_habits(self, user_id: int) -> list[tuple[str, HabitCategory]]:
+        """(name, category) of the user's habits, in the order they were indexed."""
+        row = self._row(user_id)
+        if row is None:
+            return []
+        return [self.columns[column] for column in np.sort(self.habits[row].indices)]
+
+    def stats(self) -> dict:
+        return {
+            "users": self.active_users,
+            "rows": len(self.live),
+            "category_sets": len(self.set_rows),
+            "habit_columns": len(self.columns),
+            "habit_names": len(self.name_hashes),
+            "lsh": f"{self.lsh_bands}x{self.lsh_rows}",
+            "watermark": self.watermark.isoformat(),
+        }
@@ -0,0 +1,150 @@
+"""
+Model Registry — версионированное хранилище обученных моделей.
+Каждая версия — отдельный каталог MODEL_STORE_PATH/<name>/v<N>/ с model.joblib
+и meta.json; файл LATEST указывает на текущую версию и заменяется атомарно
+(os.replace), поэтому читатели никогда не видят недописанную модель,
+а параллельные публикации не перезаписывают друг друга.
+
+Процесс загружает модель один раз и держит её в памяти. Запросы берут модель
+через current() без обращения к диску; раз в MODEL_REGISTRY_POLL_SECONDS
+current() запускает фоновую проверку LATEST, и новая версия подменяет
+старую после загрузки в потоке (hot-swap).
+"""
+import asyncio
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+import joblib
+from app.config import get_settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+DIFFICULTY_MODEL = "difficulty"
+COLLABORATIVE_INDEX = "collaborative"
+
+
+class ModelRegistry:
+    def __init__(self, root: str, poll_seconds: float = 60.0, keep_versions: int = 3):
+        self.root = Path(root)
+        self.poll_seconds = poll_seconds
+        self.keep_versions = keep_versions
+        # name -> (version, model, meta)
+        self._loaded: dict[str, tuple[int, object, dict]] = {}
+        self._checked_at: dict[str, float] = {}
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self._stats = {"loads": 0, "load_errors": 0, "checks": 0, "published": 0}
+
+    # ─── Reading ─────────────────────────────────────────────
+    def current(self, name: str):
+        """
+        The loaded model (None if no version is loaded yet). Never touches the disk:
+        a due check for a newer version runs in the background.
+        """
+        if time.monotonic() - self._checked_at.get(name, float("-inf")) >= self.poll_seconds:
+            self._schedule_refresh(name)
+        loaded = self._loaded.get(name)
+        return loaded[1] if loaded else None
+
+    def metadata(self, name: str) -> dict | None:
+        """meta.json of the loaded version (training details written by the publisher)."""
+        loaded = self._loaded.get(name)
+        return loaded[2] if loaded else None
+
+    def _schedule_refresh(self, name: str) -> None:
+        task = self._refreshing.get(name)
+        if task is not None and not task.done():
+            return
+        self._checked_at[name] = time.monotonic()
+        self._refreshing[name] = asyncio.create_task(self.refresh(name))
+
+    async def refresh(self, name: str) -> bool:
+        """Load the latest published version if it differs from the loaded one. Returns True on swap."""
+        self._checked_at[name] = time.monotonic()
+        self._stats["checks"] += 1
+        try:
+            version = await asyncio.to_thread(self.latest_version, name)
+            loaded = self._loaded.get(name)
+            if version is None or (loaded and loaded[0] == version):
+                return False
+            model, meta = await asyncio.to_thread(self._load, name, version)
+        except Exception as e:
+            self._stats["load_errors"] += 1
+            logger.error(f"Loading model {name} failed: {e}")
+            return False
+        self._loaded[name] = (version, model, meta)
+        self._stats["loads"] += 1
+        logger.info(f"Model {name} v{version} loaded")
+        return True
+
+    def latest_version(self, name: str) -> int | None:
+        try:
+            return int((self.root / name / "LATEST").read_text().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _load(self, name: str, version: int) -> tuple[object, dict]:
+        directory = self.root / name / f"v{version}"
+        model = joblib.load(directory / "model.joblib")
+        meta = json.loads((directory / "meta.json").read_text())
+        return model, meta
+
+    # ─── Publishing (background jobs) ────────────────────────
+    def publish(self, name: str, model, meta: dict | None = None) -> int:
+        """Store a new version and point LATEST to it. Blocking; run it off the event loop."""
+        base = self.root / name
+        base.mkdir(parents=True, exist_ok=True)
+        staging = base / f".staging-{os.getpid()}-{time.time_ns()}"
+        staging.mkdir()
+        meta = {**(meta or {}), "published_at": datetime.now(timezone.utc).isoformat()}
+        joblib.dump(model, staging / "model.joblib")
+
+        # Claim the next free version number; a concurrent publisher takes the following one
+        version = (self._versions(base)[-1] if self._versions(base) else 0) + 1
+        while True:
+            meta["version"] = version
+            (staging / "meta.json").write_text(json.dumps(meta, ensure_ascii=False))
+            try:
+                staging.rename(base / f"v{version}")
+                break
+            except OSError:
+                version += 1
+
+        pointer = base / f".LATEST-{os.getpid()}-{time.time_ns()}"
+        pointer.write_text(str(version))
+        os.replace(pointer, base / "LATEST")
+        self._stats["published"] += 1
+        self._prune(base, version)
+        return version
+
+    @staticmethod
+    def _versions(base: Path) -> list[int]:
+        return sorted(
+            int(p.name[1:]) for p in base.glob("v*") if p.is_dir() and p.name[1:].isdigit()
+        )
+
+    def _prune(self, base: Path, latest: int) -> None:
+        for version in self._versions(base):
+            if version <= latest - self.keep_versions:
+                shutil.rmtree(base / f"v{version}", ignore_errors=True)
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "poll_seconds": self.poll_seconds,
+            "models": {
+                name: {"version": version, **meta}
+                for name, (version, _, meta) in self._loaded.items()
+            },
+        }
+
+
+settings = get_settings()
+model_registry = ModelRegistry(
+    settings.MODEL_STORE_PATH,
+    poll_seconds=settings.MODEL_REGISTRY_POLL_SECONDS,
+    keep_versions=settings.MODEL_REGISTRY_KEEP_VERSIONS,
+)
@@ -6,165 +6,276 @@ import pandas as pd
 import numpy as np
 from datetime import date, timedelta, datetime
 from collections import Counter
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.models.habit import Habit
-from app.models.habit_log import HabitLog
+from dataclasses import asdict, dataclass, field
 
 
-class PatternAnalyzer:
+# date.toordinal() of 1970-01-01 (a Thursday)
+_EPOCH_ORDINAL = 719163
+_EPOCH_WEEKDAY = 3
 
-    @staticmethod
-    async def get_logs_dataframe(db: AsyncSession, user_id: int) -> pd.DataFrame:
-        """Fetch all habit logs for user and return as DataFrame."""
-        result = await db.execute(
-            select(HabitLog, Habit.name, Habit.category)
-            .join(Habit, HabitLog.habit_id == Habit.id)
-            .where(Habit.user_id == user_id)
-            .order_by(HabitLog.date.desc())
-        )
-        rows = result.all()
-        if not rows:
-            return pd.DataFrame()
-
-        data = []
-        for log, habit_name, category in rows:
-            data.append({
-                "habit_id": log.habit_id,
-                "habit_name": habit_name,
-                "category": category,
-                "date": log.date,
-                "completed": log.completed,
-                "completed_at": log.completed_at,
-                "day_of_week": log.date.weekday(),  # 0=Mon, 6=Sun
-                "hour": log.completed_at.hour if log.completed_at else None,
-            })
-        return pd.DataFrame(data)
 
-    @staticmethod
-    def find_optimal_time(df: pd.DataFrame) -> dict:
-        """Find optimal hour and day of week for completing habits."""
-        if df.empty:
-            return {"optimal_hour": None, "optimal_day": None}
+def _compact_categorical(values_per_habit: list, habit_pos: np.ndarray) -> pd.Categorical:
+    """Categorical column from one value per habit and each row's habit position."""
+    codes, categories = pd.factorize(np.array(values_per_habit, dtype=object))
+    return pd.Categorical.from_codes(codes[habit_pos], categories=categories)
+
+
+def build_logs_frame(habits: list, rows: list) -> pd.DataFrame:
+    """
+    Build the log frame from column arrays.
+    `habits` are (id, name, category) sorted by id; `rows` are (habit_id, date, completed, hour).
+    """
+    habit_ids, dates, completed, hours = zip(*rows)
+    n = len(rows)
+    habit_ids = np.array(habit_ids, dtype=np.int64)
+    habit_pos = np.searchsorted(np.array([h[0] for h in habits], dtype=np.int64), habit_ids)
+    # Ordinals are much faster to convert than date objects
+    days = np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=n) - _EPOCH_ORDINAL
+
+    return pd.DataFrame({
+        "habit_id": habit_ids,
+        "habit_name": _compact_categorical([h[1] for h in habits], habit_pos),
+        "category": _compact_categorical([h[2] for h in habits], habit_pos),
+        "date": days.astype("datetime64[D]").astype("datetime64[ns]"),
+        "completed": np.array(completed, dtype=bool),
+        "day_of_week": ((days + _EPOCH_WEEKDAY) % 7).astype(np.int8),  # 0=Mon, 6=Sun
+        "hour": pd.array(np.array(hours, dtype=float), dtype="Int8"),
+    })
+
+
+# Window of "recent" logs for today's completion probability
+RECENT_DAYS = 14
+
+
+def completion_probability(
+    total: np.ndarray,
+    done: np.ndarray,
+    recent_total: np.ndarray,
+    recent_done: np.ndarray,
+    day_total: np.ndarray,
+    day_done: np.ndarray,
+) -> np.ndarray:
+    """
+    Today's completion probability per habit from log counts: all logs, logs of the
+    last RECENT_DAYS days and logs on today's weekday (recent data weighs most).
+    Habits without logs get a neutral 0.5.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        overall = done / total
+        recent = np.where(recent_total > 0, recent_done / recent_total, overall)
+        same_day = np.where(day_total > 0, day_done / day_total, overall)
+        probability = 0.5 * recent + 0.3 * same_day + 0.2 * overall
+    return np.where(total > 0, probability, 0.5)
+
 
-        completed = df[df["completed"] == True]
-        if completed.empty:
-            return {"optimal_hour": None, "optimal_day": None}
+DAY_NAMES = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
+# Hour buckets: 5-11, 12-16, 17-21, the rest
+DAY_PERIODS = ["утро", "день", "вечер", "ночь"]
 
-        # Best hour
-        hours = completed["hour"].dropna()
-        optimal_hour = int(hours.mode().iloc[0]) if not hours.empty else None
 
-        # Best day of week
-        day_rates = df.groupby("day_of_week")["completed"].mean()
-        optimal_day = int(day_rates.idxmax()) if not day_rates.empty else None
+@dataclass
+class PatternProfile:
+    """All pattern analysis results for one log frame (see PatternAnalyzer.build_profile)."""
+    optimal_hour: int | None = None
+    optimal_day: int | None = None
+    dangers: list[dict] = field(default_factory=list)
+    struggling: list[dict] = field(default_factory=list)
+    # habit_id -> current/longest/avg streak and number of streaks
+    streaks: dict[int, dict] = field(default_factory=dict)
+    # habit_id -> probability of completing the habit today
+    today_probability: dict[int, float] = field(default_factory=dict)
+    # Difficulty of each habit (HabitDifficultyClassifier.predict), filled by the nightly job
+    difficulties: list[dict] = field(default_factory=list)
 
-        return {"optimal_hour": optimal_hour, "optimal_day": optimal_day}
+    @property
+    def optimal_time(self) -> dict:
+        return {"optimal_hour": self.optimal_hour, "optimal_day": self.optimal_day}
+
+    def to_dict(self) -> dict:
+        """JSON-compatible form (habit ids become string keys)."""
+        return {
+            **asdict(self),
+            "streaks": {str(k): v for k, v in self.streaks.items()},
+            "today_probability": {str(k): v for k, v in self.today_probability.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PatternProfile":
+        return cls(
+            optimal_hour=data.get("optimal_hour"),
+            optimal_day=data.get("optimal_day"),
+            dangers=data.get("dangers", []),
+            struggling=data.get("struggling", []),
+            streaks={int(k): v for k, v in data.get("streaks", {}).items()},
+            today_probability={int(k): v for k, v in data.get("today_probability", {}).items()},
+            difficulties=data.get("difficulties", []),
+        )
+
+
+class PatternAnalyzer:
 
     @staticmethod
-    def find_danger_periods(df: pd.DataFrame) -> list[dict]:
-        """Find time periods where user tends to skip habits."""
+    def build_profile(df: pd.DataFrame, today: date | None = None) -> "PatternProfile":
+        """
+        Compute all pattern results in one vectorized pass over the log frame:
+        optimal hour/day, danger periods, struggling habits, per-habit streaks and
+        today's completion probability.
+        """
         if df.empty:
-            return []
+            return PatternProfile()
+        today = today or date.today()
 
-        dangers = []
+        completed = df["completed"].to_numpy(dtype=bool)
+        dow = df["day_of_week"].to_numpy(dtype=np.int64)
+        hours = df["hour"].to_numpy(dtype=float, na_value=np.nan)
+        has_hour = ~np.isnan(hours)
+        dates = df["date"].to_numpy(dtype="datetime64[D]")
+        habit_ids, habit_idx = np.unique(df["habit_id"].to_numpy(dtype=np.int64), return_inverse=True)
+        n_habits = len(habit_ids)
+
+        # Day of week: completion rate for the days present in the data
+        day_total = np.bincount(dow, minlength=7)
+        day_done = np.bincount(dow, weights=completed, minlength=7)
+        days_present = np.flatnonzero(day_total)
+        day_rates = day_done[days_present] / day_total[days_present]
+
+        optimal_hour = optimal_day = None
+        if completed.any():
+            done_hours = hours[completed & has_hour].astype(np.int64)
+            if done_hours.size:
+                # Most frequent hour; ties go to the earliest, like Series.mode()
+                optimal_hour = int(np.bincount(done_hours, minlength=24).argmax())
+            optimal_day = int(days_present[np.argmax(day_rates)])
 
-        # By day of week
-        day_names = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
-        day_rates = df.groupby("day_of_week")["completed"].mean()
-        for day, rate in day_rates.items():
+        dangers = []
+        for day, rate in zip(days_present, day_rates):
             if rate < 0.5:
                 dangers.append({
                     "type": "day_of_week",
-                    "period": day_names[day],
-                    "completion_rate": round(rate * 100, 1),
-                    "message": f"Ты часто пропускаешь привычки в {day_names[day]} (выполнение {round(rate*100)}%)",
+                    "period": DAY_NAMES[day],
+                    "completion_rate": float(round(rate * 100, 1)),
+                    "message": f"Ты часто пропускаешь привычки в {DAY_NAMES[day]} (выполнение {round(rate*100)}%)",
+                })
+
+        # Time of day buckets for logs with a completion time
+        bucket_hours = hours[has_hour]
+        buckets = np.select(
+            [
+                (bucket_hours >= 5) & (bucket_hours < 12),
+                (bucket_hours >= 12) & (bucket_hours < 17),
+                (bucket_hours >= 17) & (bucket_hours < 22),
+            ],
+            [0, 1, 2],
+            default=3,
+        )
+        period_total = np.bincount(buckets, minlength=len(DAY_PERIODS))
+        period_done = np.bincount(buckets, weights=completed[has_hour], minlength=len(DAY_PERIODS))
+        for bucket in sorted(np.flatnonzero(period_total), key=lambda b: DAY_PERIODS[b]):
+            rate = period_done[bucket] / period_total[bucket]
+            if rate < 0.5:
+                period = DAY_PERIODS[bucket]
+                dangers.append({
+                    "type": "time_of_day",
+                    "period": period,
+                    "completion_rate": float(round(rate * 100, 1)),
+                    "message": f"Привычки в {period} выполняются реже ({round(rate*100)}%)",
                 })
 
-        # By hour (morning vs evening)
-        completed_with_hour = df[df["hour"].notna()].copy()
-        if not completed_with_hour.empty:
-            completed_with_hour["period"] = completed_with_hour["hour"].apply(
-                lambda h: "утро" if 5 <= h < 12 else ("день" if 12 <= h < 17 else ("вечер" if 17 <= h < 22 else "ночь"))
-            )
-            period_rates = completed_with_hour.groupby("period")["completed"].mean()
-            for period, rate in period_rates.items():
-                if rate < 0.5:
-                    dangers.append({
-                        "type": "time_of_day",
-                        "period": period,
-                        "completion_rate": round(rate * 100, 1),
-                        "message": f"Привычки в {period} выполняются реже ({round(rate*100)}%)",
-                    })
-
-        return dangers
+        # Per-habit completion rates
+        habit_total = np.bincount(habit_idx, minlength=n_habits)
+        habit_rates = np.bincount(habit_idx, weights=completed, minlength=n_habits) / habit_total
+        names = pd.Series(df["habit_name"].to_numpy(dtype=object)).groupby(habit_idx).first()
+        struggling = []
+        for i in np.flatnonzero(habit_rates < 0.5)[np.argsort(habit_rates[habit_rates < 0.5], kind="stable")]:
+            struggling.append({
+                "habit_id": int(habit_ids[i]),
+                "habit_name": names[i],
+                "completion_rate": float(round(habit_rates[i] * 100, 1)),
+                "total_logs": int(habit_total[i]),
+            })
+
+        # Streaks: run lengths of completed logs per habit, in date order
+        order = np.lexsort((dates, habit_idx))
+        run_done = completed[order]
+        run_habit = habit_idx[order]
+        new_habit = np.r_[True, run_habit[1:] != run_habit[:-1]]
+        run_start = run_done & (new_habit | ~np.r_[False, run_done[:-1]])
+        run_ids = np.cumsum(run_start) - 1
+        run_lengths = np.bincount(run_ids[run_done], minlength=int(run_start.sum()))
+        run_owner = run_habit[run_start]
+        streak_count = np.bincount(run_owner, minlength=n_habits)
+        streak_sum = np.bincount(run_owner, weights=run_lengths, minlength=n_habits)
+        longest = np.zeros(n_habits, dtype=np.int64)
+        np.maximum.at(longest, run_owner, run_lengths)
+        last = np.zeros(n_habits, dtype=np.int64)
+        if run_owner.size:
+            is_last = np.r_[run_owner[1:] != run_owner[:-1], True]
+            last[run_owner[is_last]] = run_lengths[is_last]
+
+        streaks = {}
+        for i, habit_id in enumerate(habit_ids):
+            count = int(streak_count[i])
+            streaks[int(habit_id)] = {
+                "current_streak": int(last[i]),
+                "longest_streak": int(longest[i]),
+                "avg_streak": float(round(streak_sum[i] / count, 1)) if count else 0,
+                "total_streaks": count,
+            }
+
+        # Today's probability: recent two weeks, same weekday and overall rates
+        recent = dates >= np.datetime64(today - timedelta(days=RECENT_DAYS), "D")
+        same_day = dow == today.weekday()
+        probability = completion_probability(
+            habit_total,
+            np.bincount(habit_idx, weights=completed, minlength=n_habits),
+            np.bincount(habit_idx[recent], minlength=n_habits),
+            np.bincount(habit_idx[recent], weights=completed[recent], minlength=n_habits),
+            np.bincount(habit_idx[same_day], minlength=n_habits),
+            np.bincount(habit_idx[same_day], weights=completed[same_day], minlength=n_habits),
+        )
+        today_probability = {
+            int(habit_id): round(float(p), 2) for habit_id, p in zip(habit_ids, probability)
+        }
+
+        return PatternProfile(
+            optimal_hour=optimal_hour,
+            optimal_day=optimal_day,
+            dangers=dangers,
+            struggling=struggling,
+            streaks=streaks,
+            today_probability=today_probability,
+        )
+
+    @staticmethod
+    def find_optimal_time(df: pd.DataFrame) -> dict:
+        """Find optimal hour and day of week for completing habits."""
+        return PatternAnalyzer.build_profile(df).optimal_time
+
+    @staticmethod
+    def find_danger_periods(df: pd.DataFrame) -> list[dict]:
+        """Find time periods where user tends to skip habits."""
+        return PatternAnalyzer.build_profile(df).dangers
 
     @staticmethod
     def find_struggling_habits(df: pd.DataFrame) -> list[dict]:
         """Find habits that the user struggles with most."""
-        if df.empty:
-            return []
-
-        habit_rates = df.groupby(["habit_id", "habit_name"])["completed"].agg(["mean", "count"])
-        struggling = habit_rates[habit_rates["mean"] < 0.5].sort_values("mean")
-
-        results = []
-        for (habit_id, habit_name), row in struggling.iterrows():
-            results.append({
-                "habit_id": habit_id,
-                "habit_name": habit_name,
-                "completion_rate": round(row["mean"] * 100, 1),
-                "total_logs": int(row["count"]),
-            })
-        return results
+        return PatternAnalyzer.build_profile(df).struggling
 
     @staticmethod
     def compute_streak_history(df: pd.DataFrame, habit_id: int) -> dict:
         """Compute streak statistics for a specific habit."""
-        habit_df = df[df["habit_id"] == habit_id].sort_values("date")
-        if habit_df.empty:
-            return {"current_streak": 0, "longest_streak": 0, "avg_streak": 0}
-
-        streaks = []
-        current = 0
-        for _, row in habit_df.iterrows():
-            if row["completed"]:
-                current += 1
-            else:
-                if current > 0:
-                    streaks.append(current)
-                current = 0
-        if current > 0:
-            streaks.append(current)
-
-        return {
-            "current_streak": streaks[-1] if streaks else 0,
-            "longest_streak": max(streaks) if streaks else 0,
-            "avg_streak": round(np.mean(streaks), 1) if streaks else 0,
-            "total_streaks": len(streaks),
-        }
+        return PatternAnalyzer.build_profile(df).streaks.get(
+            habit_id, {"current_streak": 0, "longest_streak": 0, "avg_streak": 0}
+        )
 
     @staticmethod
     def predict_today_completion(df: pd.DataFrame, habit_id: int) -> float:
         """Simple probability estimate of completing habit today based on historical patterns."""
-        today_dow = date.today().weekday()
-        habit_df = df[df["habit_id"] == habit_id]
-        if habit_df.empty:
-            return 0.5  # No data, neutral probability
-
-        # Weight recent data more
-        recent = habit_df[habit_df["date"] >= date.today() - timedelta(days=14)]
-        same_day = habit_df[habit_df["day_of_week"] == today_dow]
-
-        overall_rate = habit_df["completed"].mean()
-        recent_rate = recent["completed"].mean() if not recent.empty else overall_rate
-        day_rate = same_day["completed"].mean() if not same_day.empty else overall_rate
-
-        probability = 0.5 * recent_rate + 0.3 * day_rate + 0.2 * overall_rate
-        return round(float(probability), 2)
+        # No data: neutral probability
+        return PatternAnalyzer.build_profile(df).today_probability.get(habit_id, 0.5)
 
     @staticmethod
-    async def generate_ai_insight(analytics_data: dict, user_name: str) -> str | None:
+    async def generate_ai_insight(analytics_data: dict, user_name: str | None = None) -> str | None:
         """
         Генерирует персонализированный совет на основе аналитики с помощью LLM (например, Gemma).
         """
@@ -179,8 +290,8 @@ class PatternAnalyzer:
         )
         
         data_str = (
-            f"Имя пользователя: {user_name}\n"
-            f"Всего активных привычек: {analytics_data.get('active_habits')}\n"
+            (f"Имя пользователя: {user_name}\n" if user_name else "")
+            + f"Всего активных привычек: {analytics_data.get('active_habits')}\n"
             f"Выполнено сегодня: {analytics_data.get('today_completed')} из {analytics_data.get('today_total')}\n"
             f"Общий процент выполнения: {analytics_data.get('overall_completion_rate')}%\n"
             f"Лучшая серия (стрик): {analytics_data.get('longest_streak')} дней подряд\n"
@@ -4,13 +4,13 @@ Recommender — рекомендации новых привычек.
 1. Rule-based ассоциации категорий (работает сразу)
 2. Коллаборативная фильтрация (включается при достаточном количестве пользователей)
 """
-import numpy as np
-from collections import defaultdict
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.models.habit import Habit, HabitCategory
 from app.models.habit_log import HabitLog
 from app.config import get_settings
+from app.services.collaborative import get_collaborative_index
+from app.ml.collaborative_index import normalize_habit_name
 
 
 # Rule-based category associations: if user has habit in key, suggest from value
@@ -140,63 +140,51 @@ class HabitRecommender:
     ) -> list[dict]:
         """
         Collaborative filtering: find similar users and suggest their habits.
-        Only activated when there are enough users in the system.
+        Only activated when there are enough users in the system and an index is published.
         """
         settings = get_settings()
+        index = await get_collaborative_index(db)
 
-        # Get all users' habit vectors
-        result = await db.execute(select(Habit).where(Habit.is_active == True))
-        all_habits = result.scalars().all()
-
-        # Group habits by user
-        user_habits: dict[int, set[str]] = defaultdict(set)
-        for habit in all_habits:
-            user_habits[habit.user_id].add(habit.category)
-
-        if len(user_habits) < settings.MIN_USERS_FOR_COLLAB:
+        if index is None or index.active_users < settings.MIN_USERS_FOR_COLLAB:
             return []  # Not enough users
 
-        # Build category vector for each user
-        all_categories = list(HabitCategory)
-        vectors = {}
-        for uid, categories in user_habits.items():
-            vector = [1.0 if cat in categories else 0.0 for cat in all_categories]
-            vectors[uid] = np.array(vector)
-
-        if user_id not in vectors:
+        if user_id not in index:
             return []
 
-        # Find most similar users (cosine similarity)
-        user_vec = vectors[user_id]
-        similarities = []
-        for uid, vec in vectors.items():
-            if uid != user_id:
-                dot = np.dot(user_vec, vec)
-                norm = np.linalg.norm(user_vec) * np.linalg.norm(vec)
-                sim = dot / norm if norm > 0 else 0
-                similarities.append((uid, sim))
-
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        top_similar = similarities[:3]
-
-        # Suggest habits from similar users that current user doesn't have
-        current_categories = user_habits[user_id]
+        # Users with the most similar habits (LSH over habit names) first
+        current_names = {normalize_habit_name(name) for name, _ in index.user_habits(user_id)}
         suggestions = []
-        for similar_uid, sim_score in top_similar:
+        for similar_uid, _ in index.habit_neighbours(
+            user_id, top_n=3, max_candidates=settings.COLLAB_LSH_MAX_CANDIDATES
+        ):
+            for name, cat in index.user_habits(similar_uid):
+                normalized = normalize_habit_name(name)
+                if normalized not in current_names:
+                    current_names.add(normalized)
+                    suggestions.append({
+                        "type": "collaborative",
+                        "title": name,
+                        "description": f"Категория: {cat.value}",
+                        "reason": "Пользователи с похожими привычками также практикуют эту",
+                        "category": cat,
+                    })
+        if suggestions:
+            return suggestions[:3]
+
+        # No users with shared habits: suggest habits of users with similar categories
+        current_categories = index.user_categories(user_id)
+        for similar_uid, sim_score in index.similar_users(user_id, top_n=3):
             if sim_score < 0.3:
                 continue
-            diff_categories = user_habits[similar_uid] - current_categories
-            for cat in diff_categories:
-                # Find actual habit names from similar user
-                for habit in all_habits:
-                    if habit.user_id == similar_uid and habit.category == cat:
-                        suggestions.append({
-                            "type": "collaborative",
-                            "title": habit.name,
-                            "description": f"Категория: {cat}",
-                            "reason": f"Похожие пользователи также практикуют эту привычку",
-                            "category": cat,
-                        })
+            for name, cat in index.user_habits(similar_uid):
+                if cat not in current_categories:
+                    suggestions.append({
+                        "type": "collaborative",
+                        "title": name,
+                        "description": f"Категория: {cat.value}",
+                        "reason": f"Похожие пользователи также практикуют эту привычку",
+                        "category": cat,
+                    })
 
         return suggestions[:3]
 
@@ -1,6 +1,7 @@
 from app.models.user import User
 from app.models.habit import Habit
 from app.models.habit_log import HabitLog
+from app.models.habit_streak import HabitStreak
 from app.models.chat_session import ChatSession
 from app.models.chat_message import ChatMessage
 from app.models.user_activity import UserActivity
@@ -10,10 +11,18 @@ from app.models.notification import Notification
 from app.models.device_token import DeviceToken
 from app.models.mood_log import MoodLog
 from app.models.challenge import Challenge, WeeklyReport
+from app.models.user_daily_stat import UserDailyStat
+from app.models.sync_tombstone import SyncTombstone, SyncEntity
+from app.models.ai_insight import AIInsight
+from app.models.pattern_profile import UserPatternProfile
+from app.models.habit_completion_score import HabitCompletionScore
+from app.models.recompute_mark import RecomputeMark
 
 __all__ = [
-    "User", "Habit", "HabitLog", "ChatSession", "ChatMessage", "UserActivity",
+    "User", "Habit", "HabitLog", "HabitStreak", "ChatSession", "ChatMessage", "UserActivity",
     "Friendship", "Achievement", "Notification",
-    "DeviceToken", "MoodLog", "Challenge", "WeeklyReport",
+    "DeviceToken", "MoodLog", "Challenge", "WeeklyReport", "UserDailyStat",
+    "SyncTombstone", "SyncEntity", "AIInsight", "UserPatternProfile",
+    "HabitCompletionScore", "RecomputeMark",
 ]
 
@@ -0,0 +1,19 @@
+"""
+AIInsight — сохранённый AI-совет для дашборда аналитики.
+Ключ — отпечаток входной статистики: одинаковая статистика у разных
+пользователей даёт один и тот же совет и генерируется один раз.
+"""
+from datetime import datetime, timezone
+from sqlalchemy import String, Text, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.database import Base
+
+
+class AIInsight(Base):
+    __tablename__ = "ai_insights"
+
+    fingerprint: Mapped[str] = mapped_column(String(64), primary_key=True)
+    insight: Mapped[str] = mapped_column(Text, nullable=False)
+    generated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True
+    )
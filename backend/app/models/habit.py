@@ -1,5 +1,5 @@
 from datetime import datetime, timezone
-from sqlalchemy import Integer, String, DateTime, Boolean, ForeignKey, Enum as SAEnum
+from sqlalchemy import Integer, String, DateTime, Boolean, ForeignKey, Enum as SAEnum, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.database import Base
 import enum
@@ -43,6 +43,9 @@ HABIT_NAME_SUGGESTIONS: dict[str, list[str]] = {
 
 class Habit(Base):
     __tablename__ = "habits"
+    __table_args__ = (
+        Index("ix_habits_user_id_change_seq", "user_id", "change_seq"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -64,7 +67,15 @@ class Habit(Base):
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc), index=True,
+    )
+    # users.sync_version at the time of the last write (delta sync cursor)
+    change_seq: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
 
     # Relationships
     user = relationship("User", back_populates="habits")
     logs = relationship("HabitLog", back_populates="habit", cascade="all, delete-orphan")
+    streak = relationship("HabitStreak", back_populates="habit", uselist=False, cascade="all, delete-orphan")
+    completion_scores = relationship("HabitCompletionScore", back_populates="habit", cascade="all, delete-orphan")
@@ -0,0 +1,25 @@
+"""
+HabitCompletionScore — вероятность выполнения привычки в конкретный день.
+Считается раз в день для всех активных привычек (см. services/completion_scores);
+напоминания и генерация челленджей выбирают по ней привычки «под угрозой»
+без запросов по каждой привычке.
+"""
+from datetime import date, datetime, timezone
+from sqlalchemy import Integer, Float, Date, DateTime, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from app.db.database import Base
+
+
+class HabitCompletionScore(Base):
+    __tablename__ = "habit_completion_scores"
+
+    habit_id: Mapped[int] = mapped_column(Integer, ForeignKey("habits.id"), primary_key=True)
+    date: Mapped[date] = mapped_column(Date, primary_key=True, index=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    probability: Mapped[float] = mapped_column(Float, nullable=False)
+    scored_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
+
+    # Relationships
+    habit = relationship("Habit", back_populates="completion_scores")
@@ -1,23 +1,53 @@
 from datetime import datetime, date, timezone
-from sqlalchemy import Integer, String, DateTime, Boolean, ForeignKey, Date
+from sqlalchemy import Integer, String, Text, DateTime, Boolean, ForeignKey, Date, UniqueConstraint, Index
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.database import Base
 
 
+class TimestampList(TypeDecorator):
+    """List of UTC datetimes stored compactly as comma-separated epoch seconds."""
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if not value:
+            return None
+        return ",".join(str(int(moment.timestamp())) for moment in value)
+
+    def process_result_value(self, value, dialect):
+        if not value:
+            return []
+        return [datetime.fromtimestamp(int(epoch), tz=timezone.utc) for epoch in value.split(",")]
+
+
 class HabitLog(Base):
     __tablename__ = "habit_logs"
+    __table_args__ = (
+        Index("ix_habit_logs_habit_id_change_seq", "habit_id", "change_seq"),
+        UniqueConstraint("habit_id", "date", name="uq_habit_logs_habit_date"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     habit_id: Mapped[int] = mapped_column(Integer, ForeignKey("habits.id"), nullable=False, index=True)
     date: Mapped[date] = mapped_column(Date, nullable=False, index=True)
     completed: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Число выполнений за день (для привычек с daily_target > 1 — до daily_target)
+    completions: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
     completed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Время каждого выполнения за день (для почасовой аналитики)
+    completion_times: Mapped[list[datetime]] = mapped_column(TimestampList, nullable=True)
     skipped_reason: Mapped[str | None] = mapped_column(String(300), nullable=True)
     note: Mapped[str | None] = mapped_column(String(500), nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc), index=True,
+    )
+    # users.sync_version at the time of the last write (delta sync cursor)
+    change_seq: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
 
     # Relationships
     habit = relationship("Habit", back_populates="logs")
-
@@ -0,0 +1,29 @@
+"""
+HabitStreak — материализованное состояние серии привычки.
+Обновляется инкрементально при записи логов, чтобы чтение серии было O(1)
+независимо от длины истории.
+"""
+from datetime import datetime, date, timezone
+from sqlalchemy import Integer, DateTime, Date, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from app.db.database import Base
+
+
+class HabitStreak(Base):
+    __tablename__ = "habit_streaks"
+
+    habit_id: Mapped[int] = mapped_column(Integer, ForeignKey("habits.id"), primary_key=True)
+    # Серия, заканчивающаяся в last_completed_date (актуальна, пока не прошёл cooldown)
+    current_streak: Mapped[int] = mapped_column(Integer, default=0)
+    best_streak: Mapped[int] = mapped_column(Integer, default=0)
+    # Последний отрезок, учитываемый в best_streak (пропуски короче cooldown не обрывают его)
+    best_run: Mapped[int] = mapped_column(Integer, default=0)
+    last_completed_date: Mapped[date | None] = mapped_column(Date, nullable=True)
+    cooldown_days: Mapped[int] = mapped_column(Integer, default=1)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
+
+    # Relationships
+    habit = relationship("Habit", back_populates="streak")
@@ -4,13 +4,16 @@ MoodLog — журнал настроения пользователя.
 Используется для корреляции настроения с выполнением привычек.
 """
 from datetime import datetime, date, timezone
-from sqlalchemy import Integer, String, DateTime, Date, ForeignKey, Float
+from sqlalchemy import Integer, String, DateTime, Date, ForeignKey, Float, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.database import Base
 
 
 class MoodLog(Base):
     __tablename__ = "mood_logs"
+    __table_args__ = (
+        Index("ix_mood_logs_user_id_change_seq", "user_id", "change_seq"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -23,6 +26,12 @@ class MoodLog(Base):
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc), index=True,
+    )
+    # users.sync_version at the time of the last write (delta sync cursor)
+    change_seq: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
 
     # Relationships
     user = relationship("User", back_populates="mood_logs")
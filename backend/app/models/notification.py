@@ -2,17 +2,20 @@
 Notification model — персистентные уведомления (вместо in-memory).
 """
 from datetime import datetime, timezone
-from sqlalchemy import Integer, String, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import Integer, String, DateTime, Boolean, ForeignKey, Text, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.database import Base
 
 
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_user_id_change_seq", "user_id", "change_seq"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False, index=True)
-    type: Mapped[str] = mapped_column(String(50), nullable=False)  # reminder, evening_reminder, achievement, friend_request
+    type: Mapped[str] = mapped_column(String(50), nullable=False)  # reminder, risk_reminder, evening_reminder, achievement, friend_request
     title: Mapped[str] = mapped_column(String(200), nullable=False)
     body: Mapped[str] = mapped_column(Text, default="")
     habit_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("habits.id"), nullable=True)
@@ -20,6 +23,12 @@ class Notification(Base):
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc), index=True,
+    )
+    # users.sync_version at the time of the last write (delta sync cursor)
+    change_seq: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
 
     # Relationships
     user = relationship("User", back_populates="notifications")
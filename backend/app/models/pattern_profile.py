@@ -0,0 +1,28 @@
+"""
+UserPatternProfile — предвычисленный профиль паттернов пользователя
+(оптимальное время, опасные периоды, сложные привычки, серии и вероятности
+выполнения на день расчёта). Пересчитывается ночной задачей для всех
+пользователей с логами; эндпоинты читают его вместо анализа логов в запросе.
+"""
+from datetime import date, datetime, timezone
+from sqlalchemy import Integer, Date, DateTime, ForeignKey, JSON
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from app.db.database import Base
+
+
+class UserPatternProfile(Base):
+    __tablename__ = "user_pattern_profiles"
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), primary_key=True)
+    # PatternProfile.to_dict()
+    profile: Mapped[dict] = mapped_column(JSON, nullable=False)
+    # users.data_version, по которой посчитан профиль
+    data_version: Mapped[int] = mapped_column(Integer, default=0)
+    # День, для которого посчитаны вероятности выполнения «сегодня»
+    computed_for: Mapped[date] = mapped_column(Date, nullable=False)
+    computed_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
+
+    # Relationships
+    user = relationship("User", back_populates="pattern_profile")
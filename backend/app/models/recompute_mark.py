@@ -0,0 +1,25 @@
+"""
+RecomputeMark — отложенный пересчёт производных данных пользователя после записи логов.
+Строка вставляется в транзакции записи и удаляется в транзакции пересчёта,
+поэтому работа не теряется при перезапуске воркера (см. services/recompute_queue).
+"""
+from datetime import date, datetime, timezone
+from sqlalchemy import Integer, Date, DateTime, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from app.db.database import Base
+
+
+class RecomputeMark(Base):
+    __tablename__ = "recompute_marks"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    # Даты затронутых логов: окно для поиска челленджей
+    start_date: Mapped[date] = mapped_column(Date, nullable=False)
+    end_date: Mapped[date] = mapped_column(Date, nullable=False)
+    marked_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
+
+    # Relationships
+    user = relationship("User", back_populates="recompute_marks")
@@ -0,0 +1,36 @@
+"""
+SyncTombstone — запись об удалённой сущности для дельта-синхронизации.
+Клиент получает tombstones с change_seq больше его курсора и удаляет локальные копии.
+"""
+from datetime import datetime, timezone
+from sqlalchemy import Integer, String, DateTime, ForeignKey, Index
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from app.db.database import Base
+import enum
+
+
+class SyncEntity(str, enum.Enum):
+    HABIT = "habit"
+    HABIT_LOG = "habit_log"
+    MOOD_LOG = "mood_log"
+    NOTIFICATION = "notification"
+
+
+class SyncTombstone(Base):
+    __tablename__ = "sync_tombstones"
+    __table_args__ = (
+        Index("ix_sync_tombstones_user_id_change_seq", "user_id", "change_seq"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    entity: Mapped[str] = mapped_column(String(32), nullable=False)  # SyncEntity value
+    entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    deleted_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True
+    )
+    # users.sync_version of the deleting transaction (delta sync cursor)
+    change_seq: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+
+    # Relationships
+    user = relationship("User", back_populates="sync_tombstones")
@@ -19,6 +19,10 @@ class User(Base):
     email_verification_token: Mapped[str | None] = mapped_column(String(255), nullable=True, index=True)
     email_verification_expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     is_admin: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Bumped on every change to the user's habits, logs, mood, challenges and achievements
+    data_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    # Bumped once per transaction that writes rows the mobile client syncs; rows carry it as change_seq
+    sync_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
@@ -36,3 +40,7 @@ class User(Base):
     challenges = relationship("Challenge", back_populates="user", cascade="all, delete-orphan")
     weekly_reports = relationship("WeeklyReport", back_populates="user", cascade="all, delete-orphan")
     device_tokens = relationship("DeviceToken", back_populates="user", cascade="all, delete-orphan")
+    daily_stats = relationship("UserDailyStat", back_populates="user", cascade="all, delete-orphan")
+    sync_tombstones = relationship("SyncTombstone", back_populates="user", cascade="all, delete-orphan")
+    pattern_profile = relationship("UserPatternProfile", back_populates="user", uselist=False, cascade="all, delete-orphan")
+    recompute_marks = relationship("RecomputeMark", back_populates="user", cascade="all, delete-orphan")
@@ -0,0 +1,27 @@
+"""
+UserDailyStat — дневной агрегат логов пользователя по категориям.
+Одна строка на (пользователь, дата, категория): сколько логов записано и выполнено,
+в том числе по активным привычкам. Дашборды читают его вместо сырых habit_logs,
+поэтому их стоимость зависит от числа дней, а не от числа логов.
+"""
+from datetime import date
+from sqlalchemy import Integer, Date, ForeignKey, Enum as SAEnum
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from app.db.database import Base
+from app.models.habit import HabitCategory
+
+
+class UserDailyStat(Base):
+    __tablename__ = "user_daily_stats"
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), primary_key=True)
+    date: Mapped[date] = mapped_column(Date, primary_key=True)
+    category: Mapped[str] = mapped_column(SAEnum(HabitCategory), primary_key=True)
+    logged: Mapped[int] = mapped_column(Integer, default=0)
+    completed: Mapped[int] = mapped_column(Integer, default=0)
+    # Только по привычкам с is_active=True (дашборды и недельные отчёты)
+    active_logged: Mapped[int] = mapped_column(Integer, default=0)
+    active_completed: Mapped[int] = mapped_column(Integer, default=0)
+
+    # Relationships
+    user = relationship("User", back_populates="daily_stats")
@@ -9,7 +9,6 @@ from sqlalchemy import select
 from datetime import date, timedelta, datetime, timezone
 from app.models.user import User
 from app.models.habit import Habit
-from app.models.habit_log import HabitLog
 from app.models.chat_message import ChatMessage
 from app.models.mood_log import MoodLog
 from app.models.user_activity import UserActivity
@@ -20,7 +19,140 @@ from app.nlp.intent_parser import parse_intent, Intent
 from app.nlp.prompts import build_system_prompt, build_motivation_message
 from app.ml.pattern_analyzer import PatternAnalyzer
 from app.ml.recommender import HabitRecommender
-from app.api.routes.habits import _compute_streak, _completion_rate
+from app.services.habit_stats import get_habit_stats
+from app.services.user_cache import cached_for_user
+from app.services.pattern_profiles import get_pattern_profile
+
+
+@cached_for_user("chat_context")
+async def _user_data_context(db: AsyncSession, user: User) -> dict:
+    """Part of the chat context derived from the user's data (no session-specific parts)."""
+    # Habits with stats
+    result = await db.execute(
+        select(Habit).where(Habit.user_id == user.id, Habit.is_active == True)
+    )
+    habits = result.scalars().all()
+
+    stats = await get_habit_stats(db, habits)
+    habits_data = []
+    for h in habits:
+        habits_data.append({
+            "name": h.name,
+            "category": h.category,
+            "streak": stats[h.id].current_streak,
+            "rate": stats[h.id].completion_rate,
+        })
+
+    # Analytics summary
+    today = date.today()
+    today_done = sum(s.today_completions for s in stats.values())
+
+    # Pattern analysis
+    profile = await get_pattern_profile(db, user.id)
+
+    # Recommendations
+    recommendations = await HabitRecommender.get_rule_based_recommendations(db, user.id)
+
+    mood_result = await db.execute(
+        select(MoodLog)
+        .where(
+            MoodLog.user_id == user.id,
+            MoodLog.date >= today - timedelta(days=14),
+        )
+        .order_by(MoodLog.date.desc())
+    )
+    mood_logs = mood_result.scalars().all()
+    mood_scores = [m.score for m in mood_logs]
+
+    mood_trend = "stable"
+    if len(mood_logs) >= 6:
+        half = len(mood_logs) // 2
+        recent = mood_scores[:half]
+        older = mood_scores[half:]
+        if recent and older:
+            diff = (sum(recent) / len(recent)) - (sum(older) / len(older))
+            if diff > 0.3:
+                mood_trend = "improving"
+            elif diff < -0.3:
+                mood_trend = "declining"
+
+    mood_context = {
+        "last_score": mood_logs[0].score if mood_logs else None,
+        "avg_7d": round(
+            sum(m.score for m in mood_logs if m.date >= today - timedelta(days=7))
+            / max(1, len([m for m in mood_logs if m.date >= today - timedelta(days=7)])),
+            2,
+        ) if mood_logs else None,
+        "trend": mood_trend,
+        "recent": [
+            {
+                "date": m.date.isoformat(),
+                "score": m.score,
+                "energy": m.energy_level,
+                "stress": m.stress_level,
+                "tags": m.tags,
+            }
+            for m in mood_logs[:5]
+        ],
+    }
+
+    achievements_result = await db.execute(
+        select(Achievement)
+        .where(Achievement.user_id == user.id)
+        .order_by(Achievement.unlocked_at.desc())
+        .limit(5)
+    )
+    achievements = achievements_result.scalars().all()
+    achievements_data = [
+        {
+            "type": a.achievement_type,
+            "title": ACHIEVEMENT_META.get(a.achievement_type, {}).get("title", a.achievement_type),
+            "unlocked_at": a.unlocked_at.isoformat(),
+        }
+        for a in achievements
+    ]
+
+    challenges_result = await db.execute(
+        select(Challenge)
+        .where(
+            Challenge.user_id == user.id,
+            Challenge.status == ChallengeStatus.ACTIVE,
+            Challenge.end_date >= today,
+        )
+        .order_by(Challenge.end_date.asc())
+        .limit(5)
+    )
+    challenges = challenges_result.scalars().all()
+    challenges_data = [
+        {
+            "title": c.title,
+            "type": str(c.type),
+            "progress": f"{c.current_count}/{c.target_count}",
+            "end_date": c.end_date.isoformat(),
+        }
+        for c in challenges
+    ]
+
+    all_rates = [h["rate"] for h in habits_data]
+    overall_rate = round(sum(all_rates) / len(all_rates), 1) if all_rates else 0
+
+    return {
+        "habits": habits_data,
+        "analytics": {
+            "total": len(habits),
+            "active": len(habits),
+            "today_done": today_done,
+            "today_total": len(habits),
+            "overall_rate": overall_rate,
+            "best_streak": max((h["streak"] for h in habits_data), default=0),
+            "optimal_time": profile.optimal_hour,
+        },
+        "dangers": profile.dangers,
+        "recommendations": recommendations,
+        "mood": mood_context,
+        "achievements": achievements_data,
+        "challenges": challenges_data,
+    }
 
 
 class HabitChatbot:
@@ -98,122 +230,8 @@ class HabitChatbot:
         context_hints: dict | None = None,
     ) -> dict:
         """Gather all user data for context injection into prompts."""
-        # Habits with stats
-        result = await db.execute(
-            select(Habit).where(Habit.user_id == user.id, Habit.is_active == True)
-        )
-        habits = result.scalars().all()
-
-        habits_data = []
-        for h in habits:
-            streak = await _compute_streak(db, h.id)
-            rate = await _completion_rate(db, h.id)
-            habits_data.append({
-                "name": h.name,
-                "category": h.category,
-                "streak": streak,
-                "rate": rate,
-            })
-
-        # Analytics summary
-        today = date.today()
-        today_logs = []
-        if habits:
-            result = await db.execute(
-                select(HabitLog).where(
-                    HabitLog.habit_id.in_([h.id for h in habits]),
-                    HabitLog.date == today,
-                )
-            )
-            today_logs = result.scalars().all()
-        today_done = sum(1 for l in today_logs if l.completed)
-
-        # Pattern analysis
-        df = await self.analyzer.get_logs_dataframe(db, user.id)
-        dangers = self.analyzer.find_danger_periods(df) if not df.empty else []
-
-        # Recommendations
-        recommendations = await HabitRecommender.get_rule_based_recommendations(db, user.id)
-
-        mood_result = await db.execute(
-            select(MoodLog)
-            .where(
-                MoodLog.user_id == user.id,
-                MoodLog.date >= today - timedelta(days=14),
-            )
-            .order_by(MoodLog.date.desc())
-        )
-        mood_logs = mood_result.scalars().all()
-        mood_scores = [m.score for m in mood_logs]
-
-        mood_trend = "stable"
-        if len(mood_logs) >= 6:
-            half = len(mood_logs) // 2
-            recent = mood_scores[:half]
-            older = mood_scores[half:]
-            if recent and older:
-                diff = (sum(recent) / len(recent)) - (sum(older) / len(older))
-                if diff > 0.3:
-                    mood_trend = "improving"
-                elif diff < -0.3:
-                    mood_trend = "declining"
-
-        mood_context = {
-            "last_score": mood_logs[0].score if mood_logs else None,
-            "avg_7d": round(
-                sum(m.score for m in mood_logs if m.date >= today - timedelta(days=7))
-                / max(1, len([m for m in mood_logs if m.date >= today - timedelta(days=7)])),
-                2,
-            ) if mood_logs else None,
-            "trend": mood_trend,
-            "recent": [
-                {
-                    "date": m.date.isoformat(),
-                    "score": m.score,
-                    "energy": m.energy_level,
-                    "stress": m.stress_level,
-                    "tags": m.tags,
-                }
-                for m in mood_logs[:5]
-            ],
-        }
-
-        achievements_result = await db.execute(
-            select(Achievement)
-            .where(Achievement.user_id == user.id)
-            .order_by(Achievement.unlocked_at.desc())
-            .limit(5)
-        )
-        achievements = achievements_result.scalars().all()
-        achievements_data = [
-            {
-                "type": a.achievement_type,
-                "title": ACHIEVEMENT_META.get(a.achievement_type, {}).get("title", a.achievement_type),
-                "unlocked_at": a.unlocked_at.isoformat(),
-            }
-            for a in achievements
-        ]
-
-        challenges_result = await db.execute(
-            select(Challenge)
-            .where(
-                Challenge.user_id == user.id,
-                Challenge.status == ChallengeStatus.ACTIVE,
-                Challenge.end_date >= today,
-            )
-            .order_by(Challenge.end_date.asc())
-            .limit(5)
-        )
-        challenges = challenges_result.scalars().all()
-        challenges_data = [
-            {
-                "title": c.title,
-                "type": str(c.type),
-                "progress": f"{c.current_count}/{c.target_count}",
-                "end_date": c.end_date.isoformat(),
-            }
-            for c in challenges
-        ]
+        # Habits, patterns, mood, achievements and challenges (cached per data version)
+        context = await _user_data_context(db, user)
 
         activity_since = datetime.now(timezone.utc) - timedelta(days=7)
         activity_result = await db.execute(
@@ -231,26 +249,9 @@ class HabitChatbot:
 
         memory_summary = self._build_memory_summary(history)
 
-        all_rates = [h["rate"] for h in habits_data]
-        overall_rate = round(sum(all_rates) / len(all_rates), 1) if all_rates else 0
-
         return {
             "username": user.username,
-            "habits": habits_data,
-            "analytics": {
-                "total": len(habits),
-                "active": len(habits),
-                "today_done": today_done,
-                "today_total": len(habits),
-                "overall_rate": overall_rate,
-                "best_streak": max((h["streak"] for h in habits_data), default=0),
-                "optimal_time": self.analyzer.find_optimal_time(df).get("optimal_hour") if not df.empty else None,
-            },
-            "dangers": dangers,
-            "recommendations": recommendations,
-            "mood": mood_context,
-            "achievements": achievements_data,
-            "challenges": challenges_data,
+            **context,
             "activity": {
                 "sessions_7d": len(activities),
                 "screens": unique_screens,
@@ -445,10 +446,11 @@ class HabitChatbot:
             greeting = f"Привет, {user.username}! 👋\n"
 
             if habits:
+                stats = await get_habit_stats(db, habits)
                 best_streak = 0
                 best_habit = ""
                 for h in habits:
-                    s = await _compute_streak(db, h.id)
+                    s = stats[h.id].current_streak
                     if s > best_streak:
                         best_streak = s
                         best_habit = h.name
@@ -477,10 +479,11 @@ class HabitChatbot:
             if not habits:
                 return "У тебя пока нет привычек. Добавь первую! ➕"
 
+            stats = await get_habit_stats(db, habits)
             text = "📊 **Твоя статистика:**\n"
             for h in habits:
-                streak = await _compute_streak(db, h.id)
-                rate = await _completion_rate(db, h.id)
+                streak = stats[h.id].current_streak
+                rate = stats[h.id].completion_rate
                 emoji = "🔥" if streak >= 7 else ("✅" if streak >= 3 else "📌")
                 text += f"{emoji} {h.name}: серия {streak} дней, выполнение {rate}%\n"
             return text
@@ -4,15 +4,24 @@ Notification Scheduler — генерирует персонализирован
 """
 from datetime import datetime, date, timezone, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy import select
+from sqlalchemy import select, and_
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from app.models.habit import Habit
 from app.models.habit_log import HabitLog
+from app.models.habit_completion_score import HabitCompletionScore
 from app.models.notification import Notification
 from app.models.challenge import Challenge, ChallengeStatus
 from app.models.user import User
 from app.config import get_settings
 from app.notifications.push_service import send_push_to_user
+from app.services.sync import prune_tombstones
+from app.services.insight_store import prune_insights
+from app.services.pattern_profiles import rebuild_pattern_profiles
+from app.services.model_training import train_difficulty_model
+from app.services.collaborative import publish_collaborative_index
+from app.services.completion_scores import (
+    refresh_completion_scores, has_completion_scores, get_completion_scores,
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -41,7 +50,9 @@ async def _add_notification_db(db: AsyncSession, user_id: int, type_: str,
         habit_id=habit_id,
     )
     db.add(notification)
-    await db.flush()
+    # Committed right away: writing it takes the user's sync version, whose row lock
+    # would otherwise block the user's requests until the whole job commits
+    await db.commit()
     await send_push_to_user(
         db=db,
         user_id=user_id,
@@ -65,20 +76,51 @@ async def check_and_generate_reminders():
         today = date.today()
         now = datetime.now(timezone.utc)
 
-        # Get all active habits
-        result = await db.execute(select(Habit).where(Habit.is_active == True))
-        habits = result.scalars().all()
+        # Today's completion probabilities (scored once a day for all habits)
+        if not await has_completion_scores(db, today):
+            await refresh_completion_scores(db, today)
 
-        for habit in habits:
-            # Check if already completed today
-            result = await db.execute(
-                select(HabitLog).where(
-                    HabitLog.habit_id == habit.id,
-                    HabitLog.date == today,
-                    HabitLog.completed == True,
-                )
+        # Get all active habits with today's stored score
+        result = await db.execute(
+            select(Habit, HabitCompletionScore.probability)
+            .outerjoin(HabitCompletionScore, and_(
+                HabitCompletionScore.habit_id == Habit.id,
+                HabitCompletionScore.date == today,
+            ))
+            .where(Habit.is_active == True)
+        )
+        rows = result.all()
+        habits = [habit for habit, _ in rows]
+        scores = {habit.id: p for habit, p in rows if p is not None}
+        # Habits created after today's scoring are scored on the fly
+        missing = [habit.id for habit, p in rows if p is None]
+        scores.update(await get_completion_scores(db, missing, today))
+
+        # Habits already completed today (one query for all habits)
+        result = await db.execute(
+            select(HabitLog.habit_id)
+            .join(Habit, HabitLog.habit_id == Habit.id)
+            .where(
+                Habit.is_active == True,
+                HabitLog.date == today,
+                HabitLog.completed == True,
+            )
+        )
+        completed_today = set(result.scalars().all())
+
+        # Habits already nudged as at-risk today: the nudge goes out once per day,
+        # not on every run of the 17:00-20:00 window
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        result = await db.execute(
+            select(Notification.habit_id).where(
+                Notification.type == "risk_reminder",
+                Notification.created_at >= today_start,
             )
-            if result.scalar_one_or_none():
+        )
+        risk_notified = set(result.scalars().all())
+
+        for habit in habits:
+            if habit.id in completed_today:
                 continue  # Already done
 
             # Check if it's time to remind (target_time based)
@@ -96,6 +138,17 @@ async def check_and_generate_reminders():
                 except (ValueError, AttributeError):
                     pass
 
+            # Habits likely to be skipped today get an earlier nudge
+            at_risk = scores.get(habit.id, 0.5) < settings.COMPLETION_RISK_THRESHOLD
+            if not habit.target_time and at_risk and 17 <= now.hour < 20 and habit.id not in risk_notified:
+                risk_notified.add(habit.id)
+                await _add_notification_db(
+                    db, habit.user_id, "risk_reminder",
+                    "Не упусти сегодня!",
+                    f"Привычку '{habit.name}' легко пропустить в такой день — выполни её сейчас.",
+                    habit.id,
+                )
+
             # Late in the day reminder (after 20:00) for habits without target time
             if not habit.target_time and now.hour >= 20:
                 await _add_notification_db(
@@ -215,6 +268,83 @@ async def auto_update_challenge_progress():
 
 
 
+async def prune_sync_tombstones():
+    """Daily task: drop sync tombstones older than the retention window."""
+    settings = get_settings()
+    engine = create_async_engine(settings.DATABASE_URL)
+    async_session = async_sessionmaker(engine, expire_on_commit=False)
+
+    async with async_session() as db:
+        removed = await prune_tombstones(db)
+
+    await engine.dispose()
+    logger.info(f"Pruned {removed} sync tombstones")
+
+
+async def prune_ai_insights():
+    """Daily task: drop AI insights that were not regenerated within the retention window."""
+    settings = get_settings()
+    engine = create_async_engine(settings.DATABASE_URL)
+    async_session = async_sessionmaker(engine, expire_on_commit=False)
+
+    async with async_session() as db:
+        removed = await prune_insights(db, settings.AI_INSIGHT_RETENTION_DAYS)
+
+    await engine.dispose()
+    logger.info(f"Pruned {removed} AI insights")
+
+
+async def refresh_pattern_profiles():
+    """Nightly task: recompute pattern profiles of all users in a process pool."""
+    settings = get_settings()
+    engine = create_async_engine(settings.DATABASE_URL)
+    async_session = async_sessionmaker(engine, expire_on_commit=False)
+
+    result = await rebuild_pattern_profiles(async_session)
+
+    await engine.dispose()
+    logger.info(
+        f"Pattern profiles: {result['profiles']} of {result['users']} users in {result['seconds']}s"
+    )
+
+
+async def score_habit_completion():
+    """Daily task: score today's completion probability of all active habits."""
+    settings = get_settings()
+    engine = create_async_engine(settings.DATABASE_URL)
+    async_session = async_sessionmaker(engine, expire_on_commit=False)
+
+    async with async_session() as db:
+        scored = await refresh_completion_scores(db)
+
+    await engine.dispose()
+    logger.info(f"Scored {scored} habits for today")
+
+
+async def retrain_difficulty_model():
+    """Nightly task: retrain the global habit difficulty classifier (warm start on changed habits)."""
+    settings = get_settings()
+    engine = create_async_engine(settings.DATABASE_URL)
+    async_session = async_sessionmaker(engine, expire_on_commit=False)
+
+    result = await train_difficulty_model(async_session)
+
+    await engine.dispose()
+    logger.info(
+        f"Difficulty model ({result['mode']}): v{result['version']} "
+        f"on {result['habits']} habits in {result['seconds']}s"
+    )
+
+
+async def rebuild_collaborative_index():
+    """Nightly task: rebuild the collaborative filtering index in a child process and publish it to all workers."""
+    result = await publish_collaborative_index(get_settings().DATABASE_URL)
+    logger.info(
+        f"Collaborative index: v{result['version']} with {result['users']} users "
+        f"in {result['seconds']}s"
+    )
+
+
 def create_scheduler() -> AsyncIOScheduler:
     """Create and configure the notification scheduler."""
     scheduler = AsyncIOScheduler()
@@ -233,6 +363,14 @@ def create_scheduler() -> AsyncIOScheduler:
         id="challenge_expiry",
         replace_existing=True,
     )
+    scheduler.add_job(
+        score_habit_completion,
+        "cron",
+        hour=0,
+        minute=10,
+        id="completion_scores",
+        replace_existing=True,
+    )
     scheduler.add_job(
         auto_update_challenge_progress,
         "interval",
@@ -240,5 +378,45 @@ def create_scheduler() -> AsyncIOScheduler:
         id="challenge_progress",
         replace_existing=True,
     )
+    scheduler.add_job(
+        prune_sync_tombstones,
+        "cron",
+        hour=3,
+        minute=0,
+        id="sync_tombstone_prune",
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        prune_ai_insights,
+        "cron",
+        hour=3,
+        minute=15,
+        id="ai_insight_prune",
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        refresh_pattern_profiles,
+        "cron",
+        hour=2,
+        minute=30,
+        id="pattern_profiles",
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        retrain_difficulty_model,
+        "cron",
+        hour=3,
+        minute=30,
+        id="difficulty_model",
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        rebuild_collaborative_index,
+        "cron",
+        hour=3,
+        minute=45,
+        id="collaborative_index",
+        replace_existing=True,
+    )
     return scheduler
 
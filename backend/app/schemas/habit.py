@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime, date
 from app.models.habit import HabitCategory, HabitFrequency
 
@@ -69,9 +69,29 @@ class HabitLogResponse(BaseModel):
     habit_id: int
     date: date
     completed: bool
+    completions: int = 0
     completed_at: datetime | None
     note: str | None
     skipped_reason: str | None
     created_at: datetime
 
     model_config = {"from_attributes": True}
+
+
+class HabitLogBatchCreate(BaseModel):
+    items: list[HabitLogCreate] = Field(min_length=1, max_length=500)
+
+
+class HabitLogBatchItem(BaseModel):
+    habit_id: int
+    date: date
+    status: str  # "created", "updated", "error"
+    detail: str | None = None
+    log: HabitLogResponse | None = None
+
+
+class HabitLogBatchResponse(BaseModel):
+    results: list[HabitLogBatchItem]
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
@@ -0,0 +1,15 @@
+"""Schemas for delta sync."""
+from pydantic import BaseModel
+from app.schemas.habit import HabitResponse, HabitLogResponse
+from app.schemas.mood import MoodLogResponse
+from app.schemas.analytics import NotificationResponse
+
+
+class SyncResponse(BaseModel):
+    cursor: str
+    full: bool  # True — полный снимок: клиент заменяет локальные данные целиком
+    habits: list[HabitResponse] = []
+    logs: list[HabitLogResponse] = []
+    moods: list[MoodLogResponse] = []
+    notifications: list[NotificationResponse] = []
+    deleted: dict[str, list[int]] = {}  # entity -> ids (habit, habit_log, mood_log, notification)
@@ -1,41 +1,92 @@
 """
 Achievement Checker — проверяет и разблокирует достижения.
-Вызывается после логирования привычки и создания привычки.
+Каждое правило объявляет события, от которых зависит (создание привычки,
+запись лога, ...); при событии проверяются только правила, подписанные на него
+и ещё не разблокированные пользователем (множество разблокированных кэшируется).
 """
+import enum
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import date, timedelta
+from typing import Awaitable, Callable, Iterable
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from app.models.user import User
+from sqlalchemy import select, func, event
+from sqlalchemy.orm import Session
+from app.db.database import insert_for_dialect
 from app.models.habit import Habit
 from app.models.habit_log import HabitLog
 from app.models.achievement import Achievement, AchievementType, ACHIEVEMENT_META
 from app.models.notification import Notification
 from app.notifications.push_service import send_push_to_user
+from app.services.streak_state import get_current_streaks
+from app.services.data_version import mark_data_changed
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-async def _has_achievement(db: AsyncSession, user_id: int, achievement_type: str) -> bool:
+class AchievementEvent(str, enum.Enum):
+    HABIT_CREATED = "habit_created"
+    HABIT_UPDATED = "habit_updated"   # активность или cooldown привычки изменились
+    LOG_WRITTEN = "log_written"
+
+
+# ─── Unlocked-set cache ───
+# Per-process cache of achievement types each user already has. It only lets rules
+# be skipped: a missing entry (e.g. unlocked by another worker) is re-evaluated and
+# the insert below ignores the duplicate.
+
+_UNLOCKED_CACHE_SIZE = 10_000
+_unlocked_cache: OrderedDict[int, set[str]] = OrderedDict()
+
+
+async def _get_unlocked(db: AsyncSession, user_id: int) -> set[str]:
+    cached = _unlocked_cache.get(user_id)
+    if cached is not None:
+        _unlocked_cache.move_to_end(user_id)
+        return cached
     result = await db.execute(
-        select(Achievement).where(
-            Achievement.user_id == user_id,
-            Achievement.achievement_type == achievement_type,
-        )
+        select(Achievement.achievement_type).where(Achievement.user_id == user_id)
     )
-    return result.scalar_one_or_none() is not None
+    unlocked = set(result.scalars().all())
+    _unlocked_cache[user_id] = unlocked
+    while len(_unlocked_cache) > _UNLOCKED_CACHE_SIZE:
+        _unlocked_cache.popitem(last=False)
+    return unlocked
+
+
+def forget_unlocked(user_id: int) -> None:
+    """Drop the cached unlocked set of a user (e.g. after the user is deleted)."""
+    _unlocked_cache.pop(user_id, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_committed_unlocks(session: Session) -> None:
+    # New unlocks reach the cache only once their transaction is committed
+    for user_id, types in session.info.pop("unlocked_achievements", {}).items():
+        cached = _unlocked_cache.get(user_id)
+        if cached is not None:
+            cached.update(types)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_unlocks(session: Session) -> None:
+    session.info.pop("unlocked_achievements", None)
 
 
 async def _unlock(db: AsyncSession, user_id: int, achievement_type: str) -> Achievement | None:
     """Unlock an achievement and create a notification. Returns the new achievement or None if already exists."""
-    if await _has_achievement(db, user_id, achievement_type):
-        return None
-
-    achievement = Achievement(
-        user_id=user_id,
-        achievement_type=achievement_type,
+    stmt = (
+        insert_for_dialect(db.get_bind().dialect.name)(Achievement)
+        .values(user_id=user_id, achievement_type=achievement_type)
+        .on_conflict_do_nothing(index_elements=[Achievement.user_id, Achievement.achievement_type])
+        .returning(Achievement)
     )
-    db.add(achievement)
+    achievement = (await db.execute(stmt)).scalar_one_or_none()
+    db.info.setdefault("unlocked_achievements", {}).setdefault(user_id, set()).add(achievement_type)
+    if achievement is None:
+        return None
+    mark_data_changed(db, user_id)
 
     meta = ACHIEVEMENT_META.get(achievement_type, {})
     notification = Notification(
@@ -58,121 +109,157 @@ async def _unlock(db: AsyncSession, user_id: int, achievement_type: str) -> Achi
     return achievement
 
 
-async def check_and_unlock(db: AsyncSession, user_id: int) -> list[str]:
-    """Check all achievement conditions and unlock new ones. Returns list of newly unlocked types."""
-    unlocked = []
+# ─── Rules ───
 
-    # --- FIRST_HABIT: has at least 1 habit ---
-    habit_count_res = await db.execute(
-        select(func.count(Habit.id)).where(Habit.user_id == user_id)
-    )
-    habit_count = habit_count_res.scalar() or 0
+class _RuleContext:
+    """Data shared by the rules evaluated for one user in one check."""
 
-    if habit_count >= 1:
-        if await _unlock(db, user_id, AchievementType.FIRST_HABIT):
-            unlocked.append(AchievementType.FIRST_HABIT)
+    def __init__(self, db: AsyncSession, user_id: int):
+        self.db = db
+        self.user_id = user_id
+        self.today = date.today()
+        self._active_habits: list[Habit] | None = None
 
-    # --- FIVE_HABITS: 5 active habits ---
-    active_count_res = await db.execute(
-        select(func.count(Habit.id)).where(
-            Habit.user_id == user_id, Habit.is_active == True
-        )
+    async def active_habits(self) -> list[Habit]:
+        if self._active_habits is None:
+            result = await self.db.execute(
+                select(Habit).where(Habit.user_id == self.user_id, Habit.is_active == True)
+            )
+            self._active_habits = list(result.scalars().all())
+        return self._active_habits
+
+
+@dataclass(frozen=True)
+class AchievementRule:
+    # Achievement types the rule can unlock and the events that can change them
+    types: tuple[AchievementType, ...]
+    events: frozenset[AchievementEvent]
+    # Returns the subset of `types` whose condition currently holds
+    evaluate: Callable[[_RuleContext], Awaitable[set[AchievementType]]]
+
+
+async def _first_habit(ctx: _RuleContext) -> set[AchievementType]:
+    result = await ctx.db.execute(
+        select(Habit.id).where(Habit.user_id == ctx.user_id).limit(1)
     )
-    active_count = active_count_res.scalar() or 0
+    return {AchievementType.FIRST_HABIT} if result.first() else set()
+
+
+async def _five_habits(ctx: _RuleContext) -> set[AchievementType]:
+    return {AchievementType.FIVE_HABITS} if len(await ctx.active_habits()) >= 5 else set()
 
-    if active_count >= 5:
-        if await _unlock(db, user_id, AchievementType.FIVE_HABITS):
-            unlocked.append(AchievementType.FIVE_HABITS)
 
-    # --- TOTAL_100_LOGS: 100 completed logs ---
-    total_completed_res = await db.execute(
+async def _total_logs(ctx: _RuleContext) -> set[AchievementType]:
+    result = await ctx.db.execute(
         select(func.count(HabitLog.id)).where(
-            HabitLog.habit_id.in_(
-                select(Habit.id).where(Habit.user_id == user_id)
-            ),
+            HabitLog.habit_id.in_(select(Habit.id).where(Habit.user_id == ctx.user_id)),
             HabitLog.completed == True,
         )
     )
-    total_completed = total_completed_res.scalar() or 0
+    return {AchievementType.TOTAL_100_LOGS} if (result.scalar() or 0) >= 100 else set()
+
+
+_STREAK_THRESHOLDS = {
+    AchievementType.STREAK_7: 7,
+    AchievementType.STREAK_30: 30,
+    AchievementType.STREAK_100: 100,
+}
+
+
+async def _streaks(ctx: _RuleContext) -> set[AchievementType]:
+    streaks = await get_current_streaks(ctx.db, await ctx.active_habits(), ctx.today)
+    max_streak = max(streaks.values(), default=0)
+    return {t for t, threshold in _STREAK_THRESHOLDS.items() if max_streak >= threshold}
+
 
-    if total_completed >= 100:
-        if await _unlock(db, user_id, AchievementType.TOTAL_100_LOGS):
-            unlocked.append(AchievementType.TOTAL_100_LOGS)
+_PERFECT_PERIODS = {
+    AchievementType.WEEK_PERFECT: 7,
+    AchievementType.MONTH_PERFECT: 30,
+}
 
-    # --- STREAK achievements: check max streak across all habits ---
-    habits_res = await db.execute(
-        select(Habit).where(Habit.user_id == user_id, Habit.is_active == True)
+
+async def _perfect_periods(ctx: _RuleContext) -> set[AchievementType]:
+    """All active habits completed on every one of the last 7 / 30 days (one aggregate query)."""
+    habits = await ctx.active_habits()
+    if not habits:
+        return set()
+    since = ctx.today - timedelta(days=max(_PERFECT_PERIODS.values()) - 1)
+    result = await ctx.db.execute(
+        select(HabitLog.date)
+        .where(
+            HabitLog.habit_id.in_([h.id for h in habits]),
+            HabitLog.completed == True,
+            HabitLog.date >= since,
+            HabitLog.date <= ctx.today,
+        )
+        .group_by(HabitLog.date)
+        .having(func.count(HabitLog.habit_id) >= len(habits))
     )
-    habits = habits_res.scalars().all()
-
-    from app.api.routes.habits import _compute_streak
-
-    max_streak = 0
-    today = date.today()
-    for habit in habits:
-        streak = await _compute_streak(db, habit.id, habit.cooldown_days)
-        if streak > max_streak:
-            max_streak = streak
-
-    if max_streak >= 7:
-        if await _unlock(db, user_id, AchievementType.STREAK_7):
-            unlocked.append(AchievementType.STREAK_7)
-    if max_streak >= 30:
-        if await _unlock(db, user_id, AchievementType.STREAK_30):
-            unlocked.append(AchievementType.STREAK_30)
-    if max_streak >= 100:
-        if await _unlock(db, user_id, AchievementType.STREAK_100):
-            unlocked.append(AchievementType.STREAK_100)
-
-    # --- WEEK_PERFECT: all habits completed every day in the last 7 days ---
-    if habits:
-        today = date.today()
-        week_perfect = True
-        for i in range(7):
-            day = today - timedelta(days=i)
-            for habit in habits:
-                log_res = await db.execute(
-                    select(HabitLog).where(
-                        HabitLog.habit_id == habit.id,
-                        HabitLog.date == day,
-                        HabitLog.completed == True,
-                    )
-                )
-                if not log_res.scalar_one_or_none():
-                    week_perfect = False
-                    break
-            if not week_perfect:
-                break
-
-        if week_perfect:
-            if await _unlock(db, user_id, AchievementType.WEEK_PERFECT):
-                unlocked.append(AchievementType.WEEK_PERFECT)
-
-    # --- MONTH_PERFECT: all habits completed every day in the last 30 days ---
-    if habits:
-        month_perfect = True
-        for i in range(30):
-            day = today - timedelta(days=i)
-            for habit in habits:
-                log_res = await db.execute(
-                    select(HabitLog).where(
-                        HabitLog.habit_id == habit.id,
-                        HabitLog.date == day,
-                        HabitLog.completed == True,
-                    )
-                )
-                if not log_res.scalar_one_or_none():
-                    month_perfect = False
-                    break
-            if not month_perfect:
-                break
-
-        if month_perfect:
-            if await _unlock(db, user_id, AchievementType.MONTH_PERFECT):
-                unlocked.append(AchievementType.MONTH_PERFECT)
+    perfect_days = set(result.scalars().all())
+    return {
+        t for t, days in _PERFECT_PERIODS.items()
+        if all(ctx.today - timedelta(days=i) in perfect_days for i in range(days))
+    }
 
-    await db.flush()
-    return unlocked
 
+RULES: list[AchievementRule] = [
+    # Habit-count rules also listen to log writes: once unlocked they cost nothing,
+    # and five_habits reuses the active habits loaded for the streak rule
+    AchievementRule(
+        (AchievementType.FIRST_HABIT,),
+        frozenset({AchievementEvent.HABIT_CREATED, AchievementEvent.LOG_WRITTEN}),
+        _first_habit,
+    ),
+    AchievementRule(
+        (AchievementType.FIVE_HABITS,),
+        frozenset({
+            AchievementEvent.HABIT_CREATED,
+            AchievementEvent.HABIT_UPDATED,
+            AchievementEvent.LOG_WRITTEN,
+        }),
+        _five_habits,
+    ),
+    AchievementRule(
+        (AchievementType.TOTAL_100_LOGS,),
+        frozenset({AchievementEvent.LOG_WRITTEN}),
+        _total_logs,
+    ),
+    AchievementRule(
+        tuple(_STREAK_THRESHOLDS),
+        frozenset({AchievementEvent.LOG_WRITTEN, AchievementEvent.HABIT_UPDATED}),
+        _streaks,
+    ),
+    AchievementRule(
+        tuple(_PERFECT_PERIODS),
+        frozenset({AchievementEvent.LOG_WRITTEN, AchievementEvent.HABIT_UPDATED}),
+        _perfect_periods,
+    ),
+]
 
 
+async def check_and_unlock(
+    db: AsyncSession,
+    user_id: int,
+    events: Iterable[AchievementEvent] | None = None,
+) -> list[str]:
+    """
+    Evaluate the rules triggered by `events` (all rules when omitted) that the user
+    has not unlocked yet, and unlock the ones that now hold.
+    Returns list of newly unlocked types.
+    """
+    events = set(AchievementEvent) if events is None else set(events)
+    already = await _get_unlocked(db, user_id)
+    ctx = _RuleContext(db, user_id)
+
+    unlocked = []
+    for rule in RULES:
+        pending = [t for t in rule.types if t.value not in already]
+        if not pending or not rule.events & events:
+            continue
+        holds = await rule.evaluate(ctx)
+        for achievement_type in pending:
+            if achievement_type in holds and await _unlock(db, user_id, achievement_type):
+                unlocked.append(achievement_type)
+
+    await db.flush()
+    return unlocked
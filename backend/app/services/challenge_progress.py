@@ -0,0 +1,119 @@
+"""
+Challenge Progress — пересчёт прогресса активных челленджей пользователя
+по его логам. Вызывается фоновой очередью пересчёта после записи логов.
+"""
+from datetime import datetime, date, timezone
+import re
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.models.habit import Habit
+from app.models.habit_log import HabitLog
+from app.models.challenge import Challenge, ChallengeStatus, ChallengeType
+from app.services.streak_state import current_streak, load_streak_states
+
+
+async def recalculate_active_challenges(
+    db: AsyncSession,
+    user_id: int,
+    reference_date: date,
+    until_date: date | None = None,
+) -> None:
+    """Recompute progress of active challenges overlapping [reference_date, until_date]."""
+    result = await db.execute(
+        select(Challenge).where(
+            Challenge.user_id == user_id,
+            Challenge.status == ChallengeStatus.ACTIVE,
+            Challenge.start_date <= (until_date or reference_date),
+            Challenge.end_date >= reference_date,
+        )
+    )
+    challenges = result.scalars().all()
+    if not challenges:
+        return
+
+    habits_result = await db.execute(
+        select(Habit).where(Habit.user_id == user_id, Habit.is_active == True)
+    )
+    active_habits = habits_result.scalars().all()
+    active_habit_ids = [h.id for h in active_habits]
+    habit_by_id = {h.id: h for h in active_habits}
+    streak_habits = [
+        habit_by_id[c.target_habit_id] for c in challenges
+        if c.type == ChallengeType.STREAK_RECOVERY and c.target_habit_id in habit_by_id
+    ]
+    streak_states = await load_streak_states(db, streak_habits)
+
+    for challenge in challenges:
+        new_count = challenge.current_count
+
+        if challenge.type == ChallengeType.DAILY:
+            if challenge.target_habit_id is None:
+                continue
+            logs_result = await db.execute(
+                select(HabitLog).where(
+                    HabitLog.habit_id == challenge.target_habit_id,
+                    HabitLog.completed == True,
+                    HabitLog.date >= challenge.start_date,
+                    HabitLog.date <= challenge.end_date,
+                )
+            )
+            new_count = 1 if logs_result.scalar_one_or_none() else 0
+
+        elif challenge.type == ChallengeType.STREAK_RECOVERY:
+            if challenge.target_habit_id is None:
+                continue
+            habit = habit_by_id.get(challenge.target_habit_id)
+            if habit is None:
+                continue
+            streak = current_streak(streak_states.get(habit.id))
+            new_count = min(streak, challenge.target_count)
+
+        elif challenge.type == ChallengeType.WEEKLY:
+            if not active_habit_ids:
+                new_count = 0
+            else:
+                logs_result = await db.execute(
+                    select(HabitLog).where(
+                        HabitLog.habit_id.in_(active_habit_ids),
+                        HabitLog.completed == True,
+                        HabitLog.date >= challenge.start_date,
+                        HabitLog.date <= challenge.end_date,
+                    )
+                )
+                logs = logs_result.scalars().all()
+                by_day: dict[date, set[int]] = {}
+                for log in logs:
+                    by_day.setdefault(log.date, set()).add(log.habit_id)
+                new_count = sum(
+                    1 for completed_habits in by_day.values()
+                    if len(completed_habits) >= len(active_habit_ids)
+                )
+
+        elif challenge.type in {ChallengeType.IMPROVEMENT, ChallengeType.CATEGORY_FOCUS}:
+            category_match = re.search(r"'([^']+)'", challenge.title or "")
+            category = category_match.group(1).strip().lower() if category_match else None
+            candidate_habits = active_habits
+            if category:
+                candidate_habits = [h for h in active_habits if (h.category or '').lower() == category]
+            category_habit_ids = [h.id for h in candidate_habits]
+            if not category_habit_ids:
+                new_count = 0
+            else:
+                logs_result = await db.execute(
+                    select(HabitLog).where(
+                        HabitLog.habit_id.in_(category_habit_ids),
+                        HabitLog.completed == True,
+                        HabitLog.date >= challenge.start_date,
+                        HabitLog.date <= challenge.end_date,
+                    )
+                )
+                logs = logs_result.scalars().all()
+                new_count = len(logs)
+
+        new_count = max(0, min(new_count, challenge.target_count))
+        challenge.current_count = new_count
+
+        if new_count >= challenge.target_count:
+            challenge.status = ChallengeStatus.COMPLETED
+            if challenge.completed_at is None:
+                challenge.completed_at = datetime.now(timezone.utc)
@@ -0,0 +1,186 @@
+"""
+Collaborative — индекс коллаборативной фильтрации в процессе.
+Ночная задача строит CollaborativeIndex по всем активным привычкам и публикует
+его в model_registry; сборка идёт в отдельном процессе, чтобы CPU-работа
+не занимала event loop. Процесс берёт опубликованную версию и не чаще раза в
+COLLAB_INDEX_REFRESH_SECONDS дочитывает пользователей, чьи привычки изменились
+(habits.updated_at) или были удалены (tombstones) после водяной отметки индекса.
+Изменения привычек через API сразу применяются к индексу своего процесса.
+Пока версии нет, запрос рекомендаций получает None (без коллаборативных
+рекомендаций), а процесс запускает сборку в фоне (после ошибки — повтор не раньше
+чем через BUILD_RETRY_SECONDS); запрос никогда не читает привычки всей платформы.
+"""
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import select, union
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from app.config import get_settings
+from app.models.habit import Habit
+from app.models.sync_tombstone import SyncTombstone, SyncEntity
+from app.ml.collaborative_index import CollaborativeIndex
+from app.ml.model_registry import COLLABORATIVE_INDEX, model_registry
+import logging
+
+logger = logging.getLogger(__name__)
+
+INDEX_CHUNK_SIZE = 50_000
+CHANGED_USERS_PER_QUERY = 5_000
+# A failed first-use build is retried by a later request after this pause
+BUILD_RETRY_SECONDS = 300
+# The watermark trails the read time so that transactions committed after the read
+# are picked up by the next refresh; re-applying a user is idempotent, and anything
+# committed later than that is repaired by the nightly rebuild
+WATERMARK_OVERLAP = timedelta(seconds=60)
+
+_index: CollaborativeIndex | None = None
+_published: CollaborativeIndex | None = None
+_checked_at = float("-inf")
+_lock = asyncio.Lock()
+_build_task: asyncio.Task | None = None
+_build_failed_at = float("-inf")
+
+
+async def _apply_habits(
+    db: AsyncSession, index: CollaborativeIndex, user_ids: list[int] | None = None
+) -> None:
+    """Load the active habits of the users (all users if None) into the index, in chunks."""
+    query = (
+        select(Habit.user_id, Habit.category, Habit.name)
+        .where(Habit.is_active == True)
+        .order_by(Habit.user_id, Habit.id)
+    )
+    if user_ids is not None:
+        query = query.where(Habit.user_id.in_(user_ids))
+    changed: dict[int, list] = {user_id: [] for user_id in user_ids or ()}
+    result = await db.stream(query.execution_options(yield_per=INDEX_CHUNK_SIZE))
+    async for rows in result.partitions():
+        for user_id, category, name in rows:
+            changed.setdefault(user_id, []).append((category, name))
+        # The last user of a chunk may continue in the next one
+        last_user = rows[-1][0]
+        tail = changed.pop(last_user)
+        index.apply(changed)
+        changed = {last_user: tail}
+    index.apply(changed)
+
+
+async def build_collaborative_index(db: AsyncSession) -> CollaborativeIndex:
+    settings = get_settings()
+    index = CollaborativeIndex(
+        datetime.now(timezone.utc) - WATERMARK_OVERLAP,
+        lsh_bands=settings.COLLAB_LSH_BANDS,
+        lsh_rows=settings.COLLAB_LSH_ROWS,
+    )
+    await _apply_habits(db, index)
+    return index
+
+
+async def apply_habit_changes(db: AsyncSession, index: CollaborativeIndex) -> int:
+    """Update the index with users whose habits changed since its watermark. Returns users updated."""
+    started = datetime.now(timezone.utc)
+    result = await db.execute(union(
+        select(Habit.user_id).where(Habit.updated_at >= index.watermark),
+        select(SyncTombstone.user_id).where(
+            SyncTombstone.entity == SyncEntity.HABIT.value,
+            SyncTombstone.deleted_at >= index.watermark,
+        ),
+    ))
+    user_ids = result.scalars().all()
+    for start in range(0, len(user_ids), CHANGED_USERS_PER_QUERY):
+        await _apply_habits(db, index, list(user_ids[start:start + CHANGED_USERS_PER_QUERY]))
+    index.watermark = started - WATERMARK_OVERLAP
+    return len(user_ids)
+
+
+async def get_collaborative_index(db: AsyncSession) -> CollaborativeIndex | None:
+    """
+    The process's collaborative index with recent habit changes applied, or None
+    while no version is published (a build is then started in the background, one at a time).
+    The index is only changed on the event loop, so readers see it consistent.
+    """
+    global _index, _published, _checked_at, _build_task
+    published = model_registry.current(COLLABORATIVE_INDEX)
+    if published is not None and published is not _published:
+        _index = _published = published
+        _checked_at = float("-inf")
+
+    if _index is None:
+        if _build_task is None and time.monotonic() - _build_failed_at >= BUILD_RETRY_SECONDS:
+            _build_task = asyncio.create_task(_publish_if_missing())
+        return None
+    if time.monotonic() - _checked_at < get_settings().COLLAB_INDEX_REFRESH_SECONDS:
+        return _index
+    async with _lock:
+        if time.monotonic() - _checked_at >= get_settings().COLLAB_INDEX_REFRESH_SECONDS:
+            await apply_habit_changes(db, _index)
+            _checked_at = time.monotonic()
+    return _index
+
+
+async def _publish_if_missing() -> None:
+    """Publish a first index unless a version exists on disk that was just not loaded yet."""
+    global _build_task, _build_failed_at
+    try:
+        await model_registry.refresh(COLLABORATIVE_INDEX)
+        if model_registry.current(COLLABORATIVE_INDEX) is None:
+            result = await publish_collaborative_index()
+            logger.info(f"Collaborative index v{result['version']} built on first use")
+            if model_registry.current(COLLABORATIVE_INDEX) is None:
+                raise RuntimeError(f"published version {result['version']} could not be loaded")
+    except Exception as e:
+        _build_failed_at = time.monotonic()
+        logger.error(f"Building the collaborative index failed, retrying in {BUILD_RETRY_SECONDS}s: {e}")
+    finally:
+        _build_task = None
+
+
+async def apply_user_habits(db: AsyncSession, user_id: int) -> None:
+    """
+    Apply a change of the user's habits to this process's index right away;
+    other processes pick it up on their next refresh.
+    """
+    if _index is None:
+        return
+    async with _lock:
+        await _apply_habits(db, _index, [user_id])
+
+
+def build_and_publish(database_url: str) -> dict:
+    """
+    Worker entry point (runs in a child process): build the index from all active
+    habits with its own engine and publish it. Returns the index stats and version.
+    """
+    async def build() -> CollaborativeIndex:
+        engine = create_async_engine(database_url)
+        try:
+            async with async_sessionmaker(engine)() as db:
+                return await build_collaborative_index(db)
+        finally:
+            await engine.dispose()
+
+    index = asyncio.run(build())
+    version = model_registry.publish(COLLABORATIVE_INDEX, index, index.stats())
+    return {**index.stats(), "version": version}
+
+
+async def publish_collaborative_index(database_url: str | None = None) -> dict:
+    """
+    Rebuild the index from all active habits in a child process, publish it for all
+    processes and load it into this one.
+    """
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    # spawn: forking a process that runs an event loop and DB connections is unsafe
+    pool = ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        result = await loop.run_in_executor(
+            pool, build_and_publish, database_url or get_settings().DATABASE_URL
+        )
+    finally:
+        # Joining the child blocks: done off the event loop, which keeps serving requests
+        await asyncio.to_thread(pool.shutdown)
+    await model_registry.refresh(COLLABORATIVE_INDEX)
+    return {**result, "seconds": round(time.perf_counter() - started, 2)}
@@ -0,0 +1,140 @@
+"""
+Completion Scores — вероятность выполнения сегодня для всех активных привычек.
+Логи активных привычек читаются одним потоковым проходом (habit_id, date,
+completed) порциями; по каждой порции NumPy накапливает счётчики на привычку
+(все логи, последние RECENT_DAYS дней, тот же день недели), так что память
+зависит от числа привычек, а не логов. Формула — та же, что в PatternProfile.
+Результат сохраняется в habit_completion_scores на дату.
+"""
+from datetime import date, datetime, timedelta, timezone
+import numpy as np
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
+from app.db.database import insert_for_dialect
+from app.models.habit import Habit
+from app.models.habit_log import HabitLog
+from app.models.habit_completion_score import HabitCompletionScore
+from app.ml.pattern_analyzer import RECENT_DAYS, completion_probability
+import logging
+
+logger = logging.getLogger(__name__)
+
+SCORE_CHUNK_SIZE = 10_000
+LOOKUP_CHUNK_SIZE = 5_000
+
+
+async def score_habits(
+    db: AsyncSession, today: date | None = None, habit_ids: list[int] | None = None
+) -> dict[int, tuple[int, float]]:
+    """
+    Score today's completion probability of all active habits (or the given ones)
+    in one pass over their logs. Returns habit_id -> (user_id, probability).
+    """
+    today = today or date.today()
+    query = select(Habit.id, Habit.user_id).where(Habit.is_active == True).order_by(Habit.id)
+    if habit_ids is not None:
+        query = query.where(Habit.id.in_(habit_ids))
+    habits = (await db.execute(query)).all()
+    if not habits:
+        return {}
+    ids = np.array([h[0] for h in habits], dtype=np.int64)
+    n = len(ids)
+
+    # total, done, recent_total, recent_done, day_total, day_done per habit
+    counts = np.zeros((6, n))
+    recent_from = (today - timedelta(days=RECENT_DAYS)).toordinal()
+    weekday = today.weekday()
+
+    logs = select(HabitLog.habit_id, HabitLog.date, HabitLog.completed).join(
+        Habit, HabitLog.habit_id == Habit.id
+    ).where(Habit.is_active == True)
+    if habit_ids is not None:
+        logs = logs.where(Habit.id.in_(habit_ids))
+    result = await db.stream(logs.execution_options(yield_per=SCORE_CHUNK_SIZE))
+    async for rows in result.partitions():
+        log_habits, dates, completed = zip(*rows)
+        log_ids = np.array(log_habits, dtype=np.int64)
+        pos = np.searchsorted(ids, log_ids)
+        # Habits activated after the habit list was read are not in `ids`: skip their logs
+        known = pos < n
+        known[known] = ids[pos[known]] == log_ids[known]
+        pos = pos[known]
+        days = np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=len(rows))[known]
+        done = np.array(completed, dtype=bool)[known]
+        recent = days >= recent_from
+        # date.toordinal() is 1 for Monday 0001-01-01
+        same_day = (days - 1) % 7 == weekday
+        counts[0] += np.bincount(pos, minlength=n)
+        counts[1] += np.bincount(pos, weights=done, minlength=n)
+        counts[2] += np.bincount(pos[recent], minlength=n)
+        counts[3] += np.bincount(pos[recent], weights=done[recent], minlength=n)
+        counts[4] += np.bincount(pos[same_day], minlength=n)
+        counts[5] += np.bincount(pos[same_day], weights=done[same_day], minlength=n)
+
+    probability = completion_probability(*counts)
+    return {
+        habit_id: (user_id, round(float(p), 2))
+        for (habit_id, user_id), p in zip(habits, probability)
+    }
+
+
+async def refresh_completion_scores(db: AsyncSession, today: date | None = None) -> int:
+    """Score all active habits for the day, store the scores and prune old days. Returns habits scored."""
+    settings = get_settings()
+    today = today or date.today()
+    scores = await score_habits(db, today)
+
+    insert = insert_for_dialect(db.get_bind().dialect.name)
+    now = datetime.now(timezone.utc)
+    values = [
+        {"habit_id": habit_id, "date": today, "user_id": user_id, "probability": p, "scored_at": now}
+        for habit_id, (user_id, p) in scores.items()
+    ]
+    for start in range(0, len(values), 1000):
+        stmt = insert(HabitCompletionScore).values(values[start:start + 1000])
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[HabitCompletionScore.habit_id, HabitCompletionScore.date],
+            set_={"probability": stmt.excluded.probability, "scored_at": stmt.excluded.scored_at},
+        ))
+    await db.execute(delete(HabitCompletionScore).where(
+        HabitCompletionScore.date < today - timedelta(days=settings.COMPLETION_SCORE_RETENTION_DAYS)
+    ))
+    await db.commit()
+    return len(values)
+
+
+async def has_completion_scores(db: AsyncSession, today: date | None = None) -> bool:
+    result = await db.execute(
+        select(HabitCompletionScore.habit_id)
+        .where(HabitCompletionScore.date == (today or date.today()))
+        .limit(1)
+    )
+    return result.first() is not None
+
+
+async def get_completion_scores(
+    db: AsyncSession, habit_ids: list[int], today: date | None = None
+) -> dict[int, float]:
+    """
+    Today's completion probability of the habits from the stored scores; habits
+    not scored yet (created today, or before the daily job ran) are scored on the fly.
+    """
+    today = today or date.today()
+    scores: dict[int, float] = {}
+    # Chunked: one IN list per query stays below the driver's bind-parameter limit
+    for start in range(0, len(habit_ids), LOOKUP_CHUNK_SIZE):
+        chunk = habit_ids[start:start + LOOKUP_CHUNK_SIZE]
+        result = await db.execute(
+            select(HabitCompletionScore.habit_id, HabitCompletionScore.probability).where(
+                HabitCompletionScore.habit_id.in_(chunk),
+                HabitCompletionScore.date == today,
+            )
+        )
+        found = dict(result.all())
+        missing = [habit_id for habit_id in chunk if habit_id not in found]
+        if missing:
+            fresh = await score_habits(db, today, missing)
+            found.update({habit_id: p for habit_id, (_, p) in fresh.items()})
+        scores.update(found)
+    return scores
@@ -0,0 +1,161 @@
+"""
+Compute Executor — ограниченный пул для CPU-работы ML (pandas, NumPy, sklearn)
+вне event loop. Тяжёлый пользователь больше не блокирует остальные запросы
+воркера: вызовы уходят в пул потоков или процессов, очередь ограничена,
+а вызов, не успевший за таймаут (или отклонённый при переполнении), получает
+запасное значение. Запрос с запасным значением помечается как «деградировавший»,
+и его результат не попадает в user_cache.
+
+Режимы: "thread" (по умолчанию), "process" (функции и аргументы должны
+сериализоваться pickle) и "inline" — синхронно в event loop, без таймаутов.
+"""
+import asyncio
+import contextvars
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+from app.config import get_settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Set when a call in the current request fell back instead of returning a real result
+compute_degraded: contextvars.ContextVar[bool] = contextvars.ContextVar("compute_degraded", default=False)
+
+_LATENCY_SAMPLES = 500
+
+
+def _timed_call(fn, args: tuple) -> tuple[float, object]:
+    # Runs in the pool: report when the call actually started
+    return time.time(), fn(*args)
+
+
+def _percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+
+class ComputeExecutor:
+    def __init__(
+        self,
+        mode: str = "thread",
+        max_workers: int = 2,
+        max_pending: int = 32,
+        timeout_seconds: float = 10.0,
+    ):
+        self.mode = mode
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout_seconds = timeout_seconds
+        self._pool: Executor | None = None
+        # Submitted to the pool and not finished yet (including calls that timed out)
+        self._pending = 0
+        self._stats: dict[str, dict] = {}
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.mode == "process":
+                self._pool = ProcessPoolExecutor(
+                    self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="compute")
+        return self._pool
+
+    def _entry(self, name: str) -> dict:
+        return self._stats.setdefault(name, {
+            "calls": 0,
+            "completed": 0,
+            "timeouts": 0,
+            "rejected": 0,
+            "errors": 0,
+            "wait": deque(maxlen=_LATENCY_SAMPLES),
+            "run": deque(maxlen=_LATENCY_SAMPLES),
+        })
+
+    async def run(self, name: str, fn, *args, fallback=None, timeout: float | None = None):
+        """
+        Run `fn(*args)` in the pool and return its result. On timeout, a full queue
+        or an error, return `fallback` (called if callable) and mark the request degraded.
+        """
+        entry = self._entry(name)
+        entry["calls"] += 1
+        if self.mode == "inline":
+            return fn(*args)
+
+        if self._pending >= self.max_pending:
+            entry["rejected"] += 1
+            logger.warning(f"Compute queue full ({self._pending}), {name} falls back")
+            return self._fall_back(fallback)
+
+        submitted = time.time()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._get_pool(), _timed_call, fn, args)
+        self._pending += 1
+
+        def on_done(done: asyncio.Future) -> None:
+            self._pending -= 1
+            if done.cancelled() or done.exception() is not None:
+                return
+            started, _ = done.result()
+            entry["wait"].append(started - submitted)
+            entry["run"].append(time.time() - started)
+
+        future.add_done_callback(on_done)
+        try:
+            # Shielded: a timed-out call keeps its pool slot until it finishes
+            _, result = await asyncio.wait_for(
+                asyncio.shield(future), timeout or self.timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            entry["timeouts"] += 1
+            logger.warning(f"{name} did not finish in {timeout or self.timeout_seconds}s, falling back")
+            return self._fall_back(fallback)
+        except Exception as e:
+            entry["errors"] += 1
+            logger.error(f"{name} failed: {e}")
+            return self._fall_back(fallback)
+        entry["completed"] += 1
+        return result
+
+    @staticmethod
+    def _fall_back(fallback):
+        compute_degraded.set(True)
+        return fallback() if callable(fallback) else fallback
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "timeout_seconds": self.timeout_seconds,
+            "pending": self._pending,
+            "queued": max(0, self._pending - self.max_workers),
+            "entry_points": {
+                name: {
+                    **{k: v for k, v in entry.items() if k not in ("wait", "run")},
+                    "wait_ms_p50": _percentile(entry["wait"], 0.5),
+                    "wait_ms_p95": _percentile(entry["wait"], 0.95),
+                    "run_ms_p50": _percentile(entry["run"], 0.5),
+                    "run_ms_p95": _percentile(entry["run"], 0.95),
+                }
+                for name, entry in self._stats.items()
+            },
+        }
+
+
+settings = get_settings()
+compute_executor = ComputeExecutor(
+    mode=settings.COMPUTE_EXECUTOR,
+    max_workers=settings.COMPUTE_MAX_WORKERS,
+    max_pending=settings.COMPUTE_MAX_PENDING,
+    timeout_seconds=settings.COMPUTE_TIMEOUT_SECONDS,
+)
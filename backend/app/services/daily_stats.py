@@ -0,0 +1,197 @@
+"""
+Daily Stats — поддержка и чтение дневного агрегата user_daily_stats.
+Запись лога обновляет строки своих (дата, категория) одним upsert ... select
+в той же транзакции, так что аналитика видит отметку сразу. Удаление лога
+пересчитывает даты идемпотентно (delete + insert ... select), а смена категории
+или активности привычки и её удаление — весь агрегат пользователя.
+"""
+from dataclasses import dataclass
+from datetime import date
+from typing import Iterable
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, case, delete
+from app.db.database import insert_for_dialect
+from app.models.user import User
+from app.models.habit import Habit
+from app.models.habit_log import HabitLog
+from app.models.user_daily_stat import UserDailyStat
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DayTotals:
+    logged: int = 0
+    completed: int = 0
+    active_logged: int = 0
+    active_completed: int = 0
+
+
+def _rollup_select(
+    user_ids: list[int], dates: list[date] | None, categories: list[str] | None = None
+):
+    is_completed = HabitLog.completed == True
+    is_active = Habit.is_active == True
+    query = (
+        select(
+            Habit.user_id,
+            HabitLog.date,
+            Habit.category,
+            func.count(HabitLog.id),
+            func.sum(case((is_completed, 1), else_=0)),
+            func.sum(case((is_active, 1), else_=0)),
+            func.sum(case((is_active & is_completed, 1), else_=0)),
+        )
+        .join(Habit, HabitLog.habit_id == Habit.id)
+        .where(Habit.user_id.in_(user_ids))
+        .group_by(Habit.user_id, HabitLog.date, Habit.category)
+    )
+    if dates is not None:
+        query = query.where(HabitLog.date.in_(dates))
+    if categories is not None:
+        query = query.where(Habit.category.in_(categories))
+    return query
+
+
+async def _upsert_rollup(db: AsyncSession, query) -> None:
+    # Upsert rather than plain insert: concurrent refreshes of the same day
+    # must not fail on the primary key
+    stmt = insert_for_dialect(db.get_bind().dialect.name)(UserDailyStat).from_select(
+        [
+            UserDailyStat.user_id,
+            UserDailyStat.date,
+            UserDailyStat.category,
+            UserDailyStat.logged,
+            UserDailyStat.completed,
+            UserDailyStat.active_logged,
+            UserDailyStat.active_completed,
+        ],
+        query,
+    )
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[UserDailyStat.user_id, UserDailyStat.date, UserDailyStat.category],
+        set_={
+            "logged": stmt.excluded.logged,
+            "completed": stmt.excluded.completed,
+            "active_logged": stmt.excluded.active_logged,
+            "active_completed": stmt.excluded.active_completed,
+        },
+    ))
+
+
+async def refresh_daily_stats(
+    db: AsyncSession,
+    user_id: int,
+    dates: Iterable[date] | None = None,
+) -> None:
+    """
+    Recompute the rollup of one user for the given dates (all dates when omitted)
+    from habit_logs. Idempotent; pending log writes are flushed first.
+    """
+    await refresh_daily_stats_for_users(db, [user_id], dates)
+
+
+async def refresh_daily_stats_for_users(
+    db: AsyncSession,
+    user_ids: Iterable[int],
+    dates: Iterable[date] | None = None,
+) -> None:
+    """Same as refresh_daily_stats, for many users at once."""
+    user_ids = list(user_ids)
+    dates = sorted(set(dates)) if dates is not None else None
+    if not user_ids or dates == []:
+        return
+    await db.flush()
+
+    stale = delete(UserDailyStat).where(UserDailyStat.user_id.in_(user_ids))
+    if dates is not None:
+        stale = stale.where(UserDailyStat.date.in_(dates))
+    await db.execute(stale)
+    await _upsert_rollup(db, _rollup_select(user_ids, dates))
+
+
+async def update_daily_stats(
+    db: AsyncSession,
+    user_id: int,
+    dates: Iterable[date],
+    categories: Iterable[str],
+) -> None:
+    """
+    Update the rollup rows of the given dates and categories after log writes,
+    with one upsert ... select in the caller's transaction. Creating or updating
+    logs never empties a (date, category) group, so there is nothing to delete.
+    """
+    dates = sorted(set(dates))
+    categories = sorted(set(categories))
+    if not dates or not categories:
+        return
+    await db.flush()
+    await _upsert_rollup(db, _rollup_select([user_id], dates, categories))
+
+
+async def rebuild_all_daily_stats(db: AsyncSession, chunk_size: int = 500) -> int:
+    """Backfill/rebuild the rollup for every user on the platform. Returns number of users."""
+    total = 0
+    last_id = 0
+    while True:
+        result = await db.execute(
+            select(User.id).where(User.id > last_id).order_by(User.id).limit(chunk_size)
+        )
+        user_ids = result.scalars().all()
+        if not user_ids:
+            break
+        await refresh_daily_stats_for_users(db, user_ids)
+        await db.commit()
+        total += len(user_ids)
+        last_id = user_ids[-1]
+        logger.info(f"Rebuilt daily stats for {total} users")
+    return total
+
+
+async def get_daily_totals(
+    db: AsyncSession, user_id: int, since: date, until: date | None = None
+) -> dict[date, DayTotals]:
+    """Per-day totals (summed over categories) for days that have logs in [since, until]."""
+    query = (
+        select(
+            UserDailyStat.date,
+            func.sum(UserDailyStat.logged),
+            func.sum(UserDailyStat.completed),
+            func.sum(UserDailyStat.active_logged),
+            func.sum(UserDailyStat.active_completed),
+        )
+        .where(UserDailyStat.user_id == user_id, UserDailyStat.date >= since)
+        .group_by(UserDailyStat.date)
+    )
+    if until is not None:
+        query = query.where(UserDailyStat.date <= until)
+    result = await db.execute(query)
+    return {
+        day: DayTotals(int(logged), int(completed), int(active_logged), int(active_completed))
+        for day, logged, completed, active_logged, active_completed in result.all()
+    }
+
+
+async def get_category_totals(
+    db: AsyncSession, user_id: int, since: date, until: date | None = None
+) -> dict[str, DayTotals]:
+    """Totals per habit category over [since, until]."""
+    query = (
+        select(
+            UserDailyStat.category,
+            func.sum(UserDailyStat.logged),
+            func.sum(UserDailyStat.completed),
+            func.sum(UserDailyStat.active_logged),
+            func.sum(UserDailyStat.active_completed),
+        )
+        .where(UserDailyStat.user_id == user_id, UserDailyStat.date >= since)
+        .group_by(UserDailyStat.category)
+    )
+    if until is not None:
+        query = query.where(UserDailyStat.date <= until)
+    result = await db.execute(query)
+    return {
+        category: DayTotals(int(logged), int(completed), int(active_logged), int(active_completed))
+        for category, logged, completed, active_logged, active_completed in result.all()
+    }
@@ -0,0 +1,168 @@
+"""
+Data Version — счётчики изменений данных пользователя.
+
+users.data_version увеличивается при любой записи в привычки, логи, настроение,
+челленджи и достижения пользователя, поэтому производные данные можно кэшировать
+по ключу (user_id, data_version) без явной инвалидации.
+
+users.sync_version — курсор дельта-синхронизации. Транзакция, которая пишет
+синхронизируемые строки (привычки, логи, настроение, уведомления, tombstones),
+берёт следующее значение до первой записи и проставляет его этим строкам в change_seq.
+UPDATE держит блокировку строки пользователя до коммита, поэтому транзакции одного
+пользователя коммитятся в порядке своих номеров: пока номер N не закоммичен,
+клиенты видят курсор меньше N, и строка не может оказаться позади курсора.
+Тот же UPDATE увеличивает data_version, если транзакция меняет данные.
+
+Изменения ORM-объектов отслеживаются автоматически (before_flush); запросы в обход
+ORM (upsert логов, вставка достижений) вызывают mark_data_changed или next_change_seq.
+Версии остальных затронутых пользователей увеличиваются одним UPDATE перед коммитом.
+"""
+from sqlalchemy import event, select, or_, bindparam, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.user import User
+from app.models.habit import Habit
+from app.models.habit_log import HabitLog
+from app.models.mood_log import MoodLog
+from app.models.challenge import Challenge
+from app.models.achievement import Achievement
+from app.models.notification import Notification
+from app.models.sync_tombstone import SyncTombstone
+
+_USER_OWNED = (Habit, MoodLog, Challenge, Achievement)
+# Rows the mobile client syncs by change_seq
+_SYNCED = (Habit, HabitLog, MoodLog, Notification, SyncTombstone)
+_SYNCED_DATA = (Habit, HabitLog, MoodLog)
+
+_users = User.__table__
+_BUMP = (
+    _users.update()
+    .where(or_(
+        _users.c.id.in_(bindparam("user_ids", expanding=True)),
+        _users.c.id.in_(
+            select(Habit.__table__.c.user_id)
+            .where(Habit.__table__.c.id.in_(bindparam("habit_ids", expanding=True)))
+        ),
+    ))
+    .values(data_version=_users.c.data_version + 1)
+    .returning(_users.c.id)
+)
+_NEXT_SYNC_VERSION = (
+    _users.update()
+    .where(_users.c.id.in_(bindparam("user_ids", expanding=True)))
+    .values(
+        sync_version=_users.c.sync_version + 1,
+        data_version=_users.c.data_version + bindparam("data_step", type_=Integer),
+    )
+    .returning(_users.c.id, _users.c.sync_version)
+)
+
+# session.info keys
+_PENDING_USERS = "data_version_users"
+_PENDING_HABITS = "data_version_habits"
+_CHANGED_USERS = "data_version_changed"
+_BUMPED_USERS = "data_version_bumped"  # bumped together with sync_version in this transaction
+_SYNC_VERSIONS = "sync_versions"  # user_id -> sync_version taken by this transaction
+
+
+def mark_data_changed(db: AsyncSession, *user_ids: int) -> None:
+    """Bump the users' data version when the current transaction commits."""
+    db.info.setdefault(_PENDING_USERS, set()).update(user_ids)
+
+
+def data_changed_in_session(db: AsyncSession, user_id: int) -> bool:
+    """
+    Whether this session changed the user's data. The User loaded at the start
+    of the request then carries an outdated data_version.
+    """
+    return user_id in db.info.get(_PENDING_USERS, ()) or user_id in db.info.get(_CHANGED_USERS, ())
+
+
+async def next_change_seq(db: AsyncSession, user_id: int, data_changed: bool = True) -> int:
+    """
+    The change_seq for rows of the user written in bypass of the ORM. Taken once per
+    transaction; with `data_changed` the data version is bumped as by mark_data_changed.
+    """
+    if data_changed:
+        mark_data_changed(db, user_id)
+    versions = db.info.get(_SYNC_VERSIONS, {})
+    if user_id not in versions:
+        await db.run_sync(_take_sync_versions, {user_id}, {user_id} if data_changed else set())
+    return db.info[_SYNC_VERSIONS][user_id]
+
+
+def _take_sync_versions(session: Session, users: set[int], data_users: set[int]) -> None:
+    versions = session.info.setdefault(_SYNC_VERSIONS, {})
+    bumped = session.info.setdefault(_BUMPED_USERS, set())
+    for data_step, group in ((1, users & data_users), (0, users - data_users)):
+        group = group - versions.keys()
+        if not group:
+            continue
+        params = {"user_ids": sorted(group), "data_step": data_step}
+        versions.update(session.connection().execute(_NEXT_SYNC_VERSION, params).all())
+        if data_step:
+            bumped.update(group)
+
+
+def _owner_id(session: Session, obj) -> int | None:
+    if not isinstance(obj, HabitLog):
+        return obj.user_id
+    with session.no_autoflush:
+        habit = obj.habit if obj.habit_id is None else session.get(Habit, obj.habit_id)
+    return habit.user_id if habit is not None else None
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_changed_users(session: Session, flush_context, instances) -> None:
+    users = session.info.setdefault(_PENDING_USERS, set())
+    habits = session.info.setdefault(_PENDING_HABITS, set())
+    stamped: list[tuple[object, int]] = []
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if isinstance(obj, _SYNCED) and obj not in session.deleted:
+            owner_id = _owner_id(session, obj)
+            if owner_id is not None:
+                stamped.append((obj, owner_id))
+            if isinstance(obj, HabitLog) and owner_id is not None:
+                users.add(owner_id)
+                continue
+        if isinstance(obj, _USER_OWNED):
+            users.add(obj.user_id)
+        elif isinstance(obj, HabitLog):
+            habits.add(obj.habit_id)
+
+    if not stamped:
+        return
+    data_users = {owner_id for obj, owner_id in stamped if isinstance(obj, _SYNCED_DATA)}
+    _take_sync_versions(session, {owner_id for _, owner_id in stamped}, data_users)
+    versions = session.info[_SYNC_VERSIONS]
+    for obj, owner_id in stamped:
+        obj.change_seq = versions[owner_id]
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_data_versions(session: Session) -> None:
+    # Flush first so that changes made by the final flush are collected too
+    session.flush()
+    session.info.pop(_SYNC_VERSIONS, None)
+    bumped = session.info.pop(_BUMPED_USERS, set())
+    changed = session.info.setdefault(_CHANGED_USERS, set())
+    changed.update(bumped)
+    users = session.info.pop(_PENDING_USERS, set()) - bumped
+    habits = session.info.pop(_PENDING_HABITS, set())
+    users.discard(None)
+    habits.discard(None)
+    if not users and not habits:
+        return
+    params = {"user_ids": list(users), "habit_ids": list(habits)}
+    result = session.connection().execute(_BUMP, params)
+    changed.update(result.scalars().all())
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_versions(session: Session) -> None:
+    session.info.pop(_PENDING_USERS, None)
+    session.info.pop(_PENDING_HABITS, None)
+    session.info.pop(_BUMPED_USERS, None)
+    session.info.pop(_SYNC_VERSIONS, None)
@@ -0,0 +1,103 @@
+"""
+Detailed Analytics — векторизованный расчёт /analytics/detailed.
+Дни окна индексируются смещением от сегодняшнего дня (0 — сегодня); дневные итоги
+и выполнения раскладываются за один проход в массивы (день, привычка×день),
+а тепловая карта, недельный тренд и разбивка по дням считаются операциями numpy,
+поэтому окно в 365 дней стоит примерно столько же, сколько в 30.
+"""
+from datetime import date, datetime
+from typing import Iterable
+import numpy as np
+from app.models.habit import Habit
+from app.services.daily_stats import DayTotals
+
+
+def _offset(today: date, day: date) -> int:
+    return (today - day).days
+
+
+def totals_arrays(
+    daily: dict[date, DayTotals], today: date, n_days: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Logged / completed counts indexed by day offset 0..n_days (0 = today)."""
+    logged = np.zeros(n_days + 1, dtype=np.int64)
+    completed = np.zeros(n_days + 1, dtype=np.int64)
+    for day, totals in daily.items():
+        i = _offset(today, day)
+        if 0 <= i <= n_days:
+            logged[i] = totals.logged
+            completed[i] = totals.completed
+    return logged, completed
+
+
+def build_heatmap(
+    logged: np.ndarray, completed: np.ndarray, today: date, days: int
+) -> dict[str, bool | None]:
+    """Per day: None without logs, True if every log of the day was completed."""
+    perfect = (completed[:days] == logged[:days]).tolist()
+    has_logs = (logged[:days] > 0).tolist()
+    return {
+        date.fromordinal(today.toordinal() - i).isoformat(): perfect[i] if has_logs[i] else None
+        for i in range(days)
+    }
+
+
+def weekly_trend(logged: np.ndarray, completed: np.ndarray, num_weeks: int) -> list[float]:
+    """Completion % per 7-day block, oldest first."""
+    if num_weeks <= 0:
+        return []
+    week_logged = logged[: num_weeks * 7].reshape(num_weeks, 7).sum(axis=1).tolist()
+    week_completed = completed[: num_weeks * 7].reshape(num_weeks, 7).sum(axis=1).tolist()
+    trend = [
+        round(c / l * 100, 1) if l else 0.0
+        for l, c in zip(week_logged, week_completed)
+    ]
+    trend.reverse()
+    return trend
+
+
+def _created_date(habit: Habit) -> date | None:
+    created = habit.created_at
+    return created.date() if isinstance(created, datetime) else created
+
+
+def build_daily_breakdown(
+    habits: list[Habit],
+    completed_pairs: Iterable[tuple[date, int]],
+    today: date,
+    days: int,
+) -> dict[str, dict[str, list[str]]]:
+    """
+    Completed / missed habit names per day. A habit counts from the day it was created.
+    `completed_pairs` are (date, habit_id) of completed logs; they are bucketed in one pass.
+    """
+    habits = sorted(habits, key=lambda h: h.name)
+    names = np.array([h.name for h in habits], dtype=object)
+    row_of = {h.id: row for row, h in enumerate(habits)}
+
+    done = np.zeros((len(habits), days), dtype=bool)
+    for day, habit_id in completed_pairs:
+        i = _offset(today, day)
+        row = row_of.get(habit_id)
+        if row is not None and 0 <= i < days:
+            done[row, i] = True
+
+    # A habit is tracked on day offset i once i <= (today - created).days
+    last_tracked = np.array(
+        [
+            _offset(today, created) if created is not None else days
+            for created in map(_created_date, habits)
+        ],
+        dtype=np.int64,
+    )
+    tracked = np.arange(days)[None, :] <= last_tracked[:, None]
+
+    completed_mask = done & tracked
+    missed_mask = ~done & tracked
+    breakdown: dict[str, dict[str, list[str]]] = {}
+    for i in range(days):
+        breakdown[date.fromordinal(today.toordinal() - i).isoformat()] = {
+            "completed": names[completed_mask[:, i]].tolist(),
+            "missed": names[missed_mask[:, i]].tolist(),
+        }
+    return breakdown
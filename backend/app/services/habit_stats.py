@@ -0,0 +1,149 @@
+"""
+Habit Stats — пакетный расчёт статистики по привычкам.
+Серии, выполнения за сегодня, процент выполнения и распределение выполнений
+по часам считаются для всех привычек пользователя фиксированным числом
+сгруппированных запросов (без N+1).
+"""
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Iterable
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, case, cast, extract, Integer
+from app.models.habit import Habit
+from app.models.habit_log import HabitLog
+from app.services.streak_state import load_streak_states, current_streak
+
+
+@dataclass
+class HabitStats:
+    current_streak: int = 0
+    best_streak: int = 0
+    today_completions: int = 0
+    completion_rate: float = 0.0
+
+
+def completion_rate_from_counts(total: int, completed: int) -> float:
+    if not total:
+        return 0.0
+    return round(completed / total * 100, 1)
+
+
+async def get_habit_stats(
+    db: AsyncSession,
+    habits: Iterable[Habit],
+    local_date: date | None = None,
+    rate_days: int = 30,
+) -> dict[int, HabitStats]:
+    """
+    Compute streaks, today's completions and completion rate for many habits at once.
+    Streaks come from the materialized HabitStreak state; the rest takes two
+    queries regardless of the number of habits.
+    """
+    habits = list(habits)
+    if not habits:
+        return {}
+
+    habit_ids = [h.id for h in habits]
+    today = date.today()
+    user_date = local_date or today
+    since = today - timedelta(days=rate_days)
+
+    # 1. Streaks (materialized, O(1) per habit)
+    states = await load_streak_states(db, habits)
+
+    # 2. Completions on the user's local date
+    today_result = await db.execute(
+        select(HabitLog.habit_id, HabitLog.completions)
+        .where(
+            HabitLog.habit_id.in_(habit_ids),
+            HabitLog.date == user_date,
+            HabitLog.completed == True,
+        )
+    )
+    today_by_habit = dict(today_result.all())
+
+    # 3. Logged / completed counts over the rate window
+    rate_by_habit = await get_completion_rates(db, habit_ids, since)
+
+    stats: dict[int, HabitStats] = {}
+    for habit in habits:
+        state = states.get(habit.id)
+        stats[habit.id] = HabitStats(
+            current_streak=current_streak(state, today),
+            best_streak=state.best_streak if state else 0,
+            today_completions=today_by_habit.get(habit.id, 0),
+            completion_rate=rate_by_habit.get(habit.id, 0.0),
+        )
+    return stats
+
+
+async def get_completion_rates(db: AsyncSession, habit_ids: list[int], since: date) -> dict[int, float]:
+    """Completion rate (%) since a date for many habits in one grouped query; habits without logs are omitted."""
+    if not habit_ids:
+        return {}
+    result = await db.execute(
+        select(
+            HabitLog.habit_id,
+            func.count(HabitLog.id),
+            func.sum(case((HabitLog.completed == True, 1), else_=0)),
+        )
+        .where(HabitLog.habit_id.in_(habit_ids), HabitLog.date >= since)
+        .group_by(HabitLog.habit_id)
+    )
+    return {
+        habit_id: completion_rate_from_counts(total, completed or 0)
+        for habit_id, total, completed in result.all()
+    }
+
+
+def utc_hour(column, dialect_name: str):
+    """SQL expression for the UTC hour of a timestamp column."""
+    if dialect_name == "sqlite":
+        # SQLite keeps timestamps as UTC text
+        return cast(func.strftime("%H", column), Integer)
+    return cast(extract("hour", func.timezone("UTC", column)), Integer)
+
+
+def weekday(column, dialect_name: str):
+    """SQL expression for the day of week of a date column, Monday = 0 as date.weekday()."""
+    if dialect_name == "sqlite":
+        # %w counts from Sunday = 0
+        return (cast(func.strftime("%w", column), Integer) + 6) % 7
+    return cast(extract("isodow", column), Integer) - 1
+
+
+async def get_completion_hours(
+    db: AsyncSession, habit_ids: list[int], since: date | None = None
+) -> Counter:
+    """
+    Histogram of completion hours (UTC) for the given habits, optionally since a date.
+    Single-completion days are counted with GROUP BY in the database; only days with
+    several completions are fetched to expand their completion_times.
+    """
+    hours: Counter = Counter()
+    if not habit_ids:
+        return hours
+    conditions = [
+        HabitLog.habit_id.in_(habit_ids),
+        HabitLog.completed == True,
+        HabitLog.completed_at.is_not(None),
+    ]
+    if since is not None:
+        conditions.append(HabitLog.date >= since)
+
+    hour = utc_hour(HabitLog.completed_at, db.get_bind().dialect.name)
+    result = await db.execute(
+        select(hour, func.count())
+        .where(*conditions, HabitLog.completions <= 1)
+        .group_by(hour)
+    )
+    hours.update({int(h): count for h, count in result.all()})
+
+    result = await db.execute(
+        select(HabitLog.completion_times, HabitLog.completed_at)
+        .where(*conditions, HabitLog.completions > 1)
+    )
+    for times, completed_at in result.all():
+        hours.update(moment.hour for moment in (times or [completed_at]))
+    return hours
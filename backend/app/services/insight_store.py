@@ -0,0 +1,131 @@
+"""
+Insight Store — предвычисленные AI-советы для дашборда аналитики.
+Совет хранится в таблице ai_insights по отпечатку входной статистики и считается
+свежим в течение TTL. Запрос аналитики никогда не ждёт LLM: он получает свежее
+или устаревшее значение (или None), а генерация запускается в фоне
+(stale-while-revalidate). Одинаковые отпечатки — в том числе у разных
+пользователей — разделяют одну генерацию.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
+from app.db.database import AsyncSessionLocal, insert_for_dialect
+from app.models.ai_insight import AIInsight
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(stats: dict) -> str:
+    """Stable sha256 of the stats dict (key order does not matter)."""
+    payload = json.dumps(stats, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class InsightStore:
+    def __init__(self, ttl_seconds: float = 6 * 3600, failure_backoff_seconds: float = 300.0):
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.failure_backoff_seconds = failure_backoff_seconds
+        # fingerprint -> running generation (one per fingerprint across all users)
+        self._in_flight: dict[str, asyncio.Task] = {}
+        # fingerprint -> monotonic time before which a failed generation is not retried
+        self._failed_until: dict[str, float] = {}
+        self._stats = {
+            "fresh": 0,
+            "stale": 0,
+            "missing": 0,
+            "deduplicated": 0,
+            "generated": 0,
+            "failed": 0,
+        }
+
+    async def get(self, db: AsyncSession, stats: dict) -> str | None:
+        """
+        Return the stored insight for these stats without waiting for the LLM.
+        A stale or missing insight is regenerated in the background.
+        """
+        key = fingerprint(stats)
+        row = await db.get(AIInsight, key)
+        now = datetime.now(timezone.utc)
+        if row is not None:
+            generated_at = row.generated_at
+            if generated_at.tzinfo is None:
+                generated_at = generated_at.replace(tzinfo=timezone.utc)
+            if now - generated_at < self.ttl:
+                self._stats["fresh"] += 1
+                return row.insight
+            self._stats["stale"] += 1
+        else:
+            self._stats["missing"] += 1
+        self._schedule(key, stats)
+        return row.insight if row is not None else None
+
+    def _schedule(self, key: str, stats: dict) -> None:
+        if key in self._in_flight:
+            self._stats["deduplicated"] += 1
+            return
+        if self._failed_until.get(key, 0.0) > time.monotonic():
+            return
+        self._failed_until.pop(key, None)
+        task = asyncio.create_task(self._generate(key, dict(stats)))
+        self._in_flight[key] = task
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+    async def _generate(self, key: str, stats: dict) -> None:
+        from app.ml.pattern_analyzer import PatternAnalyzer
+        try:
+            insight = await PatternAnalyzer.generate_ai_insight(stats)
+            if not insight:
+                raise RuntimeError("LLM returned no insight")
+            async with AsyncSessionLocal() as db:
+                await save_insight(db, key, insight)
+                await db.commit()
+            self._stats["generated"] += 1
+        except Exception as e:
+            self._stats["failed"] += 1
+            now = time.monotonic()
+            self._failed_until = {k: t for k, t in self._failed_until.items() if t > now}
+            self._failed_until[key] = now + self.failure_backoff_seconds
+            logger.warning(f"AI insight generation failed for {key[:12]}: {e}")
+
+    async def stop(self) -> None:
+        """Let running generations finish (used on shutdown)."""
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight.values(), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "in_flight": len(self._in_flight),
+            "backing_off": sum(1 for t in self._failed_until.values() if t > time.monotonic()),
+            "ttl_seconds": self.ttl.total_seconds(),
+        }
+
+
+async def save_insight(db: AsyncSession, key: str, insight: str) -> None:
+    """Insert or replace the insight for a fingerprint (without committing)."""
+    insert = insert_for_dialect(db.get_bind().dialect.name)
+    stmt = insert(AIInsight).values(
+        fingerprint=key, insight=insight, generated_at=datetime.now(timezone.utc)
+    )
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[AIInsight.fingerprint],
+        set_={"insight": stmt.excluded.insight, "generated_at": stmt.excluded.generated_at},
+    ))
+
+
+async def prune_insights(db: AsyncSession, retention_days: int) -> int:
+    """Delete insights not regenerated within the retention window. Returns rows removed."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    result = await db.execute(delete(AIInsight).where(AIInsight.generated_at < cutoff))
+    await db.commit()
+    return result.rowcount or 0
+
+
+settings = get_settings()
+insight_store = InsightStore(ttl_seconds=settings.AI_INSIGHT_TTL_SECONDS)
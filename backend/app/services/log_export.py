@@ -0,0 +1,171 @@
+"""
+Log Export — потоковая выгрузка логов пользователя.
+Строки читаются серверным курсором порциями по EXPORT_CHUNK_SIZE и сразу
+кодируются в CSV, Parquet (по одной row group на порцию) или Arrow IPC stream,
+поэтому память не зависит от длины истории, а первые байты уходят клиенту сразу.
+Parquet/Arrow требуют pyarrow — он импортируется лениво и необязателен.
+"""
+import csv
+import io
+from typing import AsyncIterator
+from sqlalchemy import select
+from app.db.database import AsyncSessionLocal
+from app.models.habit import Habit
+from app.models.habit_log import HabitLog
+
+EXPORT_CHUNK_SIZE = 1000
+
+CSV_HEADER = ["Дата", "Привычка", "Категория", "Выполнена", "Выполнений", "Время", "Заметка"]
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+def pyarrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+async def stream_log_rows(user_id: int, chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[list]:
+    """
+    Yield the user's logs (newest first) in chunks of plain row tuples:
+    (date, habit name, category, completed, completions, completion_times, completed_at, note).
+    Uses its own session: the request session is closed before a streaming body is sent.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(
+            select(
+                HabitLog.date,
+                Habit.name,
+                Habit.category,
+                HabitLog.completed,
+                HabitLog.completions,
+                HabitLog.completion_times,
+                HabitLog.completed_at,
+                HabitLog.note,
+            )
+            .join(Habit, HabitLog.habit_id == Habit.id)
+            .where(Habit.user_id == user_id)
+            .order_by(HabitLog.date.desc(), HabitLog.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        async for partition in result.partitions():
+            yield partition
+
+
+async def csv_chunks(user_id: int) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    yield buffer.getvalue()
+
+    async for rows in stream_log_rows(user_id):
+        buffer.seek(0)
+        buffer.truncate()
+        for log_date, name, category, completed, completions, times, completed_at, note in rows:
+            times = times or ([completed_at] if completed_at else [])
+            writer.writerow([
+                log_date.isoformat(),
+                name,
+                category,
+                "Да" if completed else "Нет",
+                completions,
+                " ".join(moment.strftime("%H:%M") for moment in times),
+                note or "",
+            ])
+        yield buffer.getvalue()
+
+
+def _arrow_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("date", pa.date32()),
+        ("habit", pa.string()),
+        ("category", pa.string()),
+        ("completed", pa.bool_()),
+        ("completions", pa.int32()),
+        ("completion_times", pa.list_(pa.timestamp("us", tz="UTC"))),
+        ("note", pa.string()),
+    ])
+
+
+def _record_batch(schema, rows: list):
+    import pyarrow as pa
+    dates, names, categories, completed, completions, times, completed_at, notes = (
+        map(list, zip(*rows))
+    )
+    times = [
+        t or ([moment] if moment else [])
+        for t, moment in zip(times, completed_at)
+    ]
+    return pa.RecordBatch.from_arrays(
+        [
+            pa.array(dates, pa.date32()),
+            pa.array(names, pa.string()),
+            pa.array(categories, pa.string()),
+            pa.array(completed, pa.bool_()),
+            pa.array(completions, pa.int32()),
+            pa.array(times, schema.field("completion_times").type),
+            pa.array(notes, pa.string()),
+        ],
+        schema=schema,
+    )
+
+
+class _ChunkSink:
+    """Write-only file object handing out what was written since the last drain()."""
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # Writers record absolute offsets (e.g. in the Parquet footer)
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+async def columnar_chunks(user_id: int, fmt: str) -> AsyncIterator[bytes]:
+    """Parquet or Arrow IPC stream bytes, one row group / record batch per chunk."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    try:
+        async for rows in stream_log_rows(user_id):
+            writer.write_batch(_record_batch(schema, rows))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,85 @@
+"""
+Log Frames — логи пользователя в виде DataFrame для анализа паттернов.
+Из базы читаются только нужные колонки (без ORM-объектов), кадр собирается
+build_logs_frame в пуле вычислений и кэшируется в процессе по ключу
+(user_id, data_version, since, until): запись данных пользователя увеличивает
+версию, поэтому устаревший кадр не отдаётся.
+"""
+from collections import OrderedDict
+from datetime import date
+import pandas as pd
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.models.user import User
+from app.models.habit import Habit
+from app.models.habit_log import HabitLog
+from app.ml.pattern_analyzer import build_logs_frame
+from app.services.data_version import data_changed_in_session
+from app.services.habit_stats import utc_hour
+from app.services.compute_executor import compute_executor
+
+_FRAME_CACHE_SIZE = 64
+_frame_cache: OrderedDict[tuple, pd.DataFrame] = OrderedDict()
+
+
+async def has_logs(db: AsyncSession, user_id: int) -> bool:
+    result = await db.execute(
+        select(HabitLog.id)
+        .join(Habit, HabitLog.habit_id == Habit.id)
+        .where(Habit.user_id == user_id)
+        .limit(1)
+    )
+    return result.first() is not None
+
+
+async def get_logs_dataframe(
+    db: AsyncSession, user_id: int, since: date | None = None, until: date | None = None
+) -> pd.DataFrame | None:
+    """
+    Fetch the user's habit logs (optionally within [since, until]) as a compact DataFrame:
+    categorical habit_name/category, datetime64 date, bool completed, int8 day_of_week
+    and nullable Int8 hour (UTC, computed in the database). An empty frame means
+    the user has no logs; None means the frame could not be built in time.
+    """
+    key = None
+    if not data_changed_in_session(db, user_id):
+        version = (await db.execute(
+            select(User.data_version).where(User.id == user_id)
+        )).scalar_one_or_none()
+        key = (user_id, version, since, until)
+        cached = _frame_cache.get(key)
+        if cached is not None:
+            _frame_cache.move_to_end(key)
+            return cached.copy()
+
+    habits = (await db.execute(
+        select(Habit.id, Habit.name, Habit.category)
+        .where(Habit.user_id == user_id)
+        .order_by(Habit.id)
+    )).all()
+    conditions = [Habit.user_id == user_id]
+    if since is not None:
+        conditions.append(HabitLog.date >= since)
+    if until is not None:
+        conditions.append(HabitLog.date <= until)
+    # Plain Core rows through the connection: no ORM loading for a column select
+    conn = await db.connection()
+    hour = utc_hour(HabitLog.completed_at, conn.dialect.name)
+    rows = (await conn.execute(
+        select(HabitLog.habit_id, HabitLog.date, HabitLog.completed, hour)
+        .join(Habit, HabitLog.habit_id == Habit.id)
+        .where(*conditions)
+        .order_by(HabitLog.date.desc())
+    )).all()
+
+    if not rows:
+        return pd.DataFrame()
+    frame = await compute_executor.run("logs_frame", build_logs_frame, habits, rows)
+    if frame is None:
+        return None
+    if key is not None:
+        _frame_cache[key] = frame
+        while len(_frame_cache) > _FRAME_CACHE_SIZE:
+            _frame_cache.popitem(last=False)
+        return frame.copy()
+    return frame
@@ -0,0 +1,157 @@
+"""
+Log Upsert — атомарная запись лога привычки одним запросом.
+INSERT ... SELECT FROM habits ... ON CONFLICT (habit_id, date) DO UPDATE ... RETURNING:
+проверка владельца, проверка дневной цели и вставка/обновление выполняются
+в одном выражении, поэтому параллельные нажатия не создают дубликатов.
+
+На привычку приходится одна строка в день: для привычек с daily_target > 1
+каждое выполнение увеличивает счётчик completions и дописывает время
+в completion_times, пока цель не достигнута.
+
+Запрос возвращает и прежнее состояние строки, чтобы серия обновлялась
+инкрементально: на PostgreSQL признак вставки (xmax = 0) и прежний completed
+берутся из того же запроса (CTE previous видит строку до записи). SQLite вычисляет
+подзапросы RETURNING уже после записи, поэтому там прежняя строка читается
+отдельно перед upsert — записи в SQLite сериализованы, и она не успевает измениться.
+
+Запрос написан текстом: синтаксис одинаков для PostgreSQL и SQLite (3.35+),
+а текстовый запрос, в отличие от диалектного insert(), кэшируется SQLAlchemy
+и не компилируется заново на каждую отметку.
+"""
+from datetime import date, datetime, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, text, bindparam, column, Boolean, Date, DateTime, Integer, String
+from app.models.habit_log import HabitLog, TimestampList
+from app.services.data_version import next_change_seq
+
+_UPSERT_SQL = """
+{previous}
+INSERT INTO habit_logs (
+    habit_id, date, completed, completions, completed_at, completion_times,
+    note, skipped_reason, created_at, updated_at, change_seq
+)
+SELECT habits.id, :log_date, :completed, :completions, :completed_at, :completion_times,
+       :note, :skipped_reason, :now, :now, :change_seq
+FROM habits
+WHERE habits.id = :habit_id AND habits.user_id = :user_id
+ON CONFLICT (habit_id, date) DO UPDATE SET
+    completed = excluded.completed,
+    note = excluded.note,
+    skipped_reason = excluded.skipped_reason,
+    {set_completion}
+    updated_at = excluded.updated_at,
+    change_seq = excluded.change_seq
+{guard}
+RETURNING {returning}
+"""
+
+_PREVIOUS = """WITH previous AS (
+    SELECT completed FROM habit_logs WHERE habit_id = :habit_id AND date = :log_date
+)"""
+_RETURNING_PREVIOUS = "(xmax = 0) AS inserted, (SELECT completed FROM previous) AS previous_completed"
+
+_TARGET = "(SELECT target.daily_target FROM habits AS target WHERE target.id = habit_logs.habit_id)"
+
+# A repeated completion of a multi-completion habit adds to the day's counter,
+# a repeated completion of a single one just refreshes the log
+_SET_COMPLETED = f"""completions = CASE WHEN habit_logs.completed AND {_TARGET} > 1
+                       THEN habit_logs.completions + 1 ELSE 1 END,
+    completed_at = excluded.completed_at,
+    completion_times = CASE WHEN habit_logs.completed AND {_TARGET} > 1
+                            THEN COALESCE(habit_logs.completion_times || ',', '')
+                                 || excluded.completion_times
+                            ELSE excluded.completion_times END,"""
+_GUARD_COMPLETED = f"""WHERE NOT habit_logs.completed OR {_TARGET} <= 1
+   OR habit_logs.completions < {_TARGET}"""
+
+_SET_NOT_COMPLETED = """completions = 0,
+    completion_times = NULL,"""
+
+
+def _upsert_statement(dialect_name: str, completed: bool):
+    returning = [column.name for column in HabitLog.__table__.columns]
+    extra_columns = []
+    if dialect_name == "postgresql":
+        returning.append(_RETURNING_PREVIOUS)
+        extra_columns = [column("inserted", Boolean), column("previous_completed", Boolean)]
+    sql = _UPSERT_SQL.format(
+        previous=_PREVIOUS if extra_columns else "",
+        set_completion=_SET_COMPLETED if completed else _SET_NOT_COMPLETED,
+        guard=_GUARD_COMPLETED if completed else "",
+        # Textual columns are matched to the RETURNING list by position
+        returning=", ".join(returning),
+    )
+    stmt = text(sql).bindparams(
+        bindparam("habit_id", type_=Integer),
+        bindparam("user_id", type_=Integer),
+        bindparam("log_date", type_=Date),
+        bindparam("completed", type_=Boolean),
+        bindparam("completions", type_=Integer),
+        bindparam("completed_at", type_=DateTime(timezone=True)),
+        bindparam("completion_times", type_=TimestampList),
+        bindparam("note", type_=String),
+        bindparam("skipped_reason", type_=String),
+        bindparam("now", type_=DateTime(timezone=True)),
+        bindparam("change_seq", type_=Integer),
+    ).columns(*HabitLog.__table__.columns, *extra_columns)
+    return select(HabitLog, *extra_columns).from_statement(stmt)
+
+
+_STATEMENTS = {
+    (dialect_name, completed): _upsert_statement(dialect_name, completed)
+    for dialect_name in ("postgresql", "sqlite")
+    for completed in (True, False)
+}
+
+
+async def upsert_habit_log(
+    db: AsyncSession,
+    user_id: int,
+    habit_id: int,
+    log_date: date,
+    completed: bool = True,
+    note: str | None = None,
+    skipped_reason: str | None = None,
+) -> tuple[HabitLog | None, bool, bool | None]:
+    """
+    Create or update a log of the user's habit in a single statement (SQLite also reads
+    the previous row first). Returns (log, created, was_completed). `log` is None when the habit does not belong
+    to the user or its daily target is already reached. `was_completed` is the previous
+    state of the day (False for a new log), None if a concurrent write hid it.
+    """
+    now = datetime.now(timezone.utc)
+    change_seq = await next_change_seq(db, user_id)
+    dialect_name = db.get_bind().dialect.name
+    previous = None
+    if dialect_name == "sqlite":
+        result = await db.execute(
+            select(HabitLog.completed).where(HabitLog.habit_id == habit_id, HabitLog.date == log_date)
+        )
+        previous = result.first()
+    result = await db.execute(
+        _STATEMENTS[dialect_name, completed],
+        {
+            "habit_id": habit_id,
+            "user_id": user_id,
+            "log_date": log_date,
+            "completed": completed,
+            "completions": 1 if completed else 0,
+            "completed_at": now if completed else None,
+            "completion_times": [now] if completed else None,
+            "note": note,
+            "skipped_reason": skipped_reason,
+            "now": now,
+            "change_seq": change_seq,
+        },
+        execution_options={"populate_existing": True},
+    )
+    row = result.one_or_none()
+    if row is None:
+        return None, False, None
+    if dialect_name == "sqlite":
+        return row[0], previous is None, previous.completed if previous else False
+    log, inserted, previous_completed = row
+    if inserted:
+        return log, True, False
+    # Updated a row inserted after this statement's snapshot: its previous state is unknown
+    return log, False, previous_completed
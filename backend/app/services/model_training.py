@@ -0,0 +1,157 @@
+"""
+Model Training — фоновое обучение ML-моделей и публикация в model_registry.
+Классификатор сложности — одна глобальная модель по привычкам всех
+пользователей. Признаки привычек считаются агрегатами SQL (число логов, сумма
+выполнений, суммы дня недели и его квадрата, средний час) и читаются потоком
+порциями в компактные массивы; обучение идёт в отдельном процессе.
+
+Ночное переобучение инкрементальное: к загруженной модели добавляются
+деревья (warm start), обученные только на привычках с логами, изменёнными
+после прошлого обучения. Полное переобучение — когда деревьев становится
+больше DIFFICULTY_MODEL_MAX_TREES или в новых данных нет какого-то класса.
+"""
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func, case
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.config import get_settings
+from app.models.habit import Habit, HabitCategory
+from app.models.habit_log import HabitLog
+from app.ml.classifier import HabitDifficultyClassifier, WARM_START_TREES
+from app.ml.model_registry import DIFFICULTY_MODEL, model_registry
+from app.services.habit_stats import utc_hour, weekday
+import logging
+
+logger = logging.getLogger(__name__)
+
+FEATURE_CHUNK_SIZE = 10_000
+
+
+def _chunk_features(rows) -> pd.DataFrame:
+    habit_ids, categories, total, done, dow_sum, dow_squares, avg_hour = zip(*rows)
+    n = np.array(total, dtype=np.float64)
+    dow_sum = np.array(dow_sum, dtype=np.float64)
+    # Sample standard deviation (as pandas .std()) from the sums; 0 for a single log
+    variance = np.divide(
+        np.array(dow_squares, dtype=np.float64) - dow_sum ** 2 / n,
+        n - 1,
+        out=np.zeros_like(n),
+        where=n > 1,
+    )
+    return pd.DataFrame({
+        "habit_id": np.array(habit_ids, dtype=np.int64),
+        "category": pd.Categorical(categories, categories=list(HabitCategory)),
+        "completion_rate": (np.array(done, dtype=np.float64) / n).astype(np.float32),
+        "total_logs": n.astype(np.float32),
+        "avg_day_of_week": (dow_sum / n).astype(np.float32),
+        "std_day_of_week": np.sqrt(np.clip(variance, 0, None)).astype(np.float32),
+        "avg_hour": np.array(
+            [12 if h is None else h for h in avg_hour], dtype=np.float32
+        ),
+    })
+
+
+async def load_habit_features(
+    db: AsyncSession, changed_since: datetime | None = None
+) -> pd.DataFrame:
+    """
+    Per-habit classifier features of all habits with logs (or of those whose logs
+    changed since `changed_since`), aggregated in the database and streamed in chunks.
+    """
+    conn = await db.connection()
+    dow = weekday(HabitLog.date, conn.dialect.name)
+    query = (
+        select(
+            HabitLog.habit_id,
+            Habit.category,
+            func.count(),
+            func.sum(case((HabitLog.completed == True, 1), else_=0)),
+            func.sum(dow),
+            func.sum(dow * dow),
+            func.avg(utc_hour(HabitLog.completed_at, conn.dialect.name)),
+        )
+        .join(Habit, HabitLog.habit_id == Habit.id)
+        .group_by(HabitLog.habit_id, Habit.category)
+    )
+    if changed_since is not None:
+        query = query.where(HabitLog.habit_id.in_(
+            select(HabitLog.habit_id).where(HabitLog.updated_at >= changed_since)
+        ))
+    result = await conn.stream(query.execution_options(yield_per=FEATURE_CHUNK_SIZE))
+    parts = [_chunk_features(rows) async for rows in result.partitions()]
+    if not parts:
+        return pd.DataFrame()
+    return pd.concat(parts, ignore_index=True)
+
+
+def fit_difficulty_model(
+    features: pd.DataFrame, previous: HabitDifficultyClassifier | None = None
+) -> HabitDifficultyClassifier | None:
+    """
+    Worker entry point (runs in a child process): warm-start `previous` on the
+    features, or train a new model when `previous` is None. None if training was not possible.
+    """
+    classifier = previous or HabitDifficultyClassifier()
+    return classifier if classifier.fit_features(features, warm_start=previous is not None) else None
+
+
+async def train_difficulty_model(session_factory: async_sessionmaker, full: bool = False) -> dict:
+    """
+    Train the global difficulty classifier and publish a new version; incrementally
+    on the habits changed since the loaded version unless `full`. The previous
+    version stays in use when there is nothing new or not enough data.
+    """
+    settings = get_settings()
+    started = time.perf_counter()
+    trained_until = datetime.now(timezone.utc)
+    await model_registry.refresh(DIFFICULTY_MODEL)
+    previous = model_registry.current(DIFFICULTY_MODEL)
+    meta = model_registry.metadata(DIFFICULTY_MODEL) or {}
+    incremental = (
+        not full
+        and settings.DIFFICULTY_MODEL_WARM_START
+        and previous is not None
+        and previous.is_trained
+        and "trained_until" in meta
+        and previous.model.n_estimators + WARM_START_TREES <= settings.DIFFICULTY_MODEL_MAX_TREES
+    )
+
+    loop = asyncio.get_running_loop()
+    # spawn: forking a process that runs an event loop and DB connections is unsafe
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        classifier = None
+        if incremental:
+            async with session_factory() as db:
+                features = await load_habit_features(
+                    db, datetime.fromisoformat(meta["trained_until"])
+                )
+            if features.empty:
+                return {"mode": "incremental", "habits": 0, "version": None,
+                        "seconds": round(time.perf_counter() - started, 2)}
+            classifier = await loop.run_in_executor(pool, fit_difficulty_model, features, previous)
+        if classifier is None:
+            incremental = False
+            async with session_factory() as db:
+                features = await load_habit_features(db)
+            if not features.empty:
+                classifier = await loop.run_in_executor(pool, fit_difficulty_model, features)
+
+    version = None
+    if classifier is not None:
+        version = await asyncio.to_thread(model_registry.publish, DIFFICULTY_MODEL, classifier, {
+            "mode": "incremental" if incremental else "full",
+            "habits": len(features),
+            "trees": classifier.model.n_estimators,
+            "trained_until": trained_until.isoformat(),
+        })
+    return {
+        "mode": "incremental" if incremental else "full",
+        "habits": len(features),
+        "version": version,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
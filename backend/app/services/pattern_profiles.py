@@ -0,0 +1,220 @@
+"""
+Pattern Profiles — ночной пакетный расчёт профилей паттернов всех пользователей.
+Пользователи читаются порциями (keyset по id), логи порции — одним запросом
+по нужным колонкам, а PatternProfile считается в пуле процессов, чтобы
+CPU-работа pandas/NumPy не занимала event loop. Результаты сохраняются
+в user_pattern_profiles вместе с data_version пользователя и датой расчёта.
+Эндпоинты отдают сохранённый профиль, пока он не старше
+PATTERN_PROFILE_MAX_AGE_DAYS (вероятности на сегодня для профиля прошлого дня
+берутся из habit_completion_scores), и считают профиль на лету только для
+пользователей без него (новые пользователи).
+"""
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timezone
+from itertools import groupby
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.config import get_settings
+from app.db.database import AsyncSessionLocal, insert_for_dialect
+from app.models.user import User
+from app.models.habit import Habit
+from app.models.habit_log import HabitLog
+from app.models.pattern_profile import UserPatternProfile
+from app.ml.pattern_analyzer import PatternAnalyzer, PatternProfile, build_logs_frame
+from app.ml.classifier import HabitDifficultyClassifier
+from app.ml.model_registry import DIFFICULTY_MODEL, model_registry
+from app.services.habit_stats import utc_hour
+from app.services.compute_executor import compute_executor, compute_degraded
+from app.services.completion_scores import get_completion_scores
+from app.services.data_version import data_changed_in_session
+from app.services.log_frames import get_logs_dataframe
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def compute_profiles(
+    batch: list[tuple], today: date, classifier: HabitDifficultyClassifier
+) -> list[tuple[int, dict]]:
+    """
+    Worker entry point (runs in a child process). `batch` holds
+    (user_id, habits, rows) as taken by build_logs_frame; habit difficulties
+    of the whole batch are scored with one classifier call.
+    """
+    frames = [build_logs_frame(habits, rows) for _, habits, rows in batch]
+    profiles = []
+    for (user_id, _, _), df, difficulties in zip(batch, frames, classifier.predict_frames(frames)):
+        profile = PatternAnalyzer.build_profile(df, today)
+        profile.difficulties = difficulties
+        profiles.append((user_id, profile.to_dict()))
+    return profiles
+
+
+def build_profile_with_difficulties(
+    df: pd.DataFrame, classifier: HabitDifficultyClassifier
+) -> PatternProfile:
+    profile = PatternAnalyzer.build_profile(df)
+    profile.difficulties = classifier.predict(df)
+    return profile
+
+
+async def _load_batch(db: AsyncSession, user_ids: list[int]) -> list[tuple]:
+    """Habits and log columns of the users, grouped per user; users without logs are skipped."""
+    habits = (await db.execute(
+        select(Habit.user_id, Habit.id, Habit.name, Habit.category)
+        .where(Habit.user_id.in_(user_ids))
+        .order_by(Habit.user_id, Habit.id)
+    )).all()
+    conn = await db.connection()
+    rows = (await conn.execute(
+        select(
+            Habit.user_id,
+            HabitLog.habit_id,
+            HabitLog.date,
+            HabitLog.completed,
+            utc_hour(HabitLog.completed_at, conn.dialect.name),
+        )
+        .join(Habit, HabitLog.habit_id == Habit.id)
+        .where(Habit.user_id.in_(user_ids))
+        .order_by(Habit.user_id, HabitLog.date.desc())
+    )).all()
+
+    habits_by_user = {
+        user_id: [tuple(h[1:]) for h in group]
+        for user_id, group in groupby(habits, key=lambda h: h[0])
+    }
+    return [
+        (user_id, habits_by_user[user_id], [tuple(r[1:]) for r in group])
+        for user_id, group in groupby(rows, key=lambda r: r[0])
+    ]
+
+
+async def _save_profiles(
+    db: AsyncSession, profiles: list[tuple[int, dict]], versions: dict[int, int], today: date
+) -> None:
+    if not profiles:
+        return
+    insert = insert_for_dialect(db.get_bind().dialect.name)
+    now = datetime.now(timezone.utc)
+    stmt = insert(UserPatternProfile).values([
+        {
+            "user_id": user_id,
+            "profile": profile,
+            "data_version": versions.get(user_id, 0),
+            "computed_for": today,
+            "computed_at": now,
+        }
+        for user_id, profile in profiles
+    ])
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[UserPatternProfile.user_id],
+        set_={
+            "profile": stmt.excluded.profile,
+            "data_version": stmt.excluded.data_version,
+            "computed_for": stmt.excluded.computed_for,
+            "computed_at": stmt.excluded.computed_at,
+        },
+    ))
+    await db.commit()
+
+
+async def rebuild_pattern_profiles(
+    session_factory: async_sessionmaker,
+    workers: int | None = None,
+    chunk_size: int | None = None,
+    today: date | None = None,
+) -> dict:
+    """
+    Recompute the pattern profiles of all users with logs. Batches are loaded while
+    earlier ones are computed in the pool; at most two batches per worker are in flight.
+    """
+    settings = get_settings()
+    workers = workers or settings.PATTERN_PROFILE_WORKERS
+    chunk_size = chunk_size or settings.PATTERN_PROFILE_CHUNK_SIZE
+    today = today or date.today()
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    users = profiles = 0
+    classifier = model_registry.current(DIFFICULTY_MODEL) or HabitDifficultyClassifier()
+
+    # spawn: forking a process that runs an event loop and DB connections is unsafe
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        async with session_factory() as db:
+            pending: dict[asyncio.Future, dict[int, int]] = {}
+
+            async def save_done(wait_for) -> None:
+                nonlocal profiles
+                done, _ = await asyncio.wait(pending, return_when=wait_for)
+                for future in done:
+                    versions = pending.pop(future)
+                    result = future.result()
+                    await _save_profiles(db, result, versions, today)
+                    profiles += len(result)
+
+            last_id = 0
+            while True:
+                chunk = (await db.execute(
+                    select(User.id, User.data_version)
+                    .where(User.id > last_id)
+                    .order_by(User.id)
+                    .limit(chunk_size)
+                )).all()
+                if not chunk:
+                    break
+                last_id = chunk[-1][0]
+                users += len(chunk)
+                batch = await _load_batch(db, [user_id for user_id, _ in chunk])
+                if batch:
+                    future = loop.run_in_executor(pool, compute_profiles, batch, today, classifier)
+                    pending[future] = dict(chunk)
+                if len(pending) >= 2 * workers:
+                    await save_done(asyncio.FIRST_COMPLETED)
+            if pending:
+                await save_done(asyncio.ALL_COMPLETED)
+
+    return {
+        "users": users,
+        "profiles": profiles,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+async def get_pattern_profile(db: AsyncSession, user_id: int) -> PatternProfile:
+    """
+    The user's pattern profile: the stored one while it is at most
+    PATTERN_PROFILE_MAX_AGE_DAYS old, otherwise computed on the fly and stored.
+    """
+    today = date.today()
+    stored = (await db.execute(
+        select(UserPatternProfile.profile, UserPatternProfile.computed_for)
+        .where(UserPatternProfile.user_id == user_id)
+    )).one_or_none()
+    max_age = get_settings().PATTERN_PROFILE_MAX_AGE_DAYS
+    if stored is not None and (today - stored.computed_for).days <= max_age:
+        profile = PatternProfile.from_dict(stored.profile)
+        if stored.computed_for != today:
+            # Probabilities are per day: today's come from the daily completion scores
+            profile.today_probability = await get_completion_scores(
+                db, list(profile.today_probability), today
+            )
+        return profile
+
+    df = await get_logs_dataframe(db, user_id)
+    if df is None:
+        return PatternProfile()
+    classifier = model_registry.current(DIFFICULTY_MODEL) or HabitDifficultyClassifier()
+    profile = await compute_executor.run(
+        "pattern_profile", build_profile_with_difficulties, df, classifier, fallback=PatternProfile
+    )
+    # Uncommitted changes of this session or a degraded result must not be stored
+    if not data_changed_in_session(db, user_id) and not compute_degraded.get():
+        version = (await db.execute(
+            select(User.data_version).where(User.id == user_id)
+        )).scalar_one_or_none()
+        async with AsyncSessionLocal() as store:
+            await _save_profiles(store, [(user_id, profile.to_dict())], {user_id: version or 0}, today)
+    return profile
@@ -0,0 +1,196 @@
+"""
+Recompute Queue — фоновый пересчёт производных данных после записи логов:
+прогресса челленджей и достижений (серии и дневной агрегат обновляются в самом
+запросе записи).
+
+Запись лога добавляет в свою транзакцию строку recompute_marks (mark_dirty), так что
+метка коммитится вместе с логом и не теряется при перезапуске процесса. После коммита
+воркер процесса просыпается, выжидает debounce, схлопывает метки в один пересчёт
+на пользователя и выполняет пересчёты с ограниченной параллельностью (каждый в своей
+сессии БД). Метки пользователя блокируются (FOR UPDATE SKIP LOCKED) и удаляются
+в транзакции пересчёта: при ошибке они остаются и обрабатываются снова, а воркеры
+разных процессов не берут одни и те же метки. Метки, оставленные другими или
+перезапущенными процессами, подбираются опросом раз в RECOMPUTE_POLL_SECONDS.
+"""
+import asyncio
+import time
+from datetime import date, datetime, timezone
+from sqlalchemy import event, select, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.config import get_settings
+from app.db.database import AsyncSessionLocal
+from app.models.recompute_mark import RecomputeMark
+from app.services.achievement_checker import AchievementEvent, check_and_unlock
+from app.services.challenge_progress import recalculate_active_challenges
+import logging
+
+logger = logging.getLogger(__name__)
+
+USERS_PER_BATCH = 500
+
+# session.info key: wake the worker once the transaction with new marks commits
+_WAKE_ON_COMMIT = "recompute_wake"
+
+
+class RecomputeQueue:
+    def __init__(
+        self, debounce_seconds: float = 2.0, max_concurrency: int = 4, poll_seconds: float = 30.0
+    ):
+        self.debounce_seconds = debounce_seconds
+        self.max_concurrency = max_concurrency
+        self.poll_seconds = poll_seconds
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+        self._current: asyncio.Future | None = None
+        self._in_flight = 0
+        self._stats = {
+            "marked": 0,
+            "coalesced": 0,
+            "processed": 0,
+            "failed": 0,
+            "last_batch_size": 0,
+            "last_batch_ms": 0.0,
+        }
+
+    def mark_dirty(self, db: AsyncSession, user_id: int, start: date, end: date | None = None) -> None:
+        """
+        Schedule a recompute of the user's challenges and achievements
+        covering [start, end]. The mark is committed with the caller's transaction.
+        """
+        db.add(RecomputeMark(user_id=user_id, start_date=start, end_date=end or start))
+        db.info[_WAKE_ON_COMMIT] = True
+        self._stats["marked"] += 1
+
+    def wake(self) -> None:
+        self.start()
+        self._wakeup.set()
+
+    def start(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the worker; unprocessed marks stay in the database for the next start."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._current is not None and not self._current.done():
+            await self._current
+
+    async def flush(self) -> int:
+        """Recompute users with pending marks now (bounded by max_concurrency). Returns users found."""
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(RecomputeMark.user_id)
+                .group_by(RecomputeMark.user_id)
+                .order_by(func.min(RecomputeMark.id))
+                .limit(USERS_PER_BATCH)
+            )
+            user_ids = result.scalars().all()
+        if not user_ids:
+            return 0
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        await asyncio.gather(*(self._recompute(semaphore, user_id) for user_id in user_ids))
+        self._stats["last_batch_size"] = len(user_ids)
+        self._stats["last_batch_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return len(user_ids)
+
+    async def backlog(self, db: AsyncSession) -> dict:
+        """Marks still waiting in the database (from all processes) and the age of the oldest one."""
+        marks, users, oldest = (await db.execute(
+            select(
+                func.count(RecomputeMark.id),
+                func.count(RecomputeMark.user_id.distinct()),
+                func.min(RecomputeMark.marked_at),
+            )
+        )).one()
+        age = None
+        if oldest is not None:
+            if oldest.tzinfo is None:  # SQLite returns naive UTC timestamps
+                oldest = oldest.replace(tzinfo=timezone.utc)
+            age = round((datetime.now(timezone.utc) - oldest).total_seconds(), 1)
+        return {"pending_marks": marks, "pending_users": users, "oldest_mark_age_seconds": age}
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "in_flight": self._in_flight,
+            "running": self._worker is not None and not self._worker.done(),
+            "debounce_seconds": self.debounce_seconds,
+            "max_concurrency": self.max_concurrency,
+            "poll_seconds": self.poll_seconds,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+                # Give a burst of writes (e.g. offline sync) time to coalesce
+                await asyncio.sleep(self.debounce_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            # Users marked while this batch runs are picked up by the next one.
+            # Shielded so that stop() lets an in-progress batch finish.
+            self._current = asyncio.ensure_future(self.flush())
+            try:
+                found = await asyncio.shield(self._current)
+            except Exception as e:
+                logger.error(f"Recompute batch failed: {e}")
+                continue
+            if found >= USERS_PER_BATCH:
+                self._wakeup.set()
+
+    async def _recompute(self, semaphore: asyncio.Semaphore, user_id: int) -> None:
+        async with semaphore:
+            self._in_flight += 1
+            try:
+                async with AsyncSessionLocal() as db:
+                    result = await db.execute(
+                        select(RecomputeMark.id, RecomputeMark.start_date, RecomputeMark.end_date)
+                        .where(RecomputeMark.user_id == user_id)
+                        .with_for_update(skip_locked=True)
+                    )
+                    marks = result.all()
+                    if not marks:
+                        return  # taken by another worker
+                    start = min(mark.start_date for mark in marks)
+                    end = max(mark.end_date for mark in marks)
+                    await recalculate_active_challenges(db, user_id, start, end)
+                    await check_and_unlock(db, user_id, [AchievementEvent.LOG_WRITTEN])
+                    await db.execute(
+                        delete(RecomputeMark).where(RecomputeMark.id.in_([mark.id for mark in marks]))
+                    )
+                    await db.commit()
+                self._stats["coalesced"] += len(marks) - 1
+                self._stats["processed"] += 1
+            except Exception as e:
+                self._stats["failed"] += 1
+                logger.error(f"Recompute failed for user {user_id}: {e}")
+            finally:
+                self._in_flight -= 1
+
+
+settings = get_settings()
+recompute_queue = RecomputeQueue(
+    debounce_seconds=settings.RECOMPUTE_DEBOUNCE_SECONDS,
+    max_concurrency=settings.RECOMPUTE_MAX_CONCURRENCY,
+    poll_seconds=settings.RECOMPUTE_POLL_SECONDS,
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session: Session) -> None:
+    if session.info.pop(_WAKE_ON_COMMIT, False):
+        recompute_queue.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_wake(session: Session) -> None:
+    session.info.pop(_WAKE_ON_COMMIT, None)
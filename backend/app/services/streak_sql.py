@@ -0,0 +1,134 @@
+"""
+Streak SQL — расчёт серий на стороне БД (gaps-and-islands на оконных функциях).
+Один запрос считает серии сразу для многих привычек с учётом cooldown_days.
+
+Семантика совпадает с прежними Python-циклами:
+- current_streak — подряд идущие выполненные логи ровно через cooldown_days,
+  заканчивающиеся последним выполнением (дубликат дня обрывает серию);
+- best_streak — самая длинная серия, где пропуски короче cooldown пропускаются,
+  а разрыв больше cooldown начинает новую серию;
+- recovery_run — число логов в последнем отрезке без разрыва больше cooldown
+  (так get_streak_recovery определяет длину сломанной серии).
+"""
+from dataclasses import dataclass
+from datetime import date
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, case, and_
+from app.models.habit import Habit
+from app.models.habit_log import HabitLog
+
+
+@dataclass
+class StreakRow:
+    habit_id: int
+    last_completed_date: date
+    current_streak: int
+    best_streak: int
+    best_run: int
+    recovery_run: int
+
+
+def _days_between(later, earlier, dialect_name: str):
+    """Number of days between two DATE expressions, portable across backends."""
+    if dialect_name == "sqlite":
+        return func.julianday(later) - func.julianday(earlier)
+    return later - earlier
+
+
+def _streak_query(dialect_name: str, habit_ids: list[int] | None, user_id: int | None):
+    ordered = (
+        select(
+            HabitLog.habit_id,
+            HabitLog.id,
+            HabitLog.date,
+            Habit.cooldown_days.label("cooldown"),
+            func.lag(HabitLog.date).over(
+                partition_by=HabitLog.habit_id,
+                order_by=(HabitLog.date, HabitLog.id),
+            ).label("prev_date"),
+        )
+        .join(Habit, HabitLog.habit_id == Habit.id)
+        .where(HabitLog.completed == True)
+    )
+    if habit_ids is not None:
+        ordered = ordered.where(HabitLog.habit_id.in_(habit_ids))
+    if user_id is not None:
+        ordered = ordered.where(Habit.user_id == user_id)
+    ordered = ordered.subquery("ordered")
+
+    gap = _days_between(ordered.c.date, ordered.c.prev_date, dialect_name)
+    window = dict(partition_by=ordered.c.habit_id, order_by=(ordered.c.date, ordered.c.id))
+    islands = select(
+        ordered.c.habit_id,
+        ordered.c.date,
+        case((gap == ordered.c.cooldown, 1), else_=0).label("step"),
+        # Strict islands: any gap other than exactly cooldown_days starts a new run
+        func.sum(
+            case((ordered.c.prev_date.is_(None) | (gap != ordered.c.cooldown), 1), else_=0)
+        ).over(**window).label("strict_grp"),
+        # Loose islands: only a gap longer than cooldown_days starts a new run
+        func.sum(
+            case((ordered.c.prev_date.is_(None) | (gap > ordered.c.cooldown), 1), else_=0)
+        ).over(**window).label("loose_grp"),
+    ).cte("islands")
+
+    loose = select(
+        islands.c.habit_id,
+        islands.c.loose_grp.label("grp"),
+        (func.sum(islands.c.step) + 1).label("run"),
+        func.count().label("rows"),
+        func.max(islands.c.date).label("last_date"),
+        func.max(islands.c.loose_grp).over(partition_by=islands.c.habit_id).label("last_grp"),
+    ).group_by(islands.c.habit_id, islands.c.loose_grp).subquery("loose")
+
+    strict = select(
+        islands.c.habit_id,
+        islands.c.strict_grp.label("grp"),
+        func.count().label("rows"),
+        func.max(islands.c.strict_grp).over(partition_by=islands.c.habit_id).label("last_grp"),
+    ).group_by(islands.c.habit_id, islands.c.strict_grp).subquery("strict")
+
+    is_last_loose = loose.c.grp == loose.c.last_grp
+    return (
+        select(
+            loose.c.habit_id,
+            func.max(loose.c.last_date).label("last_completed_date"),
+            func.max(strict.c.rows).label("current_streak"),
+            func.max(loose.c.run).label("best_streak"),
+            func.max(case((is_last_loose, loose.c.run), else_=0)).label("best_run"),
+            func.max(case((is_last_loose, loose.c.rows), else_=0)).label("recovery_run"),
+        )
+        .join(
+            strict,
+            and_(strict.c.habit_id == loose.c.habit_id, strict.c.grp == strict.c.last_grp),
+        )
+        .group_by(loose.c.habit_id)
+    )
+
+
+async def compute_streaks(
+    db: AsyncSession,
+    habit_ids: list[int] | None = None,
+    user_id: int | None = None,
+) -> dict[int, StreakRow]:
+    """
+    Compute streak data for the given habits (or all habits of a user, or the whole
+    platform when both filters are omitted) in a single set-based query.
+    Habits without completed logs are absent from the result.
+    """
+    if habit_ids is not None and not habit_ids:
+        return {}
+
+    dialect_name = db.get_bind().dialect.name
+    result = await db.execute(_streak_query(dialect_name, habit_ids, user_id))
+    rows: dict[int, StreakRow] = {}
+    for row in result.all():
+        rows[row.habit_id] = StreakRow(
+            habit_id=row.habit_id,
+            last_completed_date=row.last_completed_date,
+            current_streak=int(row.current_streak),
+            best_streak=int(row.best_streak),
+            best_run=int(row.best_run),
+            recovery_run=int(row.recovery_run),
+        )
+    return rows
@@ -0,0 +1,196 @@
+"""
+Streak State — материализованные серии привычек.
+Состояние HabitStreak обновляется инкрементально при записи логов;
+при правках истории (прошлые даты, удаление, отмена) пересчитывается
+одним set-based запросом (см. streak_sql).
+"""
+from datetime import date
+from typing import Iterable
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.models.habit import Habit
+from app.models.habit_streak import HabitStreak
+from app.services.streak_sql import compute_streaks
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def current_streak(state: HabitStreak | None, today: date | None = None) -> int:
+    """Current streak as of `today`: the stored run stays alive until the cooldown passes."""
+    if state is None or state.last_completed_date is None:
+        return 0
+    today = today or date.today()
+    if (today - state.last_completed_date).days <= state.cooldown_days:
+        return state.current_streak
+    return 0
+
+
+async def rebuild_streak_states(db: AsyncSession, habits: Iterable[Habit]) -> dict[int, HabitStreak]:
+    """Recompute streak state from the full completed-log history of the given habits."""
+    habits = list(habits)
+    if not habits:
+        return {}
+    habit_ids = [h.id for h in habits]
+
+    computed = await compute_streaks(db, habit_ids=habit_ids)
+
+    existing_result = await db.execute(
+        select(HabitStreak).where(HabitStreak.habit_id.in_(habit_ids))
+    )
+    existing = {s.habit_id: s for s in existing_result.scalars().all()}
+
+    states: dict[int, HabitStreak] = {}
+    for habit in habits:
+        state = existing.get(habit.id)
+        if state is None:
+            state = HabitStreak(habit_id=habit.id)
+            db.add(state)
+        row = computed.get(habit.id)
+        state.cooldown_days = habit.cooldown_days
+        state.last_completed_date = row.last_completed_date if row else None
+        state.current_streak = row.current_streak if row else 0
+        state.best_streak = row.best_streak if row else 0
+        state.best_run = row.best_run if row else 0
+        states[habit.id] = state
+    await db.flush()
+    return states
+
+
+async def load_streak_states(db: AsyncSession, habits: Iterable[Habit]) -> dict[int, HabitStreak]:
+    """
+    Load streak state for many habits in one query.
+    Missing states (not backfilled yet) and states with a stale cooldown are rebuilt on the fly.
+    """
+    habits = list(habits)
+    if not habits:
+        return {}
+
+    result = await db.execute(
+        select(HabitStreak).where(HabitStreak.habit_id.in_([h.id for h in habits]))
+    )
+    states = {s.habit_id: s for s in result.scalars().all()}
+
+    stale = [
+        h for h in habits
+        if h.id not in states or states[h.id].cooldown_days != h.cooldown_days
+    ]
+    if stale:
+        states.update(await rebuild_streak_states(db, stale))
+    return states
+
+
+async def get_current_streaks(
+    db: AsyncSession, habits: Iterable[Habit], today: date | None = None
+) -> dict[int, int]:
+    """Current streak per habit id, read from the materialized state."""
+    states = await load_streak_states(db, habits)
+    return {habit_id: current_streak(state, today) for habit_id, state in states.items()}
+
+
+def _apply_completion(
+    state: HabitStreak | None,
+    habit: Habit,
+    log_date: date,
+    was_completed: bool | None,
+    is_completed: bool,
+) -> bool:
+    """
+    Apply one log write to the loaded state in place. Returns False when the write
+    rewrites history (past dates, un-completing, unknown previous state) and the
+    state has to be rebuilt.
+    """
+    if was_completed == is_completed:
+        return True
+    if (
+        was_completed is None
+        or not is_completed
+        or state is None
+        or state.cooldown_days != habit.cooldown_days
+    ):
+        return False
+    last = state.last_completed_date
+    if last is not None and log_date < last:
+        return False
+    if last == log_date:
+        return True  # already counted by a concurrent write of the same day
+
+    cooldown = habit.cooldown_days
+    if last is None:
+        state.current_streak = 1
+        state.best_run = 1
+        state.best_streak = 1
+    else:
+        diff = (log_date - last).days
+        state.current_streak = state.current_streak + 1 if diff == cooldown else 1
+        if diff == cooldown:
+            state.best_run += 1
+            state.best_streak = max(state.best_streak, state.best_run)
+        elif diff > cooldown:
+            state.best_run = 1
+    state.last_completed_date = log_date
+    return True
+
+
+async def apply_log_changes(
+    db: AsyncSession, changes: Iterable[tuple[Habit, date, bool | None, bool]]
+) -> None:
+    """
+    Update streak state after log writes given as (habit, log_date, was_completed,
+    is_completed); `was_completed` is None when the previous state is unknown.
+    Completions appended on/after the last completed date are applied incrementally
+    in date order; habits where any write rewrites history are rebuilt together.
+    """
+    by_habit: dict[int, tuple[Habit, list[tuple[date, bool | None, bool]]]] = {}
+    for habit, log_date, was_completed, is_completed in changes:
+        if was_completed != is_completed:
+            by_habit.setdefault(habit.id, (habit, []))[1].append((log_date, was_completed, is_completed))
+    if not by_habit:
+        return
+
+    result = await db.execute(select(HabitStreak).where(HabitStreak.habit_id.in_(by_habit)))
+    states = {s.habit_id: s for s in result.scalars().all()}
+    stale = []
+    for habit_id, (habit, writes) in by_habit.items():
+        state = states.get(habit_id)
+        writes.sort(key=lambda write: write[0])
+        if not all(_apply_completion(state, habit, *write) for write in writes):
+            stale.append(habit)
+    if stale:
+        await rebuild_streak_states(db, stale)
+    else:
+        await db.flush()
+
+
+async def apply_log_change(
+    db: AsyncSession,
+    habit: Habit,
+    log_date: date,
+    was_completed: bool | None,
+    is_completed: bool,
+) -> None:
+    """
+    Update streak state after a single log write.
+    Appending a completion on/after the last completed date is applied incrementally;
+    anything that rewrites history (past dates, un-completing, deletes) triggers a rebuild.
+    """
+    await apply_log_changes(db, [(habit, log_date, was_completed, is_completed)])
+
+
+async def rebuild_all_streak_states(db: AsyncSession, chunk_size: int = 500) -> int:
+    """Backfill/rebuild streak state for every habit on the platform. Returns number of habits."""
+    total = 0
+    last_id = 0
+    while True:
+        result = await db.execute(
+            select(Habit).where(Habit.id > last_id).order_by(Habit.id).limit(chunk_size)
+        )
+        habits = result.scalars().all()
+        if not habits:
+            break
+        await rebuild_streak_states(db, habits)
+        await db.commit()
+        total += len(habits)
+        last_id = habits[-1].id
+        logger.info(f"Rebuilt streak state for {total} habits")
+    return total
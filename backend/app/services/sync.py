@@ -0,0 +1,78 @@
+"""
+Sync — курсоры и tombstones для дельта-синхронизации мобильного клиента.
+Курсор — users.sync_version на момент запроса и время выдачи ("<версия>.<unix-время>"):
+клиент получает строки и tombstones с change_seq больше версии курсора. Номера
+выдаются транзакциям по порядку коммита (см. data_version), поэтому, в отличие
+от курсора по времени, долгий коммит или расхождение часов не теряют изменения.
+"""
+from datetime import datetime, timezone, timedelta
+from typing import Iterable
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete
+from app.models.habit_log import HabitLog
+from app.models.sync_tombstone import SyncTombstone, SyncEntity
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Курсоры старше срока хранения tombstones требуют полной синхронизации
+TOMBSTONE_RETENTION = timedelta(days=90)
+
+
+def parse_cursor(cursor: str) -> tuple[int, datetime] | None:
+    """
+    Parse a sync cursor into (sync version, issue time). Returns None for the
+    timestamp cursors issued before change sequences (they get a full snapshot);
+    raises ValueError if the cursor is malformed.
+    """
+    try:
+        datetime.fromisoformat(cursor)
+        return None
+    except ValueError:
+        pass
+    version, issued_at = cursor.split(".")
+    return int(version), datetime.fromtimestamp(int(issued_at), tz=timezone.utc)
+
+
+def make_cursor(sync_version: int, issued_at: datetime) -> str:
+    return f"{sync_version}.{int(issued_at.timestamp())}"
+
+
+def record_deletions(
+    db: AsyncSession, user_id: int, entity: SyncEntity, entity_ids: Iterable[int]
+) -> None:
+    """Add tombstones for deleted rows (committed together with the deletion)."""
+    db.add_all(
+        SyncTombstone(user_id=user_id, entity=entity.value, entity_id=entity_id)
+        for entity_id in entity_ids
+    )
+
+
+async def record_habit_deletion(db: AsyncSession, user_id: int, habit_id: int) -> None:
+    """Add tombstones for a deleted habit and the logs deleted with it."""
+    result = await db.execute(select(HabitLog.id).where(HabitLog.habit_id == habit_id))
+    record_deletions(db, user_id, SyncEntity.HABIT_LOG, result.scalars().all())
+    record_deletions(db, user_id, SyncEntity.HABIT, [habit_id])
+
+
+async def get_deletions(
+    db: AsyncSession, user_id: int, since_version: int
+) -> dict[str, list[int]]:
+    """Ids deleted after the sync version, grouped by entity."""
+    result = await db.execute(
+        select(SyncTombstone.entity, SyncTombstone.entity_id)
+        .where(SyncTombstone.user_id == user_id, SyncTombstone.change_seq > since_version)
+        .order_by(SyncTombstone.id)
+    )
+    deleted: dict[str, list[int]] = {}
+    for entity, entity_id in result.all():
+        deleted.setdefault(entity, []).append(entity_id)
+    return deleted
+
+
+async def prune_tombstones(db: AsyncSession) -> int:
+    """Delete tombstones older than the retention window. Returns number of rows removed."""
+    cutoff = datetime.now(timezone.utc) - TOMBSTONE_RETENTION
+    result = await db.execute(delete(SyncTombstone).where(SyncTombstone.deleted_at < cutoff))
+    await db.commit()
+    return result.rowcount or 0
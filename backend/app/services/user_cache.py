@@ -0,0 +1,259 @@
+"""
+User Cache — кэш производных данных пользователя (аналитика, рекомендации,
+прогресс для друзей, недельный отчёт, контекст чата).
+Ключ — (пространство, user_id, users.data_version, сегодняшняя дата, аргументы):
+любая запись в данные пользователя увеличивает версию (см. data_version), поэтому
+явная инвалидация не нужна — старые ключи просто вытесняются.
+
+Бэкенды: "memory" — LRU в процессе с ограничением по числу записей и объёму,
+"sqlite" — общий файл на хосте для нескольких воркеров, "none" — без кэша.
+Значения хранятся в pickle, так что вызывающий код всегда получает свою копию.
+"""
+import asyncio
+import functools
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+from contextlib import closing
+from datetime import date
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
+from app.models.user import User
+from app.services.data_version import data_changed_in_session
+from app.services.compute_executor import compute_degraded
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCacheBackend:
+    """In-process LRU bounded by entry count and total value size."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 10_000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            self._remove(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        if len(value) > self.max_bytes:
+            return
+        self._remove(key)
+        self._data[key] = (time.time() + ttl, value)
+        self._bytes += len(value)
+        while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._data)))
+            self.evictions += 1
+
+    async def clear(self) -> None:
+        self._data.clear()
+        self._bytes = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+class SQLiteCacheBackend:
+    """
+    Cache shared by all workers on a host, in a local SQLite file (WAL mode).
+    Calls run in a thread so a busy file never blocks the event loop.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_entries: int = 50_000):
+        self.path = path
+        self.max_entries = max_entries
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL,"
+                " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_accessed_at ON cache (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+
+    def _get(self, key: str) -> bytes | None:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] < time.time():
+                return None
+            conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def _set(self, key: str, value: bytes, ttl: float) -> None:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                # Trim expired rows and everything beyond max_entries, least recently used first
+                conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+                conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache"
+                    " ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    def _clear(self) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM cache")
+
+    async def get(self, key: str) -> bytes | None:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    async def clear(self) -> None:
+        await asyncio.to_thread(self._clear)
+
+    def stats(self) -> dict:
+        with closing(self._connect()) as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM cache").fetchone()
+        return {"entries": entries, "bytes": size, "max_entries": self.max_entries, "path": self.path}
+
+
+class UserCache:
+    def __init__(self, backend: MemoryCacheBackend | SQLiteCacheBackend | None, default_ttl: float = 24 * 3600):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self._stats: dict[str, dict[str, int]] = {}
+
+    def _count(self, namespace: str, outcome: str) -> None:
+        counters = self._stats.setdefault(
+            namespace, {"hits": 0, "misses": 0, "bypassed": 0, "errors": 0}
+        )
+        counters[outcome] += 1
+
+    @staticmethod
+    def key(namespace: str, user: User, args: tuple, kwargs: dict) -> str:
+        params = repr((args, sorted(kwargs.items())))
+        digest = hashlib.sha1(params.encode("utf-8")).hexdigest()[:16]
+        return f"{namespace}:{user.id}:{user.data_version or 0}:{date.today().isoformat()}:{digest}"
+
+    async def get_or_compute(self, namespace, fn, db: AsyncSession, user: User, args, kwargs, ttl=None):
+        if self.backend is None or data_changed_in_session(db, user.id):
+            # user.data_version is outdated after a write in this session
+            self._count(namespace, "bypassed")
+            return await fn(db, user, *args, **kwargs)
+
+        key = self.key(namespace, user, args, kwargs)
+        try:
+            cached = await self.backend.get(key)
+        except Exception as e:
+            cached = None
+            self._count(namespace, "errors")
+            logger.warning(f"User cache read failed: {e}")
+        if cached is not None:
+            self._count(namespace, "hits")
+            return pickle.loads(cached)
+
+        self._count(namespace, "misses")
+        token = compute_degraded.set(False)
+        try:
+            value = await fn(db, user, *args, **kwargs)
+            degraded = compute_degraded.get()
+        finally:
+            compute_degraded.reset(token)
+        # A result built from compute fallbacks is served but not cached
+        if not degraded and not data_changed_in_session(db, user.id):
+            try:
+                await self.backend.set(key, pickle.dumps(value), ttl or self.default_ttl)
+            except Exception as e:
+                self._count(namespace, "errors")
+                logger.warning(f"User cache write failed: {e}")
+        return value
+
+    async def clear(self) -> None:
+        if self.backend is not None:
+            await self.backend.clear()
+
+    def stats(self) -> dict:
+        totals = {"hits": 0, "misses": 0, "bypassed": 0, "errors": 0}
+        for counters in self._stats.values():
+            for name, value in counters.items():
+                totals[name] += value
+        lookups = totals["hits"] + totals["misses"]
+        return {
+            "backend": self.backend.name if self.backend else "none",
+            **totals,
+            "hit_rate": round(totals["hits"] / lookups, 3) if lookups else 0.0,
+            "namespaces": self._stats,
+            "store": self.backend.stats() if self.backend else {},
+        }
+
+
+def cached_for_user(namespace: str, ttl: float | None = None):
+    """
+    Cache an `async def fn(db, user, *args, **kwargs)` per (user, data version, day, args).
+    `user` is the owner of the data (e.g. the friend for friend progress); args must
+    have a stable repr. The result must be picklable (schemas, dicts, lists).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(db: AsyncSession, user: User, *args, **kwargs):
+            return await user_cache.get_or_compute(namespace, fn, db, user, args, kwargs, ttl)
+
+        wrapper.uncached = fn
+        return wrapper
+
+    return decorator
+
+
+def _create_user_cache() -> UserCache:
+    settings = get_settings()
+    backend = None
+    if settings.USER_CACHE_BACKEND == "memory":
+        backend = MemoryCacheBackend(
+            max_entries=settings.USER_CACHE_MAX_ENTRIES,
+            max_bytes=settings.USER_CACHE_MAX_MB * 1024 * 1024,
+        )
+    elif settings.USER_CACHE_BACKEND == "sqlite":
+        backend = SQLiteCacheBackend(
+            settings.USER_CACHE_SQLITE_PATH, max_entries=settings.USER_CACHE_MAX_ENTRIES
+        )
+    return UserCache(backend, default_ttl=settings.USER_CACHE_TTL_SECONDS)
+
+
+user_cache = _create_user_cache()
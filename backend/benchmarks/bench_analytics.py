@@ -0,0 +1,140 @@
+"""
+Benchmark: GET /api/analytics и /analytics/detailed?days=365 в зависимости от числа
+привычек и длины истории. Для каждой точки сетки замеряются оба эндпоинта
+(без вызова LLM) и отдельно
+гистограмма часов выполнения — прежняя (загрузка всех выполненных логов
+и Counter в Python) против агрегации GROUP BY в базе.
+
+Usage (from backend/):
+    python -m benchmarks.bench_analytics [--habits 5,20,50] [--days 30,180,365] [--repeat 5]
+                                         [--url sqlite+aiosqlite:///bench.db]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import event, insert, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from app.db.database import Base
+from app.models import User, Habit, HabitLog
+from app.api.routes.analytics import get_analytics, get_detailed_analytics
+from app.ml.pattern_analyzer import PatternAnalyzer
+from app.services.daily_stats import refresh_daily_stats
+from app.services.habit_stats import get_completion_hours
+from app.services.streak_state import rebuild_streak_states
+from app.services.user_cache import user_cache
+
+
+async def _no_insight(*_args, **_kwargs):
+    return None
+
+
+async def legacy_hours(db: AsyncSession, habit_ids: list[int]) -> Counter:
+    result = await db.execute(
+        select(HabitLog).where(
+            HabitLog.habit_id.in_(habit_ids),
+            HabitLog.completed == True,
+            HabitLog.completed_at.is_not(None),
+        )
+    )
+    return Counter(log.completed_at.hour for log in result.scalars().all())
+
+
+async def seed(db: AsyncSession, n_habits: int, n_days: int) -> tuple[User, int]:
+    user = User(username=f"bench_{n_habits}_{n_days}", email=f"bench_{n_habits}_{n_days}@example.com")
+    db.add(user)
+    await db.flush()
+    habits = [Habit(user_id=user.id, name=f"habit {i}") for i in range(n_habits)]
+    db.add_all(habits)
+    await db.flush()
+
+    today = date.today()
+    rows = []
+    for habit in habits:
+        for d in range(n_days):
+            if random.random() < 0.8:
+                completed = random.random() < 0.7
+                moment = datetime.combine(
+                    today - timedelta(days=d), datetime.min.time(), tzinfo=timezone.utc
+                ) + timedelta(minutes=random.randint(0, 24 * 60 - 1))
+                rows.append({
+                    "habit_id": habit.id,
+                    "date": today - timedelta(days=d),
+                    "completed": completed,
+                    "completions": int(completed),
+                    "completed_at": moment if completed else None,
+                    "completion_times": [moment] if completed else None,
+                })
+    if rows:
+        await db.execute(insert(HabitLog), rows)
+    await rebuild_streak_states(db, habits)
+    await refresh_daily_stats(db, user.id)
+    await db.commit()
+    return user, len(rows)
+
+
+async def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--habits", default="5,20,50")
+    parser.add_argument("--days", default="30,180,365")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--url", default="sqlite+aiosqlite:///bench_analytics.db")
+    args = parser.parse_args()
+
+    random.seed(0)
+    PatternAnalyzer.generate_ai_insight = staticmethod(_no_insight)
+    # Measure the computation itself, not the per-user cache
+    user_cache.backend = None
+    if args.url.startswith("sqlite") and os.path.exists("bench_analytics.db"):
+        os.remove("bench_analytics.db")
+    engine = create_async_engine(args.url)
+    counter = {"n": 0}
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count(*_):
+        counter["n"] += 1
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    print(f"{'habits':>6} {'days':>5} {'logs':>7}  {'endpoint ms':>11} {'queries':>7}  "
+          f"{'detailed/365 ms':>15}  {'hours legacy ms':>15} {'hours SQL ms':>12}")
+    for n_habits in map(int, args.habits.split(",")):
+        for n_days in map(int, args.days.split(",")):
+            async with session_factory() as db:
+                user, logs = await seed(db, n_habits, n_days)
+                habit_ids = list((await db.execute(
+                    select(Habit.id).where(Habit.user_id == user.id)
+                )).scalars().all())
+
+                counter["n"] = 0
+                await get_analytics(db=db, current_user=user)
+                queries = counter["n"]
+                endpoint_ms = await timed(lambda: get_analytics(db=db, current_user=user), args.repeat)
+                detailed_ms = await timed(
+                    lambda: get_detailed_analytics(days=365, db=db, current_user=user), args.repeat
+                )
+                legacy_ms = await timed(lambda: legacy_hours(db, habit_ids), args.repeat)
+                sql_ms = await timed(lambda: get_completion_hours(db, habit_ids), args.repeat)
+            print(f"{n_habits:>6} {n_days:>5} {logs:>7}  {endpoint_ms:>11.1f} {queries:>7}  "
+                  f"{detailed_ms:>15.1f}  {legacy_ms:>15.1f} {sql_ms:>12.1f}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
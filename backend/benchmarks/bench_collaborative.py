@@ -0,0 +1,184 @@
+"""
+Benchmark: коллаборативные рекомендации — прежний путь на каждый запрос
+(все активные привычки платформы → множества категорий по пользователям →
+матрица категорий и косинусная близость ко всем → поиск названий привычек
+проходом по всем привычкам) против запроса к CollaborativeIndex (одно произведение разреженной
+матрицы наборов категорий на вектор). Привычки генерируются в памяти, база не нужна; загрузка
+привычек из базы в прежнем пути не учитывается. Для индекса отдельно замеряются
+построение, применение изменений 1% пользователей и изменение привычек одного
+пользователя (как после create_habit/update_habit). Поиск пользователей с похожими
+названиями привычек через MinHash/LSH сравнивается с точным перебором по Жаккару:
+доля запросов, где найден самый похожий пользователь (recall@1).
+
+Usage (from backend/):
+    python -m benchmarks.bench_collaborative [--users 10000,100000,1000000] [--queries 50]
+                                             [--bands 16] [--rows 2] [--candidates 256]
+"""
+import argparse
+import random
+import statistics
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+import numpy as np
+from app.models.habit import HabitCategory
+from app.ml.collaborative_index import CollaborativeIndex
+
+LEGACY_MAX_USERS = 100_000
+
+
+def legacy_similar_users(user_habits: dict[int, set], user_id: int, top_n: int = 3) -> list[tuple]:
+    all_categories = list(HabitCategory)
+    others = [uid for uid in user_habits if uid != user_id]
+    if not others:
+        return []
+    matrix = np.array(
+        [[1.0 if cat in user_habits[uid] else 0.0 for cat in all_categories] for uid in others]
+    )
+    user_vec = np.array([1.0 if cat in user_habits[user_id] else 0.0 for cat in all_categories])
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(user_vec)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        similarities = np.where(norms > 0, matrix @ user_vec / norms, 0.0)
+    order = np.argsort(-similarities, kind="stable")[:top_n]
+    return [(others[i], float(similarities[i])) for i in order]
+
+
+def legacy_recommendations(all_habits: list[tuple], user_id: int) -> tuple[list, list[dict]]:
+    user_habits: dict[int, set] = defaultdict(set)
+    for habit_user, category, _ in all_habits:
+        user_habits[habit_user].add(category)
+    if user_id not in user_habits:
+        return [], []
+
+    top_similar = legacy_similar_users(dict(user_habits), user_id)
+    suggestions = []
+    for similar_uid, score in top_similar:
+        if score < 0.3:
+            continue
+        for cat in user_habits[similar_uid] - user_habits[user_id]:
+            for habit_user, category, name in all_habits:
+                if habit_user == similar_uid and category == cat:
+                    suggestions.append({"title": name, "category": cat})
+    return top_similar, suggestions[:3]
+
+
+def index_recommendations(index: CollaborativeIndex, user_id: int) -> list[dict]:
+    current = index.user_categories(user_id)
+    suggestions = []
+    for similar_uid, score in index.similar_users(user_id, top_n=3):
+        if score < 0.3:
+            continue
+        for name, cat in index.user_habits(similar_uid):
+            if cat not in current:
+                suggestions.append({"title": name, "category": cat})
+    return suggestions[:3]
+
+
+def make_habits(n_users: int) -> dict[int, list[tuple]]:
+    categories = list(HabitCategory)
+    # A few popular habit names and a long tail, as on the platform
+    names = np.minimum(np.random.default_rng(0).zipf(1.3, 5 * n_users), 5000)
+    return {
+        user_id: [
+            (categories[name % len(categories)], f"habit {name}")
+            for name in names[5 * user_id - 5:5 * user_id - 5 + random.randint(1, 5)]
+        ]
+        for user_id in range(1, n_users + 1)
+    }
+
+
+def exact_best_similarity(index: CollaborativeIndex, user_id: int) -> float:
+    """Highest Jaccard similarity of habit names to any other user, by brute force."""
+    row = index._row(user_id)
+    own = index.names[row]
+    shared = (index.names @ own.T).toarray().ravel()
+    sizes = np.diff(index.names.indptr)
+    similarities = shared / (sizes + sizes[row] - shared)
+    similarities[row] = 0
+    similarities[~index.live] = 0
+    return float(similarities.max())
+
+
+def median_ms(fn, args_list) -> float:
+    samples = []
+    for args in args_list:
+        started = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", default="10000,100000,1000000")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--bands", type=int, default=16)
+    parser.add_argument("--rows", type=int, default=2)
+    parser.add_argument("--candidates", type=int, default=256)
+    args = parser.parse_args()
+
+    random.seed(0)
+    print(
+        f"{'users':>8}  {'legacy ms':>9}  {'build s':>7} {'1% delta ms':>11} {'1 user ms':>9}"
+        f" {'query ms':>8} {'lsh ms':>6} {'recall@1':>8} {'index MB':>8}"
+    )
+    for n_users in map(int, args.users.split(",")):
+        by_user = make_habits(n_users)
+        query_users = random.sample(range(1, n_users + 1), args.queries)
+
+        started = time.perf_counter()
+        index = CollaborativeIndex(datetime.now(timezone.utc), lsh_bands=args.bands, lsh_rows=args.rows)
+        index.apply(by_user)
+        build = time.perf_counter() - started
+
+        changed = {user_id: by_user[user_id][:1] for user_id in random.sample(range(1, n_users + 1), n_users // 100)}
+        started = time.perf_counter()
+        index.apply(changed)
+        delta = (time.perf_counter() - started) * 1000
+        for user_id, habits in changed.items():
+            by_user[user_id] = habits
+        one_user = median_ms(
+            lambda u: index.apply({u: by_user[u] + [(HabitCategory.OTHER, "new habit")]}),
+            [(u,) for u in query_users[:10]],
+        )
+
+        legacy = "-"
+        if n_users <= LEGACY_MAX_USERS:
+            all_habits = [(u, c, n) for u, habits in by_user.items() for c, n in habits]
+            sample = query_users[:3]
+            for user_id in sample:
+                top_similar, _ = legacy_recommendations(all_habits, user_id)
+                if not np.allclose(
+                    [s for _, s in top_similar], [s for _, s in index.similar_users(user_id)], atol=1e-6
+                ):
+                    raise SystemExit(f"similar users differ for user {user_id}")
+            legacy = f"{median_ms(lambda u: legacy_recommendations(all_habits, u), [(u,) for u in sample]):.0f}"
+
+        query = median_ms(lambda u: index_recommendations(index, u), [(u,) for u in query_users])
+        lsh = median_ms(
+            lambda u: index.habit_neighbours(u, top_n=3, max_candidates=args.candidates),
+            [(u,) for u in query_users],
+        )
+        found = 0
+        for user_id in query_users:
+            neighbours = index.habit_neighbours(user_id, top_n=1, max_candidates=args.candidates)
+            best = exact_best_similarity(index, user_id)
+            found += bool(neighbours) and abs(neighbours[0][1] - best) < 1e-9 or best == 0
+        recall = found / len(query_users)
+        size = sum(
+            m.data.nbytes + m.indices.nbytes + m.indptr.nbytes
+            for m in (index.category_sets, index.habits, index.names)
+        ) + sum(rows.nbytes for rows in index.set_rows) + sum(
+            a.nbytes for a in (
+                index.row_users, index.row_sets, index.live, index.user_rows,
+                index.lsh_keys, index.lsh_row_ids, index.tail_keys, index.tail_row_ids,
+            )
+        )
+        print(
+            f"{n_users:>8}  {legacy:>9}  {build:>7.1f} {delta:>11.0f} {one_user:>9.1f}"
+            f" {query:>8.2f} {lsh:>6.2f} {recall:>8.2f} {size / 1e6:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Benchmark: обучение глобального классификатора сложности.
+
+1. Признаки из базы: прежний путь (кадр логов каждого пользователя
+   и groupby в pandas) против агрегатов SQL, читаемых потоком
+   (load_habit_features). Результаты сравниваются перед замером.
+2. Обучение на синтетических признаках 100k и 1M привычек: прежнее обучение
+   (apply для меток, LabelEncoder, деревья на всех строках), полное обучение
+   fit_features и инкрементальное (warm start) на 1% изменившихся привычек.
+
+Для каждого шага — время и пиковая память, отслеживаемая tracemalloc
+(массивы NumPy/pandas; внутренние буферы деревьев sklearn не учитываются).
+
+Usage (from backend/):
+    python -m benchmarks.bench_difficulty_training [--db-habits 2000] [--habits 100000,1000000]
+                                                   [--url sqlite+aiosqlite:///bench.db]
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from app.db.database import Base
+from app.models import User, Habit, HabitLog
+from app.models.habit import HabitCategory
+from app.ml.classifier import HabitDifficultyClassifier
+from app.ml.pattern_analyzer import build_logs_frame
+from app.services.model_training import load_habit_features
+from app.services.pattern_profiles import _load_batch
+
+USERS_PER_BATCH = 200
+FEATURES = ["completion_rate", "total_logs", "avg_day_of_week", "std_day_of_week", "avg_hour"]
+
+
+async def legacy_features(db: AsyncSession) -> pd.DataFrame:
+    user_ids = (await db.execute(select(User.id).order_by(User.id))).scalars().all()
+    classifier = HabitDifficultyClassifier()
+    parts = []
+    for start in range(0, len(user_ids), USERS_PER_BATCH):
+        for _, habits, rows in await _load_batch(db, list(user_ids[start:start + USERS_PER_BATCH])):
+            parts.append(classifier._extract_features(build_logs_frame(habits, rows)))
+    return pd.concat(parts, ignore_index=True)
+
+
+def legacy_fit(features: pd.DataFrame) -> RandomForestClassifier:
+    features = features.copy()
+    features["difficulty"] = features["completion_rate"].apply(
+        HabitDifficultyClassifier()._label_difficulty
+    )
+    features["category_encoded"] = LabelEncoder().fit_transform(features["category"].astype(str))
+    model = RandomForestClassifier(n_estimators=50, random_state=42, max_depth=5)
+    model.fit(features[FEATURES + ["category_encoded"]].values, features["difficulty"].values)
+    return model
+
+
+async def seed(db: AsyncSession, n_habits: int, days: int = 60) -> None:
+    n_users = max(1, n_habits // 4)
+    await db.execute(insert(User), [
+        {"username": f"bench_{i}", "email": f"bench_{i}@example.com"} for i in range(n_users)
+    ])
+    user_ids = (await db.execute(select(User.id).order_by(User.id))).scalars().all()
+    categories = list(HabitCategory)
+    await db.execute(insert(Habit), [
+        {"user_id": user_ids[i % n_users], "name": f"habit {i}", "category": categories[i % len(categories)]}
+        for i in range(n_habits)
+    ])
+    habit_ids = (await db.execute(select(Habit.id).order_by(Habit.id))).scalars().all()
+    today = date.today()
+    rows = []
+    for habit_id in habit_ids:
+        p = random.uniform(0.2, 0.95)
+        for d in range(random.randint(1, days)):
+            completed = random.random() < p
+            day = today - timedelta(days=d)
+            moment = datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc) + timedelta(
+                minutes=random.randint(0, 24 * 60 - 1)
+            )
+            rows.append({
+                "habit_id": habit_id,
+                "date": day,
+                "completed": completed,
+                "completions": int(completed),
+                "completed_at": moment if completed else None,
+            })
+        if len(rows) >= 50_000:
+            await db.execute(insert(HabitLog), rows)
+            rows = []
+    if rows:
+        await db.execute(insert(HabitLog), rows)
+    await db.commit()
+
+
+def synthetic_features(n_habits: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    total = rng.integers(1, 365, n_habits).astype(np.float32)
+    return pd.DataFrame({
+        "habit_id": np.arange(1, n_habits + 1),
+        "category": pd.Categorical.from_codes(
+            rng.integers(0, len(HabitCategory), n_habits), categories=list(HabitCategory)
+        ),
+        "completion_rate": rng.beta(2, 1.5, n_habits).astype(np.float32),
+        "total_logs": total,
+        "avg_day_of_week": rng.uniform(0, 6, n_habits).astype(np.float32),
+        "std_day_of_week": rng.uniform(0, 2.2, n_habits).astype(np.float32),
+        "avg_hour": rng.uniform(0, 23, n_habits).astype(np.float32),
+    })
+
+
+def traced(fn):
+    """Run fn, return (result, seconds, peak traced MB)."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak / 1e6
+
+
+async def traced_async(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = await fn()
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak / 1e6
+
+
+async def bench_features(url: str, n_habits: int) -> None:
+    if url.startswith("sqlite") and os.path.exists("bench_difficulty_training.db"):
+        os.remove("bench_difficulty_training.db")
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as db:
+        await seed(db, n_habits)
+        logs = (await db.execute(select(HabitLog.id).order_by(HabitLog.id.desc()).limit(1))).scalar()
+        legacy, legacy_s, legacy_mb = await traced_async(lambda: legacy_features(db))
+        sql, sql_s, sql_mb = await traced_async(lambda: load_habit_features(db))
+    await engine.dispose()
+
+    legacy = legacy.sort_values("habit_id").reset_index(drop=True)
+    sql = sql.sort_values("habit_id").reset_index(drop=True)
+    # legacy avg_hour falls back to 12 when every hour is 0 (falsy); ignore that corner
+    for column in FEATURES[:-1]:
+        if not np.allclose(legacy[column].astype(float), sql[column].astype(float), atol=1e-4):
+            raise SystemExit(f"feature {column} differs")
+
+    print(f"Features of {n_habits} habits ({logs} logs)")
+    print(f"  {'pandas per user':<18} {legacy_s * 1000:>9.0f} ms {legacy_mb:>8.1f} MB")
+    print(f"  {'SQL aggregates':<18} {sql_s * 1000:>9.0f} ms {sql_mb:>8.1f} MB")
+
+
+def bench_training(n_habits: int) -> None:
+    features = synthetic_features(n_habits)
+    changed = features.sample(frac=0.01, random_state=1)
+
+    _, legacy_s, legacy_mb = traced(lambda: legacy_fit(features))
+    classifier = HabitDifficultyClassifier()
+    _, full_s, full_mb = traced(lambda: classifier.fit_features(features))
+    _, warm_s, warm_mb = traced(lambda: classifier.fit_features(changed, warm_start=True))
+
+    print(f"Training on {n_habits} habits (frame {features.memory_usage(deep=True).sum() / 1e6:.1f} MB)")
+    print(f"  {'legacy fit':<18} {legacy_s:>9.2f} s  {legacy_mb:>8.1f} MB")
+    print(f"  {'fit_features':<18} {full_s:>9.2f} s  {full_mb:>8.1f} MB")
+    print(f"  {'warm start (1%)':<18} {warm_s:>9.2f} s  {warm_mb:>8.1f} MB")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db-habits", type=int, default=2000)
+    parser.add_argument("--habits", default="100000,1000000")
+    parser.add_argument("--url", default="sqlite+aiosqlite:///bench_difficulty_training.db")
+    args = parser.parse_args()
+
+    random.seed(0)
+    await bench_features(args.url, args.db_habits)
+    for n_habits in map(int, args.habits.split(",")):
+        bench_training(n_habits)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
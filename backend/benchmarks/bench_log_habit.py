@@ -0,0 +1,134 @@
+"""
+Benchmark: запись лога привычки — прежний путь (select habit → select log →
+insert/update → commit → refresh) против атомарного upsert одним запросом.
+Строки legacy/upsert замеряют только запись лога. Строка endpoint — полный
+обработчик POST /habits/log (без HTTP и авторизации): upsert, версия синхронизации,
+серия, дневной агрегат и метка фонового пересчёта. Фоновый пересчёт (челленджи,
+достижения) замеряется отдельной строкой background.
+
+Usage (from backend/):
+    python -m benchmarks.bench_log_habit [--habits 50] [--days 60] [--url sqlite+aiosqlite:///bench.db]
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from app.db.database import Base
+from app.models import User, Habit, HabitLog
+from app.schemas.habit import HabitLogCreate
+from app.api.routes.habits import log_habit
+from app.services.log_upsert import upsert_habit_log
+from app.services import recompute_queue as recompute_module
+from app.services.recompute_queue import recompute_queue
+
+
+async def legacy_log(db: AsyncSession, user_id: int, habit_id: int, log_date: date, completed: bool):
+    result = await db.execute(select(Habit).where(Habit.id == habit_id, Habit.user_id == user_id))
+    habit = result.scalar_one_or_none()
+    result = await db.execute(
+        select(HabitLog).where(HabitLog.habit_id == habit.id, HabitLog.date == log_date)
+    )
+    existing = result.scalar_one_or_none()
+    if existing:
+        existing.completed = completed
+        if completed:
+            existing.completed_at = datetime.now(timezone.utc)
+        log = existing
+    else:
+        log = HabitLog(
+            habit_id=habit.id, date=log_date, completed=completed,
+            completed_at=datetime.now(timezone.utc) if completed else None,
+        )
+        db.add(log)
+    await db.commit()
+    await db.refresh(log)
+
+
+async def upsert_log(db: AsyncSession, user_id: int, habit_id: int, log_date: date, completed: bool):
+    await upsert_habit_log(db, user_id, habit_id, log_date, completed=completed)
+    await db.commit()
+
+
+async def endpoint_log(db: AsyncSession, user_id: int, habit_id: int, log_date: date, completed: bool):
+    user = await db.get(User, user_id)
+    await log_habit(HabitLogCreate(habit_id=habit_id, date=log_date, completed=completed), db=db, current_user=user)
+
+
+async def run(label, fn, session_factory, user_id, habit_ids, days, counter):
+    today = date.today()
+    counter["n"] = 0
+    started = time.perf_counter()
+    async with session_factory() as db:
+        # Oldest day first, as a user checks in day after day
+        for d in reversed(range(days)):
+            for habit_id in habit_ids:
+                await fn(db, user_id, habit_id, today - timedelta(days=d), True)
+        # Second pass hits the update path
+        for habit_id in habit_ids:
+            await fn(db, user_id, habit_id, today, False)
+    elapsed = time.perf_counter() - started
+    writes = len(habit_ids) * (days + 1)
+    print(
+        f"{label:<10} {writes} writes  {elapsed * 1000:8.1f} ms  "
+        f"{elapsed / writes * 1e6:7.1f} µs/write  {counter['n'] / writes:4.1f} statements/write"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--habits", type=int, default=50)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--url", default="sqlite+aiosqlite:///bench_log_habit.db")
+    args = parser.parse_args()
+
+    if args.url.startswith("sqlite") and os.path.exists("bench_log_habit.db"):
+        os.remove("bench_log_habit.db")
+    engine = create_async_engine(args.url)
+    counter = {"n": 0}
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count(*_):
+        counter["n"] += 1
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with session_factory() as db:
+        user = User(username="bench", email="bench@example.com")
+        db.add(user)
+        await db.flush()
+        habits = {
+            label: [Habit(user_id=user.id, name=f"{label} {i}") for i in range(args.habits)]
+            for label in ("legacy", "upsert", "endpoint")
+        }
+        db.add_all(h for group in habits.values() for h in group)
+        await db.commit()
+        user_id = user.id
+        ids = {label: [h.id for h in group] for label, group in habits.items()}
+
+    await run("legacy", legacy_log, session_factory, user_id, ids["legacy"], args.days, counter)
+    await run("upsert", upsert_log, session_factory, user_id, ids["upsert"], args.days, counter)
+
+    # The worker recomputes on the benchmark database, once, after the endpoint run
+    recompute_module.AsyncSessionLocal = session_factory
+    recompute_queue.debounce_seconds = 3600
+    await run("endpoint", endpoint_log, session_factory, user_id, ids["endpoint"], args.days, counter)
+    counter["n"] = 0
+    started = time.perf_counter()
+    users = await recompute_queue.flush()
+    elapsed = time.perf_counter() - started
+    print(
+        f"{'background':<10} {users} user(s) recomputed  {elapsed * 1000:8.1f} ms  "
+        f"{counter['n']} statements (challenges, achievements)"
+    )
+    await recompute_queue.stop()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,134 @@
+"""
+Benchmark: services.log_frames.get_logs_dataframe — прежняя сборка (ORM-объекты,
+dict на строку, object-колонки) против выборки нужных колонок через Core
+и сборки из массивов с компактными dtype. Для каждого размера истории
+замеряются время сборки (без кэша кадров), пиковая память при сборке и
+размер итогового DataFrame.
+
+Usage (from backend/):
+    python -m benchmarks.bench_logs_dataframe [--logs 1000,10000,50000] [--repeat 3]
+                                              [--url sqlite+aiosqlite:///bench.db]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone
+import pandas as pd
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from app.db.database import Base
+from app.models import User, Habit, HabitLog
+from app.services import log_frames
+
+
+async def legacy_dataframe(db: AsyncSession, user_id: int) -> pd.DataFrame:
+    result = await db.execute(
+        select(HabitLog, Habit.name, Habit.category)
+        .join(Habit, HabitLog.habit_id == Habit.id)
+        .where(Habit.user_id == user_id)
+        .order_by(HabitLog.date.desc())
+    )
+    rows = result.all()
+    if not rows:
+        return pd.DataFrame()
+    data = []
+    for log, habit_name, category in rows:
+        data.append({
+            "habit_id": log.habit_id,
+            "habit_name": habit_name,
+            "category": category,
+            "date": log.date,
+            "completed": log.completed,
+            "completed_at": log.completed_at,
+            "day_of_week": log.date.weekday(),
+            "hour": log.completed_at.hour if log.completed_at else None,
+        })
+    return pd.DataFrame(data)
+
+
+async def seed(db: AsyncSession, n_logs: int) -> int:
+    user = User(username=f"bench_{n_logs}", email=f"bench_{n_logs}@example.com")
+    db.add(user)
+    await db.flush()
+    n_habits = max(1, n_logs // 365)
+    categories = ["health", "fitness", "learning", "mindfulness", "other"]
+    habits = [
+        Habit(user_id=user.id, name=f"habit {i}", category=categories[i % len(categories)])
+        for i in range(n_habits)
+    ]
+    db.add_all(habits)
+    await db.flush()
+
+    today = date.today()
+    rows = []
+    for i in range(n_logs):
+        habit = habits[i % n_habits]
+        day = today - timedelta(days=i // n_habits)
+        completed = random.random() < 0.7
+        moment = datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc) + timedelta(
+            minutes=random.randint(0, 24 * 60 - 1)
+        )
+        rows.append({
+            "habit_id": habit.id,
+            "date": day,
+            "completed": completed,
+            "completions": int(completed),
+            "completed_at": moment if completed else None,
+        })
+    await db.execute(insert(HabitLog), rows)
+    await db.commit()
+    return user.id
+
+
+async def measure(fn, repeat: int) -> tuple[float, float, float]:
+    """Median build time (ms), peak traced memory (MB) and frame size (MB)."""
+    samples = []
+    for _ in range(repeat):
+        log_frames._frame_cache.clear()
+        started = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - started)
+    log_frames._frame_cache.clear()
+    tracemalloc.start()
+    frame = await fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    size = frame.memory_usage(deep=True).sum()
+    return statistics.median(samples) * 1000, peak / 1e6, size / 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logs", default="1000,10000,50000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--url", default="sqlite+aiosqlite:///bench_logs_dataframe.db")
+    args = parser.parse_args()
+
+    random.seed(0)
+    if args.url.startswith("sqlite") and os.path.exists("bench_logs_dataframe.db"):
+        os.remove("bench_logs_dataframe.db")
+    engine = create_async_engine(args.url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    print(f"{'logs':>7}  {'legacy ms':>9} {'peak MB':>8} {'frame MB':>8}  "
+          f"{'columnar ms':>11} {'peak MB':>8} {'frame MB':>8}")
+    for n_logs in map(int, args.logs.split(",")):
+        async with session_factory() as db:
+            user_id = await seed(db, n_logs)
+            legacy = await measure(lambda: legacy_dataframe(db, user_id), args.repeat)
+            db.expunge_all()
+            columnar = await measure(lambda: log_frames.get_logs_dataframe(db, user_id), args.repeat)
+        print(f"{n_logs:>7}  {legacy[0]:>9.1f} {legacy[1]:>8.1f} {legacy[2]:>8.2f}  "
+              f"{columnar[0]:>11.1f} {columnar[1]:>8.1f} {columnar[2]:>8.2f}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
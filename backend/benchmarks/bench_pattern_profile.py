@@ -0,0 +1,189 @@
+"""
+Benchmark: анализ паттернов — прежние методы PatternAnalyzer (каждый заново
+группирует кадр, .apply для часов, iterrows для серий) против одного
+векторизованного прохода PatternAnalyzer.build_profile. Кадр строится
+в памяти через build_logs_frame, база не нужна. Результаты обоих путей
+сравниваются перед замером.
+
+Usage (from backend/):
+    python -m benchmarks.bench_pattern_profile [--habits 5,20,50] [--days 90,365] [--repeat 5]
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from app.models.habit import HabitCategory
+from app.ml.pattern_analyzer import PatternAnalyzer, build_logs_frame
+
+
+def legacy_optimal_time(df: pd.DataFrame) -> dict:
+    if df.empty:
+        return {"optimal_hour": None, "optimal_day": None}
+    completed = df[df["completed"] == True]
+    if completed.empty:
+        return {"optimal_hour": None, "optimal_day": None}
+    hours = completed["hour"].dropna()
+    optimal_hour = int(hours.mode().iloc[0]) if not hours.empty else None
+    day_rates = df.groupby("day_of_week")["completed"].mean()
+    optimal_day = int(day_rates.idxmax()) if not day_rates.empty else None
+    return {"optimal_hour": optimal_hour, "optimal_day": optimal_day}
+
+
+def legacy_danger_periods(df: pd.DataFrame) -> list[dict]:
+    if df.empty:
+        return []
+    dangers = []
+    day_names = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
+    day_rates = df.groupby("day_of_week")["completed"].mean()
+    for day, rate in day_rates.items():
+        if rate < 0.5:
+            dangers.append({
+                "type": "day_of_week",
+                "period": day_names[day],
+                "completion_rate": round(rate * 100, 1),
+                "message": f"Ты часто пропускаешь привычки в {day_names[day]} (выполнение {round(rate*100)}%)",
+            })
+    completed_with_hour = df[df["hour"].notna()].copy()
+    if not completed_with_hour.empty:
+        completed_with_hour["period"] = completed_with_hour["hour"].apply(
+            lambda h: "утро" if 5 <= h < 12 else ("день" if 12 <= h < 17 else ("вечер" if 17 <= h < 22 else "ночь"))
+        )
+        period_rates = completed_with_hour.groupby("period")["completed"].mean()
+        for period, rate in period_rates.items():
+            if rate < 0.5:
+                dangers.append({
+                    "type": "time_of_day",
+                    "period": period,
+                    "completion_rate": round(rate * 100, 1),
+                    "message": f"Привычки в {period} выполняются реже ({round(rate*100)}%)",
+                })
+    return dangers
+
+
+def legacy_struggling_habits(df: pd.DataFrame) -> list[dict]:
+    if df.empty:
+        return []
+    habit_rates = df.groupby(["habit_id", "habit_name"], observed=True)["completed"].agg(["mean", "count"])
+    # Stable sort: ties keep habit_id order, as in build_profile
+    struggling = habit_rates[habit_rates["mean"] < 0.5].sort_values("mean", kind="stable")
+    return [
+        {
+            "habit_id": habit_id,
+            "habit_name": habit_name,
+            "completion_rate": round(row["mean"] * 100, 1),
+            "total_logs": int(row["count"]),
+        }
+        for (habit_id, habit_name), row in struggling.iterrows()
+    ]
+
+
+def legacy_streak_history(df: pd.DataFrame, habit_id: int) -> dict:
+    habit_df = df[df["habit_id"] == habit_id].sort_values("date")
+    if habit_df.empty:
+        return {"current_streak": 0, "longest_streak": 0, "avg_streak": 0}
+    streaks = []
+    current = 0
+    for _, row in habit_df.iterrows():
+        if row["completed"]:
+            current += 1
+        else:
+            if current > 0:
+                streaks.append(current)
+            current = 0
+    if current > 0:
+        streaks.append(current)
+    return {
+        "current_streak": streaks[-1] if streaks else 0,
+        "longest_streak": max(streaks) if streaks else 0,
+        "avg_streak": round(np.mean(streaks), 1) if streaks else 0,
+        "total_streaks": len(streaks),
+    }
+
+
+def legacy_today_completion(df: pd.DataFrame, habit_id: int) -> float:
+    today_dow = date.today().weekday()
+    habit_df = df[df["habit_id"] == habit_id]
+    if habit_df.empty:
+        return 0.5
+    recent = habit_df[habit_df["date"] >= pd.Timestamp(date.today() - timedelta(days=14))]
+    same_day = habit_df[habit_df["day_of_week"] == today_dow]
+    overall_rate = habit_df["completed"].mean()
+    recent_rate = recent["completed"].mean() if not recent.empty else overall_rate
+    day_rate = same_day["completed"].mean() if not same_day.empty else overall_rate
+    probability = 0.5 * recent_rate + 0.3 * day_rate + 0.2 * overall_rate
+    return round(float(probability), 2)
+
+
+def legacy_profile(df: pd.DataFrame) -> dict:
+    habit_ids = [int(h) for h in df["habit_id"].unique()]
+    return {
+        "optimal_time": legacy_optimal_time(df),
+        "dangers": legacy_danger_periods(df),
+        "struggling": legacy_struggling_habits(df),
+        "streaks": {h: legacy_streak_history(df, h) for h in habit_ids},
+        "today_probability": {h: legacy_today_completion(df, h) for h in habit_ids},
+    }
+
+
+def vectorized_profile(df: pd.DataFrame) -> dict:
+    profile = PatternAnalyzer.build_profile(df)
+    return {
+        "optimal_time": profile.optimal_time,
+        "dangers": profile.dangers,
+        "struggling": profile.struggling,
+        "streaks": profile.streaks,
+        "today_probability": profile.today_probability,
+    }
+
+
+def make_frame(n_habits: int, n_days: int) -> pd.DataFrame:
+    categories = list(HabitCategory)
+    habits = [(i + 1, f"habit {i}", categories[i % len(categories)]) for i in range(n_habits)]
+    today = date.today()
+    rows = []
+    for habit_id, _, _ in habits:
+        # Per-habit completion probability, so some habits are struggling
+        p = random.uniform(0.2, 0.9)
+        for d in range(n_days):
+            if random.random() < 0.1:
+                continue  # day without a log
+            completed = random.random() < p
+            hour = random.randint(0, 23) if completed or random.random() < 0.1 else None
+            rows.append((habit_id, today - timedelta(days=d), completed, hour))
+    return build_logs_frame(habits, rows)
+
+
+def measure(fn, df: pd.DataFrame, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(df)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--habits", default="5,20,50")
+    parser.add_argument("--days", default="90,365")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(0)
+    print(f"{'habits':>6} {'days':>5} {'logs':>7}  {'legacy ms':>10} {'profile ms':>10} {'speedup':>8}")
+    for n_habits in map(int, args.habits.split(",")):
+        for n_days in map(int, args.days.split(",")):
+            df = make_frame(n_habits, n_days)
+            if legacy_profile(df) != vectorized_profile(df):
+                raise SystemExit(f"results differ for {n_habits} habits x {n_days} days")
+            legacy = measure(legacy_profile, df, args.repeat)
+            vectorized = measure(vectorized_profile, df, args.repeat)
+            print(f"{n_habits:>6} {n_days:>5} {len(df):>7}  {legacy:>10.1f} {vectorized:>10.2f} "
+                  f"{legacy / vectorized:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
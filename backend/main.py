@@ -7,8 +7,12 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.db.database import init_db
-from app.api.routes import auth, habits, analytics, chat, recommendations, notifications, admin, friends, achievements, mood, challenges
+from app.api.routes import auth, habits, analytics, chat, recommendations, notifications, admin, friends, achievements, mood, challenges, sync
 from app.notifications.scheduler import create_scheduler
+from app.services.recompute_queue import recompute_queue
+from app.services.insight_store import insight_store
+from app.services.compute_executor import compute_executor
+from app.ml.model_registry import COLLABORATIVE_INDEX, DIFFICULTY_MODEL, model_registry
 import logging
 import os
 
@@ -26,8 +30,15 @@ async def lifespan(app: FastAPI):
     logger.info("✅ Database initialized")
     scheduler.start()
     logger.info("⏰ Notification scheduler started")
+    # Marks left unprocessed by a previous run are picked up right away
+    recompute_queue.wake()
+    await model_registry.refresh(DIFFICULTY_MODEL)
+    await model_registry.refresh(COLLABORATIVE_INDEX)
     yield
     scheduler.shutdown()
+    await recompute_queue.stop()
+    await insight_store.stop()
+    compute_executor.shutdown()
     logger.info("👋 Shutting down...")
 
 
@@ -59,6 +70,7 @@ app.include_router(friends.router, prefix="/api")
 app.include_router(achievements.router, prefix="/api")
 app.include_router(mood.router, prefix="/api")
 app.include_router(challenges.router, prefix="/api")
+app.include_router(sync.router, prefix="/api")
 
 # Serve uploaded avatars as static files
 avatar_dir = "/app/data/avatars"
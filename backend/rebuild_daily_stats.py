@@ -0,0 +1,18 @@
+"""
+Script to backfill/rebuild the daily rollup (user_daily_stats table).
+Usage: python rebuild_daily_stats.py
+"""
+import asyncio
+from app.db.database import init_db, AsyncSessionLocal
+from app.services.daily_stats import rebuild_all_daily_stats
+
+
+async def rebuild():
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        total = await rebuild_all_daily_stats(db)
+        print(f"✅ Rebuilt daily stats for {total} users")
+
+
+if __name__ == "__main__":
+    asyncio.run(rebuild())
@@ -0,0 +1,18 @@
+"""
+Script to backfill/rebuild materialized habit streaks (habit_streaks table).
+Usage: python rebuild_streaks.py
+"""
+import asyncio
+from app.db.database import init_db, AsyncSessionLocal
+from app.services.streak_state import rebuild_all_streak_states
+
+
+async def rebuild():
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        total = await rebuild_all_streak_states(db)
+        print(f"✅ Rebuilt streak state for {total} habits")
+
+
+if __name__ == "__main__":
+    asyncio.run(rebuild())
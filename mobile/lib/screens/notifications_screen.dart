@@ -308,6 +308,7 @@ class _NotificationsScreenState extends ConsumerState<NotificationsScreen> {
       case 'friend_accepted':
         return Icons.people;
       case 'reminder':
+      case 'risk_reminder':
         return Icons.alarm;
       case 'evening_reminder':
         return Icons.nightlight;
@@ -324,6 +325,7 @@ class _NotificationsScreenState extends ConsumerState<NotificationsScreen> {
       case 'friend_accepted':
         return AppColors.primary;
       case 'reminder':
+      case 'risk_reminder':
       case 'evening_reminder':
         return AppColors.warning;
       default: